@@ -0,0 +1,104 @@
+"""
+Dashboard bootstrap route: everything the dashboard needs on first paint in one round trip
+"""
+import asyncio
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from app.db.database import get_db, SessionLocal
+from app.models.user import User, Workspace
+from app.schemas.user_schema import UserResponse, ChatMessageResponse
+from app.core.serialization import JSONBytesResponse, adapter, encode_json
+from app.api.users import get_token_email
+from app.api.workspaces import workspace_response
+from app.api.chat import CHAT_CHANNELS, recent_messages, unread_counts
+from app.api.portfolio import list_assets, DEFAULT_PAGE_SIZE
+
+router = APIRouter(prefix="/api/v1", tags=["bootstrap"])
+
+BOOTSTRAP_SECTIONS = ("user", "workspace", "community", "moderator", "unread", "portfolio")
+PORTFOLIO_FIELDS = "id,file_url,file_type,variants"
+PORTFOLIO_TIERS = {"premium", "free", "demo"}
+
+
+def load_workspace(user_id: int) -> Optional[dict]:
+    with SessionLocal() as db:
+        workspace = db.query(Workspace).filter(Workspace.user_id == user_id).first()
+        return workspace_response(workspace) if workspace else None
+
+
+def load_channel(channel: str) -> list:
+    with SessionLocal() as db:
+        return adapter(List[ChatMessageResponse]).validate_python(recent_messages(db, channel), from_attributes=True)
+
+
+def load_unread(user_id: int) -> list:
+    with SessionLocal() as db:
+        return unread_counts(db, user_id, CHAT_CHANNELS)
+
+
+def load_portfolio(user_id: int) -> dict:
+    with SessionLocal() as db:
+        items, next_cursor = list_assets(db, user_id, DEFAULT_PAGE_SIZE, fields=PORTFOLIO_FIELDS)
+        return {"items": items, "next_cursor": next_cursor}
+
+
+@router.get("/bootstrap")
+async def get_bootstrap(
+    include: str = Query(",".join(BOOTSTRAP_SECTIONS), description="Comma-separated sections to load"),
+    email: str = Depends(get_token_email),
+    db: Session = Depends(get_db),
+):
+    """User, workspace, recent chat, unread counts and first portfolio page in one response
+
+    The token is verified once and each section is read concurrently on
+    its own session, so the response takes as long as the slowest query
+    rather than the sum of six requests. Sections left out of include
+    (or not applicable to the user's role) are omitted from the payload.
+    """
+    sections = {name.strip() for name in include.split(",") if name.strip()}
+    unknown = sections - set(BOOTSTRAP_SECTIONS)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown sections: {', '.join(sorted(unknown))}",
+        )
+
+    user = db.query(User).filter(User.email == email).first()
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found",
+        )
+    db.close()
+
+    payload = {}
+    if "user" in sections:
+        payload["user"] = UserResponse.from_orm(user)
+
+    loaders = {}
+    if "workspace" in sections:
+        loaders["workspace"] = run_in_threadpool(load_workspace, user.id)
+    for channel in CHAT_CHANNELS:
+        if channel in sections:
+            loaders[channel] = run_in_threadpool(load_channel, channel)
+    if "unread" in sections:
+        loaders["unread"] = run_in_threadpool(load_unread, user.id)
+    # Staff roles have no portfolio; plain users are keyed by their subscription tier
+    effective_role = (user.subscription_tier or "free") if user.role == "user" else user.role
+    if "portfolio" in sections and effective_role in PORTFOLIO_TIERS:
+        loaders["portfolio"] = run_in_threadpool(load_portfolio, user.id)
+
+    results = dict(zip(loaders, await asyncio.gather(*loaders.values())))
+    if "workspace" in results:
+        payload["workspace"] = results["workspace"]
+    chat = {channel: results[channel] for channel in CHAT_CHANNELS if channel in results}
+    if chat:
+        payload["chat"] = chat
+    if "unread" in results:
+        payload["unread"] = results["unread"]
+    if "portfolio" in results:
+        payload["portfolio"] = results["portfolio"]
+    return JSONBytesResponse(encode_json(payload))
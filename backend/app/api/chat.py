@@ -1,38 +1,279 @@
 """
 Chat routes for real-time and persisted messaging
 """
-from typing import List, Optional
-from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect, HTTPException, status, Header
+import asyncio
+import json
+import logging
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect, HTTPException, status, Header, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import case, func, select
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session
 
-from app.db.database import get_db
-from app.models.user import ChatMessage, User
-from app.schemas.user_schema import ChatMessageCreate, ChatMessageResponse
+from app.db.database import SessionLocal, get_db
+from app.models.user import ChatMessage, ChatReadCursor, User
+from app.schemas.user_schema import (
+    ChatMessageCreate,
+    ChatMessageResponse,
+    ChatReadUpdate,
+    ChatTypingEvent,
+    ChatUnreadCount,
+)
+from app.services.content_filter_service import content_filter, queue_review
+from app.services.presence_service import PRESENCE_TICK_SECONDS, PresenceTracker
 from app.services.user_service import UserService
+from app.core.serialization import JSONBytesResponse, encode_row, encode_rows
+from app.core.response_cache import response_cache
+from app.core.sse import (
+    HEARTBEAT_FRAME,
+    SSE_HEADERS,
+    SSE_HEARTBEAT_SECONDS,
+    SSE_QUEUE_SIZE,
+    event_frame,
+    parse_event_id,
+    retry_frame,
+)
+from app.core.ws_protocol import (
+    BATCH_WINDOW_SECONDS,
+    EVENT_ERROR,
+    MAX_BATCH_EVENTS,
+    MSGPACK_SUBPROTOCOL,
+    message_event,
+    negotiate_subprotocol,
+    pack_frame,
+    presence_event,
+    unpack_frame,
+)
 
 router = APIRouter(prefix="/api/v1/chat", tags=["chat"])
 
+HISTORY_LIMIT = 200
+# Every user can join these; presence and typing state exist only for them
+CHAT_CHANNELS = ("community", "moderator")
+STREAM_CHANNELS = ",".join(CHAT_CHANNELS)
+# Missed messages replayed on resume; past this the client is told to resync
+REPLAY_LIMIT = 500
+# Unread badges show "99+" past this, so counting stops there
+UNREAD_COUNT_CAP = 99
+
+# One record per received frame; sampled through LOG_SAMPLE_RATES
+frame_logger = logging.getLogger("app.chat.frames")
+
+BLOCKED_DETAIL = "Message blocked by the content filter"
+
+
+class StreamSubscriber:
+    """An SSE client: its channels and a bounded queue of (message id, frame)"""
+
+    def __init__(self, channels: Set[str]):
+        self.channels = channels
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SSE_QUEUE_SIZE)
+        self.overflowed = False
+
 
 class ConnectionManager:
+    """Chat fan-out to WebSockets (JSON, or batched kcd.msgpack.v1 frames) and SSE streams
+
+    Every authenticated connection counts as online in its channels.
+    Presence and typing changes are not sent as they happen: once per
+    PRESENCE_TICK_SECONDS the tracker's coalesced diffs go to the
+    connections that asked for presence.
+    """
+
     def __init__(self):
         self.active_connections: List[WebSocket] = []
+        self.binary_connections: List[WebSocket] = []
+        self.stream_subscribers: List[StreamSubscriber] = []
+        self.presence = PresenceTracker()
+        # WebSocket or StreamSubscriber -> (user id, channels)
+        self._members: Dict[object, Tuple[int, Set[str]]] = {}
+        # WebSocket or StreamSubscriber -> channels it receives presence for
+        self.presence_receivers: Dict[object, Set[str]] = {}
+        self._pending_events: list = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._tick_task: Optional[asyncio.Task] = None
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+    async def connect(self, websocket: WebSocket) -> Optional[str]:
+        subprotocol = negotiate_subprotocol(websocket.scope.get("subprotocols", []))
+        await websocket.accept(subprotocol=subprotocol)
+        if subprotocol == MSGPACK_SUBPROTOCOL:
+            self.binary_connections.append(websocket)
+        else:
+            self.active_connections.append(websocket)
+        return subprotocol
 
     def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+        for connections in (self.active_connections, self.binary_connections):
+            if websocket in connections:
+                connections.remove(websocket)
+        self.leave(websocket)
+
+    def subscribe(self, channels: Iterable[str]) -> StreamSubscriber:
+        subscriber = StreamSubscriber(set(channels))
+        self.stream_subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: StreamSubscriber):
+        if subscriber in self.stream_subscribers:
+            self.stream_subscribers.remove(subscriber)
+        self.leave(subscriber)
+
+    async def join(self, receiver, user: User, channels: Set[str], receive_presence: bool = False):
+        """Mark the user online in channels for as long as receiver is connected
+
+        A receiver that asks for presence is sent a snapshot of each channel
+        first; the diffs that follow, including its own join, apply on top.
+        """
+        self._members[receiver] = (user.id, channels)
+        self.presence.join(channels, user.id, user.full_name or user.email)
+        if receive_presence:
+            self.presence_receivers[receiver] = channels
+            for channel in sorted(channels):
+                snapshot = self.presence.snapshot(channel)
+                await self._send_presence(receiver, self._presence_frames({"snapshot": True, **snapshot}))
+        self._ensure_tick()
+
+    def leave(self, receiver):
+        member = self._members.pop(receiver, None)
+        self.presence_receivers.pop(receiver, None)
+        if member is not None:
+            self.presence.leave(member[1], member[0])
+
+    def typing(self, channel: str, user: User):
+        self.presence.set_typing(channel, user.id, user.full_name or user.email)
+        self._ensure_tick()
+
+    def _ensure_tick(self):
+        if self._tick_task is None:
+            self._tick_task = asyncio.create_task(self._tick())
+
+    async def _tick(self):
+        try:
+            while not self.presence.is_idle():
+                await asyncio.sleep(PRESENCE_TICK_SECONDS)
+                await self.publish_presence()
+        finally:
+            self._tick_task = None
+
+    async def publish_presence(self, now: Optional[float] = None):
+        """Send each changed channel's diff, encoded once per format, to its presence receivers"""
+        for diff in self.presence.collect(now):
+            channel = diff["channel"]
+            receivers = [receiver for receiver, channels in self.presence_receivers.items() if channel in channels]
+            if not receivers:
+                continue
+            frames = self._presence_frames(diff)
+            results = await asyncio.gather(
+                *(self._send_presence(receiver, frames) for receiver in receivers), return_exceptions=True
+            )
+            for receiver, result in zip(receivers, results):
+                if isinstance(result, Exception):
+                    self.disconnect(receiver)
+
+    def _presence_frames(self, payload: dict) -> dict:
+        """A presence diff or snapshot encoded once for each kind of receiver"""
+        text = json.dumps({"type": "presence", **payload})
+        frames = {"text": text, "sse": event_frame(text, event="presence")}
+        if self.binary_connections:
+            frames["binary"] = pack_frame([presence_event(payload)])
+        return frames
+
+    async def _send_presence(self, receiver, frames: dict):
+        if isinstance(receiver, StreamSubscriber):
+            # No event id: presence is not replayed on resume, the new stream gets a snapshot
+            try:
+                receiver.queue.put_nowait((None, frames["sse"]))
+            except asyncio.QueueFull:
+                receiver.overflowed = True
+                self.unsubscribe(receiver)
+        elif receiver in self.binary_connections:
+            await receiver.send_bytes(frames["binary"])
+        else:
+            await receiver.send_text(frames["text"])
+
+    def _publish(self, text: str, event: list):
+        """Queue one shared SSE frame for every stream subscribed to the message's channel
+
+        A subscriber whose queue is full is dropped; its stream ends and the
+        client resumes from Last-Event-ID.
+        """
+        message_id, channel = event[1], event[4]
+        frame = None
+        for subscriber in list(self.stream_subscribers):
+            if channel not in subscriber.channels:
+                continue
+            frame = frame or event_frame(text, event_id=message_id)
+            try:
+                subscriber.queue.put_nowait((message_id, frame))
+            except asyncio.QueueFull:
+                subscriber.overflowed = True
+                self.unsubscribe(subscriber)
+
+    async def _send_all(self, connections: List[WebSocket], send) -> None:
+        results = await asyncio.gather(*(send(connection) for connection in connections), return_exceptions=True)
+        for connection, result in zip(connections, results):
+            if isinstance(result, Exception):
+                self.disconnect(connection)
+
+    async def broadcast(self, message: bytes, event: Optional[list] = None):
+        """Send an encoded JSON message to text sockets and queue its event for binary ones
+
+        The JSON is decoded once, not per socket; binary frames are packed
+        once per batch and shared by every binary socket.
+        """
+        if event is not None and self.binary_connections:
+            self._pending_events.append(event)
+            if len(self._pending_events) >= MAX_BATCH_EVENTS:
+                await self._flush()
+            elif self._flush_task is None:
+                self._flush_task = asyncio.create_task(self._flush_later())
+        text = message.decode()
+        if event is not None and self.stream_subscribers:
+            self._publish(text, event)
+        await self._send_all(list(self.active_connections), lambda connection: connection.send_text(text))
+
+    async def _flush_later(self):
+        await asyncio.sleep(BATCH_WINDOW_SECONDS)
+        self._flush_task = None
+        await self._flush()
 
-    async def broadcast(self, message: dict):
-        for connection in list(self.active_connections):
-            await connection.send_json(message)
+    async def _flush(self):
+        events, self._pending_events = self._pending_events, []
+        if not events:
+            return
+        frame = pack_frame(events)
+        await self._send_all(list(self.binary_connections), lambda connection: connection.send_bytes(frame))
 
 
 manager = ConnectionManager()
 
 
+def store_message(db: Session, user: User, channel: str, content: str) -> ChatMessage:
+    """Check content against the filter and save it; flagged messages are queued for review
+
+    Raises 422 when a block rule matched; nothing is stored then.
+    """
+    verdict = content_filter.check(content)
+    if verdict is not None and verdict.blocked:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=BLOCKED_DETAIL)
+    message = ChatMessage(
+        user_id=user.id,
+        user_name=user.full_name or user.email,
+        channel=channel,
+        content=content,
+    )
+    db.add(message)
+    if verdict is not None:
+        db.flush()
+        queue_review(db, "chat_message", message.id, user.id, content, verdict)
+    db.commit()
+    db.refresh(message)
+    return message
+
+
 def get_user_from_token(token: Optional[str], db: Session, authorization: Optional[str] = None) -> User:
     if not token and authorization:
         try:
@@ -55,6 +296,18 @@ def get_user_from_token(token: Optional[str], db: Session, authorization: Option
     return user
 
 
+def recent_messages(db: Session, channel: str) -> List[ChatMessage]:
+    """The newest HISTORY_LIMIT messages of a channel, oldest first"""
+    newest = (
+        db.query(ChatMessage)
+        .filter(ChatMessage.channel == channel)
+        .order_by(ChatMessage.id.desc())
+        .limit(HISTORY_LIMIT)
+        .all()
+    )
+    return newest[::-1]
+
+
 @router.get("/messages", response_model=List[ChatMessageResponse])
 async def get_messages(
     channel: str = "community",
@@ -63,14 +316,216 @@ async def get_messages(
 ):
     if authorization:
         get_user_from_token(None, db, authorization=authorization)
-    messages = (
+    body = response_cache.get_or_build(
+        "chat.history",
+        channel,
+        [f"channel:{channel}"],
+        lambda: encode_rows(ChatMessageResponse, recent_messages(db, channel)),
+    )
+    return JSONBytesResponse(body)
+
+
+def parse_channels(channels: str) -> Set[str]:
+    subscribed = {channel.strip() for channel in channels.split(",") if channel.strip()}
+    if not subscribed:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Subscribe to at least one channel",
+        )
+    for channel in sorted(subscribed):
+        check_channel(channel)
+    return subscribed
+
+
+def check_channel(channel: str) -> str:
+    if channel not in CHAT_CHANNELS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Unknown channel {channel!r}; channels are {', '.join(CHAT_CHANNELS)}",
+        )
+    return channel
+
+
+def unread_counts(db: Session, user_id: int, channels: Iterable[str]) -> List[ChatUnreadCount]:
+    """Messages from others after the user's read cursor, per channel, capped at UNREAD_COUNT_CAP
+
+    Each channel is capped on its own: its count is an index range scan on
+    (channel, id) that stops after UNREAD_COUNT_CAP + 1 matching rows, and
+    all of them run in one statement. A capped count reports
+    UNREAD_COUNT_CAP with capped set and a "99+" label.
+    """
+    channels = sorted(channels)
+    cursors = dict(
+        db.query(ChatReadCursor.channel, ChatReadCursor.last_read_id)
+        .filter(ChatReadCursor.user_id == user_id, ChatReadCursor.channel.in_(channels))
+        .all()
+    )
+    counts = db.query(*(
+        select(func.count())
+        .select_from(
+            select(ChatMessage.id)
+            .where(
+                ChatMessage.channel == channel,
+                ChatMessage.id > cursors.get(channel, 0),
+                ChatMessage.user_id != user_id,
+            )
+            .limit(UNREAD_COUNT_CAP + 1)
+            .subquery()
+        )
+        .scalar_subquery()
+        for channel in channels
+    )).one()
+    return [
+        ChatUnreadCount(
+            channel=channel,
+            last_read_id=cursors.get(channel, 0),
+            unread=min(count, UNREAD_COUNT_CAP),
+            capped=count > UNREAD_COUNT_CAP,
+            cap=UNREAD_COUNT_CAP,
+            label=f"{UNREAD_COUNT_CAP}+" if count > UNREAD_COUNT_CAP else str(count or ""),
+        )
+        for channel, count in zip(channels, counts)
+    ]
+
+
+def mark_read(db: Session, user_id: int, channel: str, last_read_id: Optional[int] = None) -> int:
+    """Move the user's read cursor forward in one upsert; returns the cursor
+
+    Without last_read_id the cursor moves to the channel's newest message.
+    A cursor never moves back, so a stale client cannot resurrect unread
+    messages.
+    """
+    if last_read_id is None:
+        last_read_id = (
+            select(func.coalesce(func.max(ChatMessage.id), 0))
+            .where(ChatMessage.channel == channel)
+            .scalar_subquery()
+        )
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(ChatReadCursor).values(
+        user_id=user_id, channel=channel, last_read_id=last_read_id, updated_at=datetime.utcnow(),
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[ChatReadCursor.user_id, ChatReadCursor.channel],
+        set_={
+            "last_read_id": case(
+                (statement.excluded.last_read_id > ChatReadCursor.last_read_id, statement.excluded.last_read_id),
+                else_=ChatReadCursor.last_read_id,
+            ),
+            "updated_at": statement.excluded.updated_at,
+        },
+    ).returning(ChatReadCursor.last_read_id)
+    cursor = db.execute(statement).scalar_one()
+    db.commit()
+    return cursor
+
+
+@router.get("/unread", response_model=List[ChatUnreadCount])
+async def get_unread(
+    channels: str = STREAM_CHANNELS,
+    token: Optional[str] = None,
+    authorization: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    """Unread message counts for badges, without transferring any history"""
+    user = get_user_from_token(token, db, authorization=authorization)
+    return unread_counts(db, user.id, parse_channels(channels))
+
+
+@router.post("/read", response_model=ChatUnreadCount)
+async def post_read(
+    payload: ChatReadUpdate,
+    token: Optional[str] = None,
+    authorization: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    """Mark a channel read up to last_read_id, or up to its newest message"""
+    check_channel(payload.channel)
+    user = get_user_from_token(token, db, authorization=authorization)
+    mark_read(db, user.id, payload.channel, payload.last_read_id)
+    return unread_counts(db, user.id, [payload.channel])[0]
+
+
+def missed_messages(db: Session, channels: Set[str], after_id: int) -> List[ChatMessage]:
+    """Up to REPLAY_LIMIT + 1 messages after after_id, oldest first"""
+    return (
         db.query(ChatMessage)
-        .filter(ChatMessage.channel == channel)
-        .order_by(ChatMessage.created_at.asc())
-        .limit(200)
+        .filter(ChatMessage.channel.in_(channels), ChatMessage.id > after_id)
+        .order_by(ChatMessage.id.asc())
+        .limit(REPLAY_LIMIT + 1)
         .all()
     )
-    return [ChatMessageResponse.from_orm(msg) for msg in messages]
+
+
+def open_stream(token: Optional[str], authorization: Optional[str], channels: Set[str],
+                after_id: Optional[int]) -> tuple:
+    """Authenticate and load the replay in a short-lived session; returns (user, frames, last id sent)
+
+    With more than REPLAY_LIMIT missed messages only a resync event is sent
+    and the stream continues from the newest message.
+    """
+    with SessionLocal() as db:
+        user = get_user_from_token(token, db, authorization=authorization)
+        if after_id is None:
+            return user, [], None
+        missed = missed_messages(db, channels, after_id)
+        if len(missed) > REPLAY_LIMIT:
+            newest = db.query(func.max(ChatMessage.id)).filter(ChatMessage.channel.in_(channels)).scalar()
+            return user, [event_frame("{}", event="resync")], newest
+        frames = [
+            event_frame(encode_row(ChatMessageResponse, message).decode(), event_id=message.id)
+            for message in missed
+        ]
+        return user, frames, missed[-1].id if missed else after_id
+
+
+@router.get("/stream")
+async def stream_messages(
+    channels: str = STREAM_CHANNELS,
+    token: Optional[str] = None,
+    last_event_id: Optional[str] = Query(None, description="Resume point for the first connection"),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    authorization: Optional[str] = Header(None),
+    presence: bool = False,
+):
+    """Server-sent events for the subscribed channels, from the same fan-out as /ws
+
+    EventSource sends Last-Event-ID itself when it reconnects; missed
+    messages are replayed from the database before live events resume.
+    With presence=true the stream also carries "presence" events.
+    """
+    subscribed = parse_channels(channels)
+    after_id = parse_event_id(last_event_id_header) or parse_event_id(last_event_id)
+
+    # Subscribe before reading the replay so nothing published in between is lost;
+    # live events already covered by the replay are skipped below
+    subscriber = manager.subscribe(subscribed)
+    try:
+        user, replay, last_sent = await run_in_threadpool(open_stream, token, authorization, subscribed, after_id)
+    except BaseException:
+        manager.unsubscribe(subscriber)
+        raise
+    await manager.join(subscriber, user, subscribed, receive_presence=presence)
+
+    async def events() -> AsyncIterator[bytes]:
+        try:
+            yield retry_frame()
+            for frame in replay:
+                yield frame
+            while True:
+                if subscriber.overflowed and subscriber.queue.empty():
+                    return
+                try:
+                    message_id, frame = await asyncio.wait_for(subscriber.queue.get(), SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield HEARTBEAT_FRAME
+                    continue
+                if message_id is None or last_sent is None or message_id > last_sent:
+                    yield frame
+        finally:
+            manager.unsubscribe(subscriber)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
 
 
 @router.post("/messages", response_model=ChatMessageResponse)
@@ -81,44 +536,73 @@ async def post_message(
     db: Session = Depends(get_db),
 ):
     user = get_user_from_token(token, db, authorization=authorization)
-    message = ChatMessage(
-        user_id=user.id,
-        user_name=user.full_name or user.email,
-        channel=payload.channel,
-        content=payload.content,
-    )
-    db.add(message)
-    db.commit()
-    db.refresh(message)
-    response = ChatMessageResponse.from_orm(message)
-    await manager.broadcast(response.dict())
-    return response
+    message = store_message(db, user, payload.channel, payload.content)
+    response_cache.invalidate(f"channel:{message.channel}")
+    manager.presence.clear_typing(message.channel, user.id)
+    # The same bytes go to the sockets and back to the sender
+    body = encode_row(ChatMessageResponse, message)
+    await manager.broadcast(body, message_event(message))
+    return JSONBytesResponse(body)
+
+
+@router.post("/typing", status_code=status.HTTP_204_NO_CONTENT)
+async def post_typing(
+    payload: ChatTypingEvent,
+    token: Optional[str] = None,
+    authorization: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    """Typing indicator for clients without a WebSocket; repeat before TYPING_TTL_SECONDS to keep it"""
+    check_channel(payload.channel)
+    user = get_user_from_token(token, db, authorization=authorization)
+    manager.typing(payload.channel, user)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
 @router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket, token: Optional[str] = None):
-    db = next(get_db())
+async def websocket_endpoint(
+    websocket: WebSocket,
+    token: Optional[str] = None,
+    channels: str = STREAM_CHANNELS,
+    presence: bool = False,
+):
+    # A session per message: one held for the socket's lifetime would pin a
+    # pooled connection per connected client and exhaust the pool
+    subscribed = parse_channels(channels)
+    with SessionLocal() as db:
+        member = get_user_from_token(token, db)
     try:
-        get_user_from_token(token, db)
-        await manager.connect(websocket)
+        binary = await manager.connect(websocket) == MSGPACK_SUBPROTOCOL
+        await manager.join(websocket, member, subscribed, receive_presence=presence)
         while True:
-            data = await websocket.receive_json()
+            data = unpack_frame(await websocket.receive_bytes()) if binary else await websocket.receive_json()
+            frame_logger.info("WebSocket frame", extra={"binary": binary})
+            if not isinstance(data, dict):
+                continue
             channel = data.get("channel", "community")
+            if data.get("type") == "typing":
+                # Only the socket's own channels, so a client cannot grow the presence state
+                if channel in subscribed:
+                    manager.typing(channel, member)
+                continue
             content = data.get("content", "").strip()
             if not content:
                 continue
-            user = get_user_from_token(token, db)
-            message = ChatMessage(
-                user_id=user.id,
-                user_name=user.full_name or user.email,
-                channel=channel,
-                content=content,
-            )
-            db.add(message)
-            db.commit()
-            db.refresh(message)
-            await manager.broadcast(ChatMessageResponse.from_orm(message).dict())
+            try:
+                with SessionLocal() as db:
+                    message = store_message(db, get_user_from_token(token, db), channel, content)
+            except HTTPException as exc:
+                if exc.status_code != status.HTTP_422_UNPROCESSABLE_ENTITY:
+                    raise
+                if binary:
+                    await websocket.send_bytes(pack_frame([[EVENT_ERROR, exc.detail]]))
+                else:
+                    await websocket.send_json({"type": "error", "detail": exc.detail})
+                continue
+            response_cache.invalidate(f"channel:{channel}")
+            manager.presence.clear_typing(channel, member.id)
+            await manager.broadcast(encode_row(ChatMessageResponse, message), message_event(message))
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
+        pass
     finally:
-        db.close()
+        manager.disconnect(websocket)
@@ -0,0 +1,31 @@
+"""
+Media routes for blobs kept in remote storage backends
+"""
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import RedirectResponse
+from sqlalchemy.orm import Session
+
+from app.db.database import get_db
+from app.models.user import MediaBlob
+from app.services.storage import get_storage
+
+router = APIRouter(prefix="/api/v1/media", tags=["media"])
+
+
+@router.get("/{storage_key:path}")
+async def get_media(storage_key: str, db: Session = Depends(get_db)):
+    """Redirect to a short-lived URL for a blob or one of its derivatives"""
+    # Originals and derivatives both start with the blob's SHA-256
+    sha256 = storage_key.rsplit("/", 1)[-1][:64]
+    blob = db.query(MediaBlob).filter(MediaBlob.sha256 == sha256).first()
+    if blob is None or not storage_key.startswith(blob.storage_key.rsplit(".", 1)[0]):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Media not found")
+
+    storage = get_storage(blob.storage_backend)
+    # Cache the redirect for less time than the presigned URL stays valid
+    max_age = max(0, min(3600, getattr(storage, "presign_seconds", 3600) - 60))
+    return RedirectResponse(
+        storage.redirect_url(storage_key),
+        status_code=status.HTTP_307_TEMPORARY_REDIRECT,
+        headers={"Cache-Control": f"private, max-age={max_age}"},
+    )
@@ -0,0 +1,72 @@
+"""
+Moderation routes: the review queue filled by the content filter
+"""
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from sqlalchemy.orm import Session
+
+from app.db.database import get_db
+from app.models.user import ChatMessage, ContentReview, MediaAsset, User
+from app.schemas.user_schema import ContentReviewDecision, ContentReviewResponse
+from app.api.users import require_roles
+from app.core.response_cache import response_cache
+
+router = APIRouter(prefix="/api/v1/moderation", tags=["moderation"])
+
+REVIEW_PAGE_SIZE = 50
+MAX_REVIEW_PAGE_SIZE = 200
+STAFF_ROLES = ("admin", "manager", "moderator")
+
+
+@router.get("/reviews", response_model=List[ContentReviewResponse])
+async def list_reviews(
+    response: Response,
+    review_status: str = Query("pending", alias="status"),
+    limit: int = Query(REVIEW_PAGE_SIZE, ge=1, le=MAX_REVIEW_PAGE_SIZE),
+    cursor: Optional[int] = Query(None, description="Last id of the previous page"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_roles(*STAFF_ROLES)),
+):
+    """Flagged chat messages and captions, oldest first, keyset-paginated by id"""
+    query = db.query(ContentReview).filter(ContentReview.status == review_status)
+    if cursor is not None:
+        query = query.filter(ContentReview.id > cursor)
+    reviews = query.order_by(ContentReview.id).limit(limit + 1).all()
+    if len(reviews) > limit:
+        reviews = reviews[:limit]
+        response.headers["X-Next-Cursor"] = str(reviews[-1].id)
+    return reviews
+
+
+@router.post("/reviews/{review_id}", response_model=ContentReviewResponse)
+async def decide_review(
+    review_id: int,
+    decision: ContentReviewDecision,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_roles(*STAFF_ROLES)),
+):
+    """Approve a flagged item, or remove it: the chat message is deleted, the caption cleared"""
+    review = db.query(ContentReview).filter(ContentReview.id == review_id).first()
+    if review is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Review not found")
+    if review.status != "pending":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Review already {review.status}")
+
+    removed_channel = None
+    if decision.action == "remove":
+        if review.source == "chat_message":
+            message = db.query(ChatMessage).filter(ChatMessage.id == review.source_id).first()
+            if message is not None:
+                removed_channel = message.channel
+                db.delete(message)
+        elif review.source == "media_caption":
+            db.query(MediaAsset).filter(MediaAsset.id == review.source_id).update({"caption": None})
+    review.status = "removed" if decision.action == "remove" else "approved"
+    review.reviewed_by = current_user.id
+    review.reviewed_at = datetime.utcnow()
+    db.commit()
+    if removed_channel is not None:
+        response_cache.invalidate(f"channel:{removed_channel}")
+    db.refresh(review)
+    return review
@@ -1,25 +1,33 @@
 """
 Portfolio media routes
 """
-import os
+import base64
+import json
 import mimetypes
+from datetime import datetime
 from pathlib import Path
 from typing import List, Optional
-from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, status, Header
+from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, status, Header, Response, Request, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import tuple_
 from sqlalchemy.orm import Session
-from datetime import datetime
 
 from app.db.database import get_db
-from app.models.user import MediaAsset, User
-from app.schemas.user_schema import MediaAssetResponse
+from app.models.user import MediaAsset, MediaBlob, User
+from app.schemas.user_schema import MediaAssetResponse, MediaAssetUpdate, UploadSessionCreate, UploadSessionResponse
 from app.services.user_service import UserService
+from app.services.media_service import MediaService, UPLOAD_DIR
+from app.services.derivative_service import queue_derivatives
+from app.services.content_filter_service import content_filter, queue_review
+from app.services.upload_session_service import UploadSessionService, RESUMABLE_MAX_UPLOAD_BYTES
+from app.core.serialization import JSONBytesResponse, encode_json
 
 router = APIRouter(prefix="/api/v1/portfolio", tags=["portfolio"])
 
-ROOT_DIR = Path(__file__).resolve().parents[3]
-UPLOAD_DIR = ROOT_DIR / "uploads"
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024  # single-request uploads; larger files use /uploads sessions
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
 ALLOWED_IMAGE_EXT = {".jpg", ".jpeg", ".png", ".webp", ".gif"}
 ALLOWED_VIDEO_EXT = {".mp4", ".mov", ".webm", ".m4v"}
 
@@ -46,20 +54,124 @@ def get_user_from_token(token: Optional[str], db: Session, authorization: Option
     return user
 
 
+def encode_cursor(created_at: datetime, asset_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), asset_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, asset_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(asset_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def list_assets(
+    db: Session,
+    user_id: int,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    file_type: Optional[str] = None,
+) -> tuple:
+    """One page of a user's assets, newest first; returns (assets, next_cursor)"""
+    selected = list(MediaAssetResponse.model_fields)
+    if fields:
+        selected = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = set(selected) - set(MediaAssetResponse.model_fields)
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {', '.join(sorted(unknown))}",
+            )
+    # Ordering columns are always read for the cursor, even when not returned
+    columns = list(dict.fromkeys(selected + ["created_at", "id"]))
+
+    query = (
+        db.query(*[getattr(MediaAsset, name) for name in columns])
+        .filter(MediaAsset.user_id == user_id)
+    )
+    if file_type:
+        query = query.filter(MediaAsset.file_type == file_type)
+    if cursor:
+        query = query.filter(tuple_(MediaAsset.created_at, MediaAsset.id) < tuple_(*decode_cursor(cursor)))
+    rows = (
+        query.order_by(MediaAsset.created_at.desc(), MediaAsset.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return [{name: getattr(row, name) for name in selected} for row in rows], next_cursor
+
+
 @router.get("/me", response_model=List[MediaAssetResponse])
 async def get_my_assets(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated subset of asset fields"),
+    file_type: Optional[str] = Query(None, pattern="^(image|video)$"),
     token: Optional[str] = None,
     authorization: Optional[str] = Header(None),
     db: Session = Depends(get_db),
 ):
+    """Newest assets first, one page at a time
+
+    Without limit a page holds DEFAULT_PAGE_SIZE assets. The next page is
+    requested with the cursor returned in X-Next-Cursor (also given as a
+    Link header); the header is absent on the last page, so a client that
+    wants every asset follows it until then.
+    """
     user = get_user_from_token(token, db, authorization=authorization)
-    assets = (
-        db.query(MediaAsset)
-        .filter(MediaAsset.user_id == user.id)
-        .order_by(MediaAsset.created_at.desc())
-        .all()
+    assets, next_cursor = list_assets(db, user.id, limit, cursor, fields, file_type)
+
+    headers = {}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+        headers["Link"] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
+    return JSONBytesResponse(encode_json(assets), headers=headers)
+
+
+def classify_upload(filename: str, content_type: Optional[str]) -> tuple:
+    """Validate an upload by extension and MIME type; returns (file_ext, file_type)"""
+    file_ext = Path(filename).suffix.lower()
+    guessed_ext = mimetypes.guess_extension(content_type or "") or ""
+    if not file_ext and guessed_ext:
+        file_ext = guessed_ext
+
+    is_video = (content_type or "").startswith("video") or file_ext in ALLOWED_VIDEO_EXT
+    is_image = (content_type or "").startswith("image") or file_ext in ALLOWED_IMAGE_EXT
+    if not is_video and not is_image:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported file type")
+
+    return file_ext, "video" if is_video else "image"
+
+
+def create_asset(db: Session, user: User, blob: MediaBlob, file_type: str) -> MediaAsset:
+    """Create a portfolio asset for a stored blob and queue its derivatives"""
+    asset = MediaAsset(
+        user_id=user.id,
+        blob_id=blob.id,
+        file_url=MediaService.blob_url(blob),
+        file_type=file_type,
     )
-    return [MediaAssetResponse.from_orm(asset) for asset in assets]
+    db.add(asset)
+    # The asset is written before the blob is read under lock: a render finishing meanwhile
+    # either committed first, and its variants are read here, or updates this asset after commit
+    db.flush()
+    blob = db.query(MediaBlob).filter(MediaBlob.id == blob.id).populate_existing().with_for_update().one()
+    asset.variants = blob.variants or {}
+    if blob.variants_status == "pending":
+        queue_derivatives(blob.id, db=db)
+    db.commit()
+    db.refresh(asset)
+    return asset
 
 
 @router.post("/upload", response_model=MediaAssetResponse)
@@ -73,36 +185,182 @@ async def upload_asset(
     if not file.filename:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No file uploaded")
 
-    file_ext = Path(file.filename).suffix.lower()
-    guessed_ext = mimetypes.guess_extension(file.content_type or "") or ""
-    if not file_ext and guessed_ext:
-        file_ext = guessed_ext
+    file_ext, file_type = classify_upload(file.filename, file.content_type)
+
+    tmp_path, sha256, size = await MediaService.receive_upload(file, MAX_UPLOAD_BYTES)
+    # Storing can be a long S3 upload: keep it off the event loop
+    blob = await run_in_threadpool(MediaService.acquire_blob, db, tmp_path, sha256, size, file_ext)
+
+    return MediaAssetResponse.from_orm(create_asset(db, user, blob, file_type))
 
-    is_video = (file.content_type or "").startswith("video") or file_ext in ALLOWED_VIDEO_EXT
-    is_image = (file.content_type or "").startswith("image") or file_ext in ALLOWED_IMAGE_EXT
-    if not is_video and not is_image:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported file type")
 
-    file_type = "video" if is_video else "image"
+def upload_session_response(session: dict) -> UploadSessionResponse:
+    return UploadSessionResponse(
+        upload_id=session["upload_id"],
+        offset=UploadSessionService.offset(session["upload_id"]),
+        size=session["size"],
+        expires_at=datetime.utcfromtimestamp(UploadSessionService.expires_at(session)),
+    )
 
-    safe_name = f"{user.id}_{int(datetime.utcnow().timestamp())}{file_ext}"
-    file_path = UPLOAD_DIR / safe_name
 
-    content = await file.read()
-    if len(content) > MAX_UPLOAD_BYTES:
+@router.post("/uploads", response_model=UploadSessionResponse, status_code=status.HTTP_201_CREATED)
+async def create_upload_session(
+    payload: UploadSessionCreate,
+    token: Optional[str] = None,
+    authorization: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    """Start a resumable upload; chunks are then sent with PATCH"""
+    user = get_user_from_token(token, db, authorization=authorization)
+    if payload.size <= 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Upload size must be positive")
+    if payload.size > RESUMABLE_MAX_UPLOAD_BYTES:
         raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File too large")
-    with open(file_path, "wb") as f:
-        f.write(content)
+    file_ext, file_type = classify_upload(payload.filename, payload.content_type)
 
-    file_url = f"/uploads/{safe_name}"
+    session = UploadSessionService.create(
+        user.id, payload.filename, payload.content_type or "", file_ext, file_type, payload.size
+    )
+    return upload_session_response(session)
 
-    asset = MediaAsset(
-        user_id=user.id,
-        file_url=file_url,
-        file_type=file_type,
+
+@router.get("/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def get_upload_session(
+    upload_id: str,
+    response: Response,
+    token: Optional[str] = None,
+    authorization: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    """Current offset of a resumable upload, also exposed as Upload-Offset"""
+    user = get_user_from_token(token, db, authorization=authorization)
+    session_response = upload_session_response(UploadSessionService.get(upload_id, user.id))
+    response.headers["Upload-Offset"] = str(session_response.offset)
+    response.headers["Cache-Control"] = "no-store"
+    return session_response
+
+
+@router.head("/uploads/{upload_id}")
+async def head_upload_session(
+    upload_id: str,
+    token: Optional[str] = None,
+    authorization: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    user = get_user_from_token(token, db, authorization=authorization)
+    session = UploadSessionService.get(upload_id, user.id)
+    return Response(headers={
+        "Upload-Offset": str(UploadSessionService.offset(upload_id)),
+        "Upload-Length": str(session["size"]),
+        "Cache-Control": "no-store",
+    })
+
+
+@router.patch("/uploads/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(..., alias="Upload-Offset"),
+    token: Optional[str] = None,
+    authorization: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    """Append the request body at Upload-Offset; replies with the new offset"""
+    user = get_user_from_token(token, db, authorization=authorization)
+    session = UploadSessionService.get(upload_id, user.id)
+    db.close()  # Do not hold a pooled connection while the chunk streams in
+    new_offset = await UploadSessionService.append(session, upload_offset, request.stream())
+    return Response(status_code=status.HTTP_204_NO_CONTENT, headers={"Upload-Offset": str(new_offset)})
+
+
+@router.post("/uploads/{upload_id}/complete", response_model=MediaAssetResponse)
+async def complete_upload_session(
+    upload_id: str,
+    token: Optional[str] = None,
+    authorization: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    """Validate and store a fully received upload as a portfolio asset"""
+    user = get_user_from_token(token, db, authorization=authorization)
+    session = UploadSessionService.get(upload_id, user.id)
+    offset = UploadSessionService.offset(upload_id)
+    if offset != session["size"]:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Upload is incomplete",
+            headers={"Upload-Offset": str(offset)},
+        )
+    file_ext, file_type = classify_upload(session["filename"], session["content_type"])
+
+    sha256 = await run_in_threadpool(UploadSessionService.hash_part, upload_id)
+    # acquire_blob consumes what it is given, even when it fails: it gets a staged link,
+    # and the .part file is only discarded once the blob is stored
+    staged = await run_in_threadpool(UploadSessionService.stage_part, upload_id)
+    blob = await run_in_threadpool(MediaService.acquire_blob, db, staged, sha256, offset, file_ext)
+    UploadSessionService.discard(upload_id)
+
+    return MediaAssetResponse.from_orm(create_asset(db, user, blob, file_type))
+
+
+@router.delete("/uploads/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def abort_upload_session(
+    upload_id: str,
+    token: Optional[str] = None,
+    authorization: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    user = get_user_from_token(token, db, authorization=authorization)
+    UploadSessionService.get(upload_id, user.id)
+    UploadSessionService.discard(upload_id)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.patch("/{asset_id}", response_model=MediaAssetResponse)
+async def update_asset(
+    asset_id: int,
+    payload: MediaAssetUpdate,
+    token: Optional[str] = None,
+    authorization: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    """Set or clear an asset's caption; captions go through the same content filter as chat"""
+    user = get_user_from_token(token, db, authorization=authorization)
+    asset = (
+        db.query(MediaAsset)
+        .filter(MediaAsset.id == asset_id, MediaAsset.user_id == user.id)
+        .first()
     )
-    db.add(asset)
+    if not asset:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Asset not found")
+    caption = (payload.caption or "").strip() or None
+    verdict = content_filter.check(caption)
+    if verdict is not None and verdict.blocked:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Caption blocked by the content filter",
+        )
+    asset.caption = caption
+    if verdict is not None:
+        queue_review(db, "media_caption", asset.id, user.id, caption, verdict)
     db.commit()
     db.refresh(asset)
-
     return MediaAssetResponse.from_orm(asset)
+
+
+@router.delete("/{asset_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_asset(
+    asset_id: int,
+    token: Optional[str] = None,
+    authorization: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    user = get_user_from_token(token, db, authorization=authorization)
+    asset = (
+        db.query(MediaAsset)
+        .filter(MediaAsset.id == asset_id, MediaAsset.user_id == user.id)
+        .first()
+    )
+    if not asset:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Asset not found")
+    MediaService.delete_asset(db, asset)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
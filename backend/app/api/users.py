@@ -1,22 +1,39 @@
 """
 User management routes
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Header
+import json
+import os
+import tempfile
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Response, Request, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import List, Optional
 
-from app.db.database import get_db
-from app.schemas.user_schema import UserCreate, UserResponse, WorkspaceResponse
+from app.db.database import get_db, SessionLocal, capped_count, planner_estimate
+from app.schemas.user_schema import UserCreate, UserResponse, UserDirectoryResponse, WorkspaceResponse
 from app.services.user_service import UserService
+from app.services.provisioning_service import ProvisioningService, detect_format, read_rows
+from app.core.serialization import JSONBytesResponse, adapter, encode_row
+from app.core.response_cache import response_cache
 from app.models.user import User, Workspace
+from app.core.conditional import timestamp_etag, etag_matches, not_modified, set_etag
 
 router = APIRouter(prefix="/api/v1/users", tags=["users"])
 
-def get_current_user(
-    authorization: Optional[str] = Header(None),
-    db: Session = Depends(get_db)
-) -> User:
-    """Get current authenticated user from JWT token"""
+# Roles each staff role may create through bulk provisioning
+PROVISIONABLE_ROLES = {
+    "admin": {"admin", "manager", "moderator", "user"},
+    "manager": {"moderator", "user"},
+}
+MAX_IMPORT_BYTES = int(os.getenv("PROVISIONING_MAX_IMPORT_BYTES", str(100 * 1024 * 1024)))
+IMPORT_SPOOL_BYTES = 8 * 1024 * 1024
+DIRECTORY_PAGE_SIZE = 50
+MAX_DIRECTORY_PAGE_SIZE = 200
+# Totals above this are estimated rather than counted
+DIRECTORY_COUNT_CAP = 10000
+
+def get_token_email(authorization: Optional[str] = Header(None)) -> str:
+    """Get the authenticated email from the JWT without loading the user"""
     if not authorization:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -50,6 +67,13 @@ def get_current_user(
             detail="Invalid token",
         )
     
+    return email
+
+def get_current_user(
+    email: str = Depends(get_token_email),
+    db: Session = Depends(get_db)
+) -> User:
+    """Get current authenticated user from JWT token"""
     user = UserService.get_user_by_email(db, email)
     if user is None:
         raise HTTPException(
@@ -59,6 +83,30 @@ def get_current_user(
     
     return user
 
+def get_current_user_id(
+    email: str = Depends(get_token_email),
+    db: Session = Depends(get_db)
+) -> int:
+    """Id of the authenticated user; an index-only lookup, so a deleted account's token stops working"""
+    user_id = db.query(User.id).filter(User.email == email).scalar()
+    if user_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found",
+        )
+    return user_id
+
+def require_roles(*roles: str):
+    """Dependency allowing only users with one of the given roles"""
+    def dependency(current_user: User = Depends(get_current_user)) -> User:
+        if current_user.role not in roles:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Not enough permissions",
+            )
+        return current_user
+    return dependency
+
 @router.post("", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def create_user(
     user_create: UserCreate,
@@ -75,48 +123,180 @@ async def create_user(
     user = UserService.create_user(db, user_create)
     return UserResponse.from_orm(user)
 
+@router.post("/bulk")
+async def bulk_create_users(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(csv|jsonl)$", description="Defaults to the Content-Type"),
+    current_user: User = Depends(require_roles(*PROVISIONABLE_ROLES)),
+) -> StreamingResponse:
+    """Create many users and their workspaces from a CSV or JSONL body
+
+    CSV needs a header row; both formats use the UserImportRow fields.
+    The response is NDJSON with one result per input row as it is
+    processed, then a final {"summary": ...} line. Existing emails are
+    reported and skipped, so an interrupted import can be re-run as is.
+    """
+    fmt = format or detect_format(None, request.headers.get("content-type"))
+    if fmt is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Send text/csv or application/x-ndjson, or pass ?format=",
+        )
+
+    # Spooled so parsing and inserts can run after the request body is drained
+    spool = tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_BYTES)
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > MAX_IMPORT_BYTES:
+            spool.close()
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Import exceeds {MAX_IMPORT_BYTES // (1024 * 1024)} MB",
+            )
+        spool.write(chunk)
+    spool.seek(0)
+    allowed_roles = PROVISIONABLE_ROLES[current_user.role]
+
+    def results():
+        with SessionLocal() as db, spool:
+            for result in ProvisioningService.import_rows(db, read_rows(spool, fmt), allowed_roles):
+                yield json.dumps(result) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+@router.get("", response_model=UserDirectoryResponse)
+async def list_users(
+    request: Request,
+    role: Optional[str] = None,
+    subscription_tier: Optional[str] = None,
+    is_active: Optional[bool] = None,
+    email_prefix: Optional[str] = Query(None, min_length=1, description="Case-sensitive"),
+    limit: int = Query(DIRECTORY_PAGE_SIZE, ge=1, le=MAX_DIRECTORY_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_roles("admin", "manager")),
+) -> UserDirectoryResponse:
+    """User directory for admins and managers, in id order
+
+    Each filter has a (column, id) index, so a page is one index range
+    scan however deep the cursor is. The total is only computed for the
+    first page: counted exactly up to DIRECTORY_COUNT_CAP, beyond that
+    taken from the PostgreSQL planner's estimate with total_exact false.
+    Without an estimate (SQLite) total is null rather than a made-up
+    figure, and total_exact false tells clients there are more than
+    DIRECTORY_COUNT_CAP.
+    """
+    query = db.query(User)
+    if role:
+        query = query.filter(User.role == role)
+    if subscription_tier:
+        query = query.filter(User.subscription_tier == subscription_tier)
+    if is_active is not None:
+        query = query.filter(User.is_active == is_active)
+    if email_prefix:
+        # The range keeps the email index usable whatever the LIKE semantics
+        query = query.filter(
+            User.email >= email_prefix,
+            User.email < email_prefix + "\uffff",
+            User.email.startswith(email_prefix, autoescape=True),
+        )
+
+    total, total_exact = None, True
+    if cursor is None:
+        counted = query.with_entities(User.id)
+        total = capped_count(counted, DIRECTORY_COUNT_CAP)
+        if total > DIRECTORY_COUNT_CAP:
+            estimate = planner_estimate(counted)
+            total = max(estimate, DIRECTORY_COUNT_CAP + 1) if estimate is not None else None
+            total_exact = False
+    else:
+        if not cursor.isdigit():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor",
+            )
+        query = query.filter(User.id > int(cursor))
+
+    users = query.order_by(User.id).limit(limit + 1).all()
+    next_cursor, headers = None, {}
+    if len(users) > limit:
+        users = users[:limit]
+        next_cursor = str(users[-1].id)
+        headers["X-Next-Cursor"] = next_cursor
+        headers["Link"] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
+
+    page = UserDirectoryResponse(
+        items=adapter(List[UserResponse]).validate_python(users, from_attributes=True),
+        next_cursor=next_cursor,
+        total=total,
+        total_exact=total_exact,
+    )
+    return JSONBytesResponse(page.model_dump_json(), headers=headers)
+
 @router.get("/me", response_model=UserResponse)
 async def get_current_user_endpoint(
-    current_user: User = Depends(get_current_user)
+    response: Response,
+    email: str = Depends(get_token_email),
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
 ) -> UserResponse:
-    """Get current authenticated user"""
+    """Get current authenticated user
+
+    Revalidation with If-None-Match only reads the user's id and updated_at.
+    """
+    version = db.query(User.id, User.updated_at).filter(User.email == email).first()
+    if version is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found",
+        )
+    etag = timestamp_etag("user", version.id, version.updated_at)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    current_user = db.query(User).filter(User.id == version.id).first()
+    set_etag(response, timestamp_etag("user", current_user.id, current_user.updated_at))
     return UserResponse.from_orm(current_user)
 
 @router.get("/{user_id}", response_model=UserResponse)
 async def get_user(
     user_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user_id: int = Depends(get_current_user_id)
 ) -> UserResponse:
-    """Get user by ID"""
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found",
-        )
-    
-    return UserResponse.from_orm(user)
+    """Get user by ID
+
+    Served from the response cache (tag user:<id>) when possible; the
+    caller's account is still checked, but only by its email index.
+    """
+    def build() -> bytes:
+        user = db.query(User).filter(User.id == user_id).first()
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found",
+            )
+        return encode_row(UserResponse, user)
+
+    return JSONBytesResponse(response_cache.get_or_build("users.get", str(user_id), [f"user:{user_id}"], build))
 
 @router.get("/{user_id}/workspace", response_model=WorkspaceResponse)
 async def get_user_workspace(
     user_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user_id: int = Depends(get_current_user_id)
 ) -> WorkspaceResponse:
-    """Get user workspace"""
-    workspace = db.query(Workspace).filter(Workspace.user_id == user_id).first()
-    if not workspace:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Workspace not found",
-        )
-    
-    return WorkspaceResponse(
-        id=workspace.id,
-        workspace_name=workspace.workspace_name,
-        workspace_description=workspace.workspace_description,
-        theme=workspace.theme,
-        widgets=workspace.widgets,
-        role=workspace.role,
+    """Get user workspace, cached under workspace:<user_id>"""
+    def build() -> bytes:
+        workspace = db.query(Workspace).filter(Workspace.user_id == user_id).first()
+        if not workspace:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Workspace not found",
+            )
+        return encode_row(WorkspaceResponse, workspace)
+
+    return JSONBytesResponse(
+        response_cache.get_or_build("users.workspace", str(user_id), [f"workspace:{user_id}"], build)
     )
@@ -1,33 +1,37 @@
 """
 Workspace management routes
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Response, Request
+from fastapi.encoders import jsonable_encoder
+from pydantic import ValidationError
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 
 from app.db.database import get_db
-from app.schemas.user_schema import WorkspaceResponse, WorkspaceUpdate
-from app.models.user import Workspace
-from app.api.users import get_current_user
+from app.schemas.user_schema import WorkspaceResponse, WorkspaceUpdate, WorkspaceVersionResponse
+from app.models.user import User, Workspace
+from app.api.users import get_current_user, get_token_email
+from app.core.conditional import version_etag, etag_version, etag_matches, not_modified, set_etag
+from app.core.merge_patch import MERGE_PATCH_CONTENT_TYPE, merge_patch
+from app.core.response_cache import response_cache
 
 router = APIRouter(prefix="/api/v1/workspaces", tags=["workspaces"])
 
-@router.get("/me", response_model=WorkspaceResponse)
-async def get_my_workspace(
-    db: Session = Depends(get_db),
-    current_user=Depends(get_current_user)
-) -> WorkspaceResponse:
-    """Get current user's workspace"""
-    workspace = db.query(Workspace).filter(Workspace.user_id == current_user.id).first()
-    if not workspace:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Workspace not found",
-        )
+# Value a field takes when a merge patch removes it; fields not listed are required
+WORKSPACE_CLEARED_VALUES = {"workspace_description": None, "widgets": [], "layout": {}}
+WORKSPACE_PATCH_ATTEMPTS = 5
 
+def workspace_etag(workspace) -> Optional[str]:
+    return version_etag("workspace", workspace.id, workspace.version)
+
+def workspace_response(workspace: Workspace) -> WorkspaceResponse:
     return WorkspaceResponse(
         id=workspace.id,
         user_id=workspace.user_id,
         role=workspace.role,
+        version=workspace.version,
         workspace_name=workspace.workspace_name,
         workspace_description=workspace.workspace_description,
         theme=workspace.theme,
@@ -36,35 +40,209 @@ async def get_my_workspace(
         updated_at=workspace.updated_at,
     )
 
+@router.get("/me", response_model=WorkspaceResponse)
+async def get_my_workspace(
+    response: Response,
+    email: str = Depends(get_token_email),
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+) -> WorkspaceResponse:
+    """Get current user's workspace
+
+    Revalidation with If-None-Match only reads the workspace's id and
+    version, joined on the token's user, before anything else is loaded.
+    """
+    version = (
+        db.query(Workspace.id, Workspace.version)
+        .join(User, User.id == Workspace.user_id)
+        .filter(User.email == email)
+        .first()
+    )
+    if version is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Workspace not found",
+        )
+    etag = workspace_etag(version)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    workspace = db.query(Workspace).filter(Workspace.id == version.id).first()
+    set_etag(response, workspace_etag(workspace))
+    return workspace_response(workspace)
+
 @router.put("/me", response_model=WorkspaceResponse)
 async def update_my_workspace(
     workspace_update: WorkspaceUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user)
 ) -> WorkspaceResponse:
-    """Update current user's workspace"""
-    workspace = db.query(Workspace).filter(Workspace.user_id == current_user.id).first()
-    if not workspace:
+    """Update current user's workspace
+
+    With If-Match the update only applies if the workspace still has the
+    version the client last read; otherwise 412 Precondition Failed.
+    """
+    update_data = workspace_update.dict(exclude_unset=True)
+
+    if if_match is not None and if_match.strip() != "*":
+        expected = etag_version(if_match, "workspace")
+        if expected is None:
+            raise HTTPException(
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail="Workspace has been modified",
+            )
+        # Compare-and-swap in one statement: no read before the write
+        result = db.execute(
+            update(Workspace)
+            .where(Workspace.user_id == current_user.id, Workspace.version == expected)
+            .values(**update_data, version=Workspace.version + 1, updated_at=datetime.utcnow())
+        )
+        db.commit()
+        workspace = db.query(Workspace).filter(Workspace.user_id == current_user.id).first()
+        if not workspace:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Workspace not found",
+            )
+        if not result.rowcount:
+            raise HTTPException(
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail="Workspace has been modified",
+                headers={"ETag": workspace_etag(workspace)},
+            )
+    else:
+        workspace = db.query(Workspace).filter(Workspace.user_id == current_user.id).first()
+        if not workspace:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Workspace not found",
+            )
+
+        for key, value in update_data.items():
+            setattr(workspace, key, value)
+        workspace.version = Workspace.version + 1
+
+        db.commit()
+        db.refresh(workspace)
+
+    response_cache.invalidate(f"workspace:{current_user.id}")
+    set_etag(response, workspace_etag(workspace))
+    return workspace_response(workspace)
+
+@router.patch("/me", response_model=WorkspaceVersionResponse)
+async def patch_my_workspace(
+    request: Request,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+) -> WorkspaceVersionResponse:
+    """Apply a JSON Merge Patch (RFC 7396) to the current user's workspace
+
+    Only the members present in the patch are read and written, so moving
+    one widget sends a few bytes instead of the whole layout. Each write
+    bumps the version with a compare-and-swap on the previous one. With
+    If-Match the patch applies only to that version (412 otherwise);
+    without it a lost race re-applies the patch to the newer state, so
+    patches from two tabs compose instead of overwriting each other.
+    The response carries only the new version. The body must be sent as
+    application/merge-patch+json (415 otherwise).
+    """
+    media_type = request.headers.get("content-type", "").split(";", 1)[0].strip().lower()
+    if media_type != MERGE_PATCH_CONTENT_TYPE:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Workspace not found",
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Content-Type must be {MERGE_PATCH_CONTENT_TYPE}",
+            headers={"Accept-Patch": MERGE_PATCH_CONTENT_TYPE},
+        )
+    try:
+        patch = await request.json()
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Body must be a JSON merge patch",
+        )
+    if not isinstance(patch, dict):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Merge patch must be a JSON object",
+        )
+    unknown = set(patch) - set(WorkspaceUpdate.model_fields)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Unknown workspace fields: {', '.join(sorted(unknown))}",
         )
 
-    update_data = workspace_update.dict(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(workspace, key, value)
+    expected = None
+    if if_match is not None and if_match.strip() != "*":
+        expected = etag_version(if_match, "workspace")
+        if expected is None:
+            raise HTTPException(
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail="Workspace has been modified",
+            )
 
-    db.commit()
-    db.refresh(workspace)
+    for _ in range(WORKSPACE_PATCH_ATTEMPTS):
+        current = (
+            db.query(Workspace.id, Workspace.version, *[getattr(Workspace, field) for field in patch])
+            .filter(Workspace.user_id == current_user.id)
+            .first()
+        )
+        if current is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Workspace not found",
+            )
+        if expected is not None and current.version != expected:
+            raise HTTPException(
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail="Workspace has been modified",
+                headers={"ETag": workspace_etag(current)},
+            )
 
-    return WorkspaceResponse(
-        id=workspace.id,
-        user_id=workspace.user_id,
-        role=workspace.role,
-        workspace_name=workspace.workspace_name,
-        workspace_description=workspace.workspace_description,
-        theme=workspace.theme,
-        widgets=workspace.widgets,
-        created_at=workspace.created_at,
-        updated_at=workspace.updated_at,
+        document = merge_patch({field: getattr(current, field) for field in patch}, patch)
+        values = {}
+        for field in patch:
+            if field in document:
+                values[field] = document[field]
+            elif field in WORKSPACE_CLEARED_VALUES:
+                values[field] = WORKSPACE_CLEARED_VALUES[field]
+            else:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail=f"{field} cannot be removed",
+                )
+        try:
+            values = WorkspaceUpdate.model_validate(values).model_dump(include=set(values))
+        except ValidationError as exc:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=jsonable_encoder(exc.errors(include_url=False, include_context=False)),
+            )
+
+        version = current.version + 1
+        result = db.execute(
+            update(Workspace)
+            .where(Workspace.id == current.id, Workspace.version == current.version)
+            .values(**values, version=version, updated_at=datetime.utcnow())
+        )
+        db.commit()
+        if result.rowcount:
+            response_cache.invalidate(f"workspace:{current_user.id}")
+            set_etag(response, version_etag("workspace", current.id, version))
+            return WorkspaceVersionResponse(version=version)
+        if expected is not None:
+            latest = db.query(Workspace.id, Workspace.version).filter(Workspace.id == current.id).first()
+            raise HTTPException(
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail="Workspace has been modified",
+                headers={"ETag": workspace_etag(latest)} if latest else None,
+            )
+
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="Workspace is being modified concurrently, retry the patch",
     )
@@ -0,0 +1,181 @@
+"""
+Negotiated gzip / brotli response compression with a precompressed-body cache
+"""
+import gzip
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Optional
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Below this a response fits in a packet or two and compressing it only costs CPU
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_CACHE_BYTES = int(os.getenv("COMPRESSION_CACHE_BYTES", str(32 * 1024 * 1024)))
+# Larger bodies are compressed off the event loop (zlib and brotli release the GIL)
+COMPRESSION_THREAD_BYTES = 256 * 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # dynamic-content setting: close to gzip -9 in size, faster than gzip -6
+
+COMPRESSIBLE_TYPES = {
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+}
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Best supported encoding the client accepts: br, then gzip"""
+    accepted = {}
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            accepted[coding.strip()] = quality
+    for coding in ("br", "gzip") if brotli is not None else ("gzip",):
+        if accepted.get(coding, accepted.get("*", 0.0)) > 0:
+            return coding
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def is_shared(headers: Headers) -> bool:
+    """Whether a response may be stored outside the request it answers"""
+    cache_control = headers.get("cache-control", "").lower()
+    return "private" not in cache_control and "no-store" not in cache_control
+
+
+def is_compressible(headers: Headers) -> bool:
+    content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+    if not (content_type.startswith("text/") or content_type in COMPRESSIBLE_TYPES):
+        return False
+    if content_type == "text/event-stream":
+        # Each event must reach the client as it is sent
+        return False
+    if "content-encoding" in headers or "no-transform" in headers.get("cache-control", ""):
+        return False
+    # A strong ETag names exact bytes; it cannot be shared by the compressed variant
+    etag = headers.get("etag")
+    return etag is None or etag.startswith("W/")
+
+
+class CompressionCache:
+    """LRU of compressed bodies keyed by encoding and a digest of the original
+
+    Repeat payloads (an unchanged chat page, a popular portfolio listing)
+    cost one BLAKE2 pass instead of a full compression. Bodies passed with
+    store=False (per-user responses) are compressed but never kept.
+    """
+
+    def __init__(self, max_bytes: int = COMPRESSION_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+
+    async def compressed(self, body: bytes, encoding: str, store: bool = True) -> bytes:
+        cacheable = store and len(body) <= self.max_bytes // 8
+        key = (encoding, hashlib.blake2b(body, digest_size=16).digest()) if cacheable else None
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+        self.misses += 1
+        if len(body) >= COMPRESSION_THREAD_BYTES:
+            result = await anyio.to_thread.run_sync(compress, body, encoding)
+        else:
+            result = compress(body, encoding)
+        if cacheable:
+            self._entries[key] = result
+            self.size += len(result)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+        return result
+
+
+compression_cache = CompressionCache()
+
+
+class CompressionMiddleware:
+    """Compress complete text/JSON responses above a size threshold
+
+    Only single-message bodies are compressed; streamed responses (NDJSON
+    imports, file downloads, zero-copy sends, server-sent events) and
+    ranges pass through untouched. The compressed body is only used when
+    it is actually smaller, and Cache-Control: private or no-store bodies
+    are left out of the compression cache.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_BYTES,
+                 cache: CompressionCache = compression_cache):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cache = cache
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        start_message: Optional[Message] = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+
+            headers = MutableHeaders(raw=start_message["headers"])
+            eligible = start_message["status"] not in (204, 206, 304) and is_compressible(headers)
+            if eligible:
+                headers.add_vary_header("Accept-Encoding")
+            body = message.get("body", b"")
+            if (
+                message["type"] != "http.response.body"
+                or message.get("more_body", False)
+                or not eligible
+                or encoding is None
+                or len(body) < self.minimum_size
+            ):
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            compressed = await self.cache.compressed(body, encoding, store=is_shared(headers))
+            if len(compressed) < len(body):
+                body = compressed
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body, "more_body": False})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,58 @@
+"""
+Conditional request helpers (ETag, If-None-Match, If-Match)
+"""
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import Response, status
+
+EPOCH = datetime(1970, 1, 1)
+# Clients must revalidate, which browsers do automatically with If-None-Match
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+
+
+def timestamp_etag(kind: str, row_id: int, updated_at: Optional[datetime]) -> Optional[str]:
+    """Weak ETag identifying a row version by its updated_at, in whole microseconds"""
+    if updated_at is None:
+        return None
+    micros = (updated_at - EPOCH) // timedelta(microseconds=1)
+    return f'W/"{kind}-{row_id}-{micros}"'
+
+
+def version_etag(kind: str, row_id: int, version: Optional[int]) -> Optional[str]:
+    """Weak ETag identifying a row version by its version counter"""
+    if version is None:
+        return None
+    return f'W/"{kind}-{row_id}-v{version}"'
+
+
+def etag_version(etag: str, kind: str) -> Optional[int]:
+    """Version counter encoded in an ETag produced by version_etag"""
+    opaque = etag.strip().removeprefix("W/").strip('"')
+    prefix, _, version = opaque.rpartition("-v")
+    if not prefix.startswith(f"{kind}-") or not version.isdigit():
+        return None
+    return int(version)
+
+
+def etag_matches(header: Optional[str], etag: Optional[str]) -> bool:
+    """Weak comparison of an ETag against an If-None-Match / If-Match list"""
+    if not header or not etag:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in header.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers={"ETag": etag, "Cache-Control": REVALIDATE_CACHE_CONTROL},
+    )
+
+
+def set_etag(response: Response, etag: Optional[str]) -> None:
+    if etag:
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = REVALIDATE_CACHE_CONTROL
@@ -0,0 +1,359 @@
+"""
+Idempotency-Key support for writes that clients retry
+
+A client that may retry a write sends a unique Idempotency-Key header
+with it. The first request with a key runs normally and its response is
+stored for IDEMPOTENCY_TTL_SECONDS; a retry with the same key gets the
+stored response back, marked Idempotent-Replayed: true, without the
+handler running again. A re-sent chat post is not inserted twice and a
+re-sent upload is not written to disk twice.
+
+Keys are scoped to the caller (token subject) and route. Reusing a key
+with a different request body is rejected with 422. A retry that arrives
+while the first request is still running waits for it when both hit the
+same worker, and gets 409 with Retry-After otherwise. 5xx responses are
+not stored, so those can be retried for real.
+
+Responses are stored in idempotency_records, fronted by an in-process
+LRU of completed entries (they never change once written).
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Union
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+from starlette.datastructures import Headers, QueryParams
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.db.database import SessionLocal
+from app.models.user import IdempotencyRecord
+from app.services.user_service import UserService
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+# A key still pending after this long belongs to a request that died; the next retry takes it over
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "300"))
+IDEMPOTENCY_CACHE_ENTRIES = int(os.getenv("IDEMPOTENCY_CACHE_ENTRIES", "10000"))
+# Larger responses are not stored; a retry runs the handler again
+IDEMPOTENCY_MAX_BODY_BYTES = 1024 * 1024
+MAX_KEY_LENGTH = 255
+
+IDEMPOTENT_ROUTES = {
+    ("POST", "/api/v1/chat/messages"),
+    ("POST", "/api/v1/portfolio/upload"),
+    ("POST", "/api/v1/users"),
+    ("PUT", "/api/v1/workspaces/me"),
+}
+
+# Recomputed or set by outer middleware on replay
+UNSTORED_HEADERS = {b"content-length", b"date", b"server", b"x-request-id"}
+
+IN_PROGRESS = "in_progress"
+CLAIMED = "claimed"
+
+
+class StoredResponse:
+    def __init__(self, fingerprint: str, status: int, headers: List[List[str]], body: bytes):
+        self.fingerprint = fingerprint
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+class BodyFingerprint:
+    """sha256 of a request body as it streams in
+
+    Multipart boundaries are left out: browsers pick a new random boundary
+    each time a form is sent, so a retried upload would never match.
+    """
+
+    def __init__(self, content_type: str):
+        self._hash = hashlib.sha256()
+        self._boundary = None
+        self._tail = b""
+        if content_type.startswith("multipart/"):
+            for param in content_type.split(";")[1:]:
+                name, _, value = param.strip().partition("=")
+                if name.lower() == "boundary" and value:
+                    self._boundary = value.strip('"').encode("latin-1")
+
+    def update(self, chunk: bytes) -> None:
+        if self._boundary is None:
+            self._hash.update(chunk)
+            return
+        # Hold back enough bytes to catch a boundary split across two chunks
+        data = (self._tail + chunk).replace(self._boundary, b"")
+        keep = len(self._boundary) - 1
+        self._hash.update(data[:-keep] if len(data) > keep else b"")
+        self._tail = data[-keep:] if len(data) > keep else data
+
+    def hexdigest(self) -> str:
+        self._hash.update(self._tail)
+        self._tail = b""
+        return self._hash.hexdigest()
+
+
+class IdempotencyStore:
+    """Database table of stored responses with an LRU of completed ones in front"""
+
+    def __init__(self, max_entries: int = IDEMPOTENCY_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._cache: OrderedDict = OrderedDict()  # key -> (expires_at epoch, StoredResponse)
+        # Keys whose first request is running in this process
+        self.inflight: Dict[str, asyncio.Event] = {}
+
+    def cached(self, key: str) -> Optional[StoredResponse]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.time():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return entry[1]
+
+    def _remember(self, key: str, expires_at: datetime, stored: StoredResponse) -> None:
+        self._cache[key] = ((expires_at - datetime.utcnow()).total_seconds() + time.time(), stored)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def claim(self, key: str) -> Union[str, StoredResponse]:
+        """Reserve key for this request: CLAIMED, IN_PROGRESS elsewhere, or the stored response"""
+        now = datetime.utcnow()
+        with SessionLocal() as db:
+            try:
+                db.add(IdempotencyRecord(
+                    key=key,
+                    status="pending",
+                    locked_until=now + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS),
+                    expires_at=now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+                ))
+                db.commit()
+                return CLAIMED
+            except IntegrityError:
+                db.rollback()
+
+            record = db.get(IdempotencyRecord, key)
+            if record is None:
+                return IN_PROGRESS  # removed in between; the client's next retry claims it
+            if record.status == "complete" and record.expires_at > now:
+                stored = StoredResponse(
+                    record.fingerprint, record.response_status, record.response_headers, record.response_body,
+                )
+                self._remember(key, record.expires_at, stored)
+                return stored
+            if record.status == "pending" and record.locked_until > now:
+                return IN_PROGRESS
+            # Expired, or abandoned by a request that died: take it over unless another retry just did
+            taken = db.execute(
+                update(IdempotencyRecord)
+                .where(
+                    IdempotencyRecord.key == key,
+                    IdempotencyRecord.status == record.status,
+                    IdempotencyRecord.expires_at == record.expires_at,
+                )
+                .values(
+                    status="pending",
+                    fingerprint=None,
+                    response_status=None,
+                    response_headers=[],
+                    response_body=None,
+                    locked_until=now + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS),
+                    expires_at=now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+                )
+            ).rowcount
+            db.commit()
+            return CLAIMED if taken else IN_PROGRESS
+
+    def complete(self, key: str, stored: StoredResponse) -> None:
+        expires_at = datetime.utcnow() + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS)
+        with SessionLocal() as db:
+            db.execute(
+                update(IdempotencyRecord)
+                .where(IdempotencyRecord.key == key)
+                .values(
+                    status="complete",
+                    fingerprint=stored.fingerprint,
+                    response_status=stored.status,
+                    response_headers=stored.headers,
+                    response_body=stored.body,
+                    locked_until=None,
+                    expires_at=expires_at,
+                )
+            )
+            db.commit()
+        self._remember(key, expires_at, stored)
+
+    def release(self, key: str) -> None:
+        """Forget a claimed key whose response is not stored, so a retry runs again"""
+        with SessionLocal() as db:
+            db.query(IdempotencyRecord).filter(
+                IdempotencyRecord.key == key, IdempotencyRecord.status == "pending",
+            ).delete(synchronize_session=False)
+            db.commit()
+
+    def purge_expired(self) -> int:
+        now = datetime.utcnow()
+        with SessionLocal() as db:
+            removed = db.query(IdempotencyRecord).filter(or_(
+                IdempotencyRecord.expires_at < now,
+                IdempotencyRecord.locked_until < now,
+            )).delete(synchronize_session=False)
+            db.commit()
+        return removed
+
+
+idempotency_store = IdempotencyStore()
+
+
+def request_subject(scope: Scope, headers: Headers) -> str:
+    """Token subject, so a key is private to its user; anonymous for signups and bad tokens"""
+    token = QueryParams(scope.get("query_string", b"")).get("token")
+    scheme, _, value = headers.get("authorization", "").partition(" ")
+    if not token and scheme.lower() == "bearer":
+        token = value.strip()
+    payload = UserService.verify_token(token) if token else None
+    return (payload or {}).get("sub") or "anonymous"
+
+
+async def send_json(send: Send, status_code: int, detail: str, headers: Optional[List[tuple]] = None) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            *(headers or []),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def replay(send: Send, stored: StoredResponse) -> None:
+    await send({
+        "type": "http.response.start",
+        "status": stored.status,
+        "headers": [
+            *((name.encode("latin-1"), value.encode("latin-1")) for name, value in stored.headers),
+            (b"content-length", str(len(stored.body)).encode()),
+            (REPLAYED_HEADER.lower().encode(), b"true"),
+        ],
+    })
+    await send({"type": "http.response.body", "body": stored.body})
+
+
+async def drain(receive: Receive, fingerprint: BodyFingerprint) -> str:
+    """Read (and discard) the request body, for requests that will not reach the handler"""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        fingerprint.update(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return fingerprint.hexdigest()
+
+
+class IdempotencyMiddleware:
+    """Run each Idempotency-Key once per user and route; replay the stored response to retries"""
+
+    def __init__(self, app: ASGIApp, store: IdempotencyStore = idempotency_store):
+        self.app = app
+        self.store = store
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or (scope["method"], scope["path"]) not in IDEMPOTENT_ROUTES:
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        key = headers.get(IDEMPOTENCY_HEADER.lower())
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+        if not 0 < len(key) <= MAX_KEY_LENGTH:
+            await send_json(send, 400, f"{IDEMPOTENCY_HEADER} must be 1 to {MAX_KEY_LENGTH} characters")
+            return
+
+        subject = request_subject(scope, headers)
+        scoped_key = hashlib.sha256(f"{subject}\n{scope['method']}\n{scope['path']}\n{key}".encode()).hexdigest()
+        fingerprint = BodyFingerprint(headers.get("content-type", ""))
+
+        stored = self.store.cached(scoped_key)
+        if stored is None and scoped_key in self.store.inflight:
+            # Same key already running in this process: wait for its response instead of redoing the work
+            body_hash = await drain(receive, fingerprint)
+            await self.store.inflight[scoped_key].wait()
+            stored = self.store.cached(scoped_key)
+            if stored is None:
+                await send_json(send, 409, "A request with this Idempotency-Key failed; retry it",
+                                [(b"retry-after", b"1")])
+                return
+            await self._replay(send, stored, body_hash)
+            return
+        if stored is not None:
+            await self._replay(send, stored, await drain(receive, fingerprint))
+            return
+
+        # Registered before the first await, so a concurrent duplicate always finds it
+        event = self.store.inflight[scoped_key] = asyncio.Event()
+        try:
+            claimed = await run_in_threadpool(self.store.claim, scoped_key)
+            if isinstance(claimed, StoredResponse):
+                await self._replay(send, claimed, await drain(receive, fingerprint))
+            elif claimed == IN_PROGRESS:
+                await send_json(send, 409, "A request with this Idempotency-Key is in progress",
+                                [(b"retry-after", b"1")])
+            else:
+                await self._run(scope, receive, send, scoped_key, fingerprint)
+        finally:
+            del self.store.inflight[scoped_key]
+            event.set()
+
+    async def _replay(self, send: Send, stored: StoredResponse, body_hash: str) -> None:
+        if stored.fingerprint != body_hash:
+            await send_json(send, 422, f"{IDEMPOTENCY_HEADER} was already used with a different request")
+            return
+        await replay(send, stored)
+
+    async def _run(self, scope: Scope, receive: Receive, send: Send, key: str, fingerprint: BodyFingerprint) -> None:
+        response = {"status": None, "headers": [], "body": [], "size": 0}
+
+        async def fingerprinting_receive() -> Message:
+            message = await receive()
+            if message["type"] == "http.request":
+                fingerprint.update(message.get("body", b""))
+            return message
+
+        async def capturing_send(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = [
+                    [name.decode("latin-1"), value.decode("latin-1")]
+                    for name, value in message.get("headers", [])
+                    if name.lower() not in UNSTORED_HEADERS
+                ]
+            elif message["type"] == "http.response.body" and response["size"] <= IDEMPOTENCY_MAX_BODY_BYTES:
+                response["body"].append(message.get("body", b""))
+                response["size"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, fingerprinting_receive, capturing_send)
+        except BaseException:
+            await run_in_threadpool(self.store.release, key)
+            raise
+        if response["status"] is None or response["status"] >= 500 or response["size"] > IDEMPOTENCY_MAX_BODY_BYTES:
+            await run_in_threadpool(self.store.release, key)
+            return
+        stored = StoredResponse(fingerprint.hexdigest(), response["status"], response["headers"], b"".join(response["body"]))
+        await run_in_threadpool(self.store.complete, key, stored)
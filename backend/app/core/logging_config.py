@@ -0,0 +1,253 @@
+"""
+Structured, non-blocking logging with request IDs and per-logger sampling
+
+Log calls never touch stdout on the calling thread: records are put on a
+bounded queue (dropped and counted when it is full, never waited on) and a
+background listener thread formats and writes them. Records carry the
+request ID of the HTTP request or WebSocket they were logged from.
+
+LOG_SAMPLE_RATES keeps a fraction of INFO and lower records for chatty
+loggers, e.g. "app.chat.frames=0.01" keeps one in a hundred frame logs;
+a rate applies to the named logger and its children. Warnings and errors
+are never sampled.
+"""
+import copy
+import itertools
+import json
+import logging
+import os
+import queue
+import re
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from pathlib import Path
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+ROOT_DIR = Path(__file__).resolve().parents[3]
+load_dotenv(dotenv_path=ROOT_DIR / ".env", override=True)
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json | text
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_SAMPLE_RATES = {
+    name.strip(): float(rate)
+    for name, _, rate in (
+        item.partition("=") for item in os.getenv("LOG_SAMPLE_RATES", "app.chat.frames=0.01").split(",")
+    )
+    if name.strip() and rate.strip()
+}
+
+REQUEST_ID_HEADER = "X-Request-ID"
+# Client-supplied IDs are kept when they look like IDs, so they can be traced across services
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# LogRecord attributes; anything else on a record came from extra={...}
+RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "request_id", "sample_rate"}
+
+access_logger = logging.getLogger("app.access")
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the current request ID on the logging thread"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep every Nth INFO-or-lower record of loggers with a sample rate"""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._counters: Dict[str, itertools.count] = {}
+        self._resolved: Dict[str, Optional[float]] = {}
+
+    def rate_for(self, name: str) -> Optional[float]:
+        if name not in self._resolved:
+            logger_name = name
+            while logger_name and logger_name not in self.rates:
+                logger_name = logger_name.rpartition(".")[0]
+            self._resolved[name] = self.rates.get(logger_name)
+        return self._resolved[name]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rate_for(record.name)
+        if rate is None or rate >= 1 or record.levelno >= logging.WARNING:
+            return True
+        if rate <= 0:
+            return False
+        counter = self._counters.setdefault(record.name, itertools.count())
+        record.sample_rate = rate
+        return next(counter) % round(1 / rate) == 0
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only merge args and render the traceback here; JSON formatting happens on the writer thread
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line; extra={...} fields become top-level keys"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        if getattr(record, "sample_rate", None):
+            entry["sample_rate"] = record.sample_rate
+        for key, value in vars(record).items():
+            if key not in RESERVED_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        record.request_id = getattr(record, "request_id", None) or "-"
+        return super().format(record)
+
+
+class WriterHandler(logging.StreamHandler):
+    """Listener-side handler; reports records dropped on a full queue"""
+
+    def __init__(self, source: NonBlockingQueueHandler):
+        super().__init__(sys.stderr)
+        self.source = source
+        self.reported = 0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        dropped = self.source.dropped
+        if dropped > self.reported:
+            super().emit(logging.makeLogRecord({
+                "name": __name__,
+                "levelno": logging.WARNING,
+                "levelname": "WARNING",
+                "msg": f"Log queue full, dropped {dropped - self.reported} records",
+            }))
+            self.reported = dropped
+        super().emit(record)
+
+
+_listener: Optional[QueueListener] = None
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT) -> None:
+    """Route all logging through the queue; safe to call more than once"""
+    global _listener
+    if _listener is not None:
+        return
+
+    queue_handler = NonBlockingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+    queue_handler.addFilter(SamplingFilter(LOG_SAMPLE_RATES))
+    queue_handler.addFilter(RequestIdFilter())
+    writer = WriterHandler(queue_handler)
+    writer.setFormatter(JSONFormatter() if fmt == "json" else TextFormatter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level)
+    # uvicorn writes to its own stream handlers; send its records through the queue instead.
+    # Its access log is replaced by app.access, which carries the request ID.
+    for name in ("uvicorn", "uvicorn.error"):
+        logging.getLogger(name).handlers = []
+        logging.getLogger(name).propagate = True
+    logging.getLogger("uvicorn.access").disabled = True
+
+    _listener = QueueListener(queue_handler.queue, writer, respect_handler_level=False)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class RequestContextMiddleware:
+    """Assign each request and WebSocket a request ID and log one access record per request
+
+    The ID comes from the client's X-Request-ID when it looks like one,
+    otherwise it is generated, and it is echoed in the response headers.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        supplied = Headers(scope=scope).get(REQUEST_ID_HEADER.lower(), "")
+        request_id = supplied if REQUEST_ID_PATTERN.match(supplied) else uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+        started = time.perf_counter()
+        status_code = None
+
+        async def send_with_id(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                MutableHeaders(raw=message["headers"])[REQUEST_ID_HEADER] = request_id
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            if scope["type"] == "http":
+                access_logger.info(
+                    "%s %s %s",
+                    scope["method"],
+                    scope["path"],
+                    status_code,
+                    extra={
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "status": status_code,
+                        "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                    },
+                )
+            request_id_var.reset(token)
@@ -0,0 +1,165 @@
+"""
+Static media serving with byte ranges, strong ETags and immutable caching
+"""
+import os
+import re
+from pathlib import Path
+from secrets import token_hex
+from typing import List, Optional, Tuple
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Receive, Scope, Send
+
+# Upload files are never rewritten under the same name: content-addressed
+# blobs and their derivatives are named after the SHA-256 of the content
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+MEDIA_CHUNK_BYTES = int(os.getenv("MEDIA_CHUNK_BYTES", str(1024 * 1024)))
+# When set (e.g. "/_protected_uploads/"), nginx serves the file itself with sendfile
+MEDIA_ACCEL_REDIRECT = os.getenv("MEDIA_ACCEL_REDIRECT", "")
+
+CONTENT_ADDRESSED_NAME = re.compile(r"[0-9a-f]{64}(_[a-z0-9]+)?")
+CRLF = "\r\n"
+
+
+def content_etag(path: str) -> Optional[str]:
+    """Strong ETag for content-addressed files, derived from the file name"""
+    stem = Path(path).name.split(".", 1)[0]
+    if CONTENT_ADDRESSED_NAME.fullmatch(stem):
+        return f'"{stem}"'
+    return None
+
+
+def multipart_framing(ranges: list, boundary: str, file_size: int, content_type: str) -> Tuple[List[bytes], bytes]:
+    """Part headers and closing delimiter of a multipart/byteranges body
+
+    The body is the part headers each followed by their range, then the
+    closing delimiter; Content-Length is computed from these same bytes.
+    """
+    part_headers = [
+        (
+            f"{CRLF if index else ''}--{boundary}{CRLF}"
+            f"Content-Type: {content_type}{CRLF}"
+            f"Content-Range: bytes {start}-{end - 1}/{file_size}{CRLF}{CRLF}"
+        ).encode("latin-1")
+        for index, (start, end) in enumerate(ranges)
+    ]
+    return part_headers, f"{CRLF}--{boundary}--{CRLF}".encode("latin-1")
+
+
+class MediaFileResponse(FileResponse):
+    """FileResponse using large reads and the ASGI zero-copy extension when available
+
+    The _handle_* and _should_use_range overrides follow Starlette's private
+    FileResponse API, which is why requirements.txt pins starlette.
+    """
+
+    chunk_size = MEDIA_CHUNK_BYTES
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.zerocopy = "http.response.zerocopy" in scope.get("extensions", {})
+        await super().__call__(scope, receive, send)
+
+    def _should_use_range(self, http_if_range: str, stat_result: os.stat_result) -> bool:
+        return http_if_range in (self.headers["etag"], self.headers["last-modified"])
+
+    async def _handle_simple(self, send: Send, send_header_only: bool) -> None:
+        if not self.zerocopy or send_header_only:
+            return await super()._handle_simple(send, send_header_only)
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        await self._send_zerocopy(send, 0, int(self.headers["content-length"]))
+
+    async def _handle_single_range(
+        self, send: Send, start: int, end: int, file_size: int, send_header_only: bool
+    ) -> None:
+        if not self.zerocopy or send_header_only:
+            return await super()._handle_single_range(send, start, end, file_size, send_header_only)
+        self.headers["content-range"] = f"bytes {start}-{end - 1}/{file_size}"
+        self.headers["content-length"] = str(end - start)
+        await send({"type": "http.response.start", "status": 206, "headers": self.raw_headers})
+        await self._send_zerocopy(send, start, end - start)
+
+    async def _handle_multiple_ranges(
+        self, send: Send, ranges: list, file_size: int, send_header_only: bool
+    ) -> None:
+        # Starlette announces the multipart boundary in Content-Range; clients read it from Content-Type
+        boundary = token_hex(13)
+        part_headers, closing = multipart_framing(ranges, boundary, file_size, self.headers["content-type"])
+        content_length = sum(map(len, part_headers)) + sum(end - start for start, end in ranges) + len(closing)
+        self.headers["content-type"] = f"multipart/byteranges; boundary={boundary}"
+        self.headers["content-length"] = str(content_length)
+        await send({"type": "http.response.start", "status": 206, "headers": self.raw_headers})
+        if send_header_only:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            for part_header, (start, end) in zip(part_headers, ranges):
+                await send({"type": "http.response.body", "body": part_header, "more_body": True})
+                await file.seek(start)
+                while start < end:
+                    chunk = await file.read(min(self.chunk_size, end - start))
+                    start += len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": closing, "more_body": False})
+
+    async def _send_zerocopy(self, send: Send, offset: int, count: int) -> None:
+        with open(self.path, "rb") as file:
+            await send({
+                "type": "http.response.zerocopy",
+                "file": file,
+                "offset": offset,
+                "count": count,
+                "more_body": False,
+            })
+
+
+class MediaFiles(StaticFiles):
+    """StaticFiles for user uploads"""
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        # Hidden directories hold partial uploads and are never served
+        if path.split(os.sep, 1)[0].startswith("."):
+            raise HTTPException(status_code=404)
+        return await super().get_response(path, scope)
+
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        headers = {"cache-control": IMMUTABLE_CACHE_CONTROL}
+        etag = content_etag(full_path)
+        if etag:
+            headers["etag"] = etag
+
+        response = MediaFileResponse(full_path, status_code=status_code, headers=headers, stat_result=stat_result)
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+
+        if MEDIA_ACCEL_REDIRECT:
+            relative = Path(full_path).relative_to(self.directory).as_posix()
+            return Response(
+                status_code=status_code,
+                media_type=response.media_type,
+                headers={
+                    **headers,
+                    "etag": response.headers["etag"],
+                    "x-accel-redirect": f"{MEDIA_ACCEL_REDIRECT.rstrip('/')}/{relative}",
+                },
+            )
+        return response
+
+    def is_not_modified(self, response_headers: Headers, request_headers: Headers) -> bool:
+        # If-None-Match takes precedence over If-Modified-Since (RFC 9110 13.1.3)
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is None:
+            return super().is_not_modified(response_headers, request_headers)
+        if if_none_match.strip() == "*":
+            return True
+        etag = response_headers["etag"]
+        return etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
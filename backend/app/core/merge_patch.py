@@ -0,0 +1,24 @@
+"""
+JSON Merge Patch (RFC 7396)
+"""
+from typing import Any
+
+MERGE_PATCH_CONTENT_TYPE = "application/merge-patch+json"
+
+
+def merge_patch(target: Any, patch: Any) -> Any:
+    """Apply a merge patch to a JSON value and return the result
+
+    Objects are merged key by key, a null member removes the key, and any
+    other patch value (arrays included) replaces the target outright.
+    The target is not modified.
+    """
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = merge_patch(result.get(key), value)
+    return result
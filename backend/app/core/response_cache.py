@@ -0,0 +1,183 @@
+"""
+Response cache for hot read endpoints, with tag-based invalidation
+
+Routes cache their encoded JSON body under (route, key) with tags such as
+user:4, workspace:4 or channel:community; writes invalidate by tag. The
+in-process LRU is the default. With RESPONSE_CACHE_BACKEND=redis the cache
+is shared across workers, so an invalidation in one worker is seen by all
+(with the memory backend other workers may serve a stale entry for up to
+RESPONSE_CACHE_TTL_SECONDS).
+"""
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional
+
+try:
+    import redis
+except ImportError:  # only needed for RESPONSE_CACHE_BACKEND=redis
+    redis = None
+
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")  # memory | redis | off
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "60"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "4096"))
+RESPONSE_CACHE_DISABLED_ROUTES = {
+    route.strip() for route in os.getenv("RESPONSE_CACHE_DISABLED_ROUTES", "").split(",") if route.strip()
+}
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+
+class MemoryCacheBackend:
+    """LRU of bodies with a tag -> keys index for invalidation"""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()  # key -> (body, expires_at, tags)
+        self._tags: Dict[str, set] = {}
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def set(self, key: str, body: bytes, tags: Iterable[str], ttl: int) -> None:
+        self._remove(key)
+        tags = tuple(tags)
+        self._entries[key] = (body, time.monotonic() + ttl, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate(self, tags: Iterable[str]) -> None:
+        for tag in tags:
+            for key in self._tags.pop(tag, ()):
+                self._remove(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._tags.clear()
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class RedisCacheBackend:
+    """Shared cache: bodies as string keys, tags as sets of those keys"""
+
+    prefix = "kcd:rc:"
+
+    def __init__(self, url: str = REDIS_URL):
+        if redis is None:
+            raise RuntimeError("redis is required for RESPONSE_CACHE_BACKEND=redis")
+        self.client = redis.Redis.from_url(url, socket_timeout=0.25)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, body: bytes, tags: Iterable[str], ttl: int) -> None:
+        pipe = self.client.pipeline()
+        pipe.set(self.prefix + key, body, ex=ttl)
+        for tag in tags:
+            tag_key = f"{self.prefix}tag:{tag}"
+            pipe.sadd(tag_key, self.prefix + key)
+            pipe.expire(tag_key, ttl)
+        pipe.execute()
+
+    def invalidate(self, tags: Iterable[str]) -> None:
+        for tag in tags:
+            tag_key = f"{self.prefix}tag:{tag}"
+            keys = self.client.smembers(tag_key)
+            self.client.delete(tag_key, *keys)
+
+    def clear(self) -> None:
+        for key in self.client.scan_iter(f"{self.prefix}*"):
+            self.client.delete(key)
+
+
+class ResponseCache:
+    """Route-level cache front with per-route hit statistics and kill switches
+
+    Backend errors (e.g. Redis unavailable) are counted and treated as a
+    miss, so the cache can never take a route down.
+    """
+
+    def __init__(self, backend=None, ttl: int = RESPONSE_CACHE_TTL_SECONDS,
+                 disabled_routes: Iterable[str] = RESPONSE_CACHE_DISABLED_ROUTES):
+        self.backend = backend
+        self.ttl = ttl
+        self.disabled_routes = set(disabled_routes)
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def enabled(self, route: str) -> bool:
+        return self.backend is not None and route not in self.disabled_routes
+
+    def _count(self, route: str, outcome: str) -> None:
+        stats = self._stats.setdefault(route, {"hits": 0, "misses": 0, "errors": 0})
+        stats[outcome] += 1
+
+    def get_or_build(self, route: str, key: str, tags: Iterable[str], build: Callable[[], bytes]) -> bytes:
+        """Cached body for (route, key), or build() stored under the given tags"""
+        if not self.enabled(route):
+            return build()
+        cache_key = f"{route}:{key}"
+        try:
+            body = self.backend.get(cache_key)
+        except Exception:
+            self._count(route, "errors")
+            return build()
+        if body is not None:
+            self._count(route, "hits")
+            return body
+
+        self._count(route, "misses")
+        body = build()
+        try:
+            self.backend.set(cache_key, body, tags, self.ttl)
+        except Exception:
+            self._count(route, "errors")
+        return body
+
+    def invalidate(self, *tags: str) -> None:
+        if self.backend is None:
+            return
+        try:
+            self.backend.invalidate(tags)
+        except Exception:
+            self._count("invalidate", "errors")
+
+    def stats(self) -> dict:
+        routes = {}
+        for route, stats in self._stats.items():
+            lookups = stats["hits"] + stats["misses"]
+            routes[route] = {**stats, "hit_ratio": round(stats["hits"] / lookups, 4) if lookups else None}
+        return {
+            "backend": RESPONSE_CACHE_BACKEND if self.backend is not None else "off",
+            "ttl_seconds": self.ttl,
+            "disabled_routes": sorted(self.disabled_routes),
+            "routes": routes,
+        }
+
+
+def build_response_cache() -> ResponseCache:
+    if RESPONSE_CACHE_BACKEND == "off":
+        return ResponseCache(backend=None)
+    if RESPONSE_CACHE_BACKEND == "redis":
+        return ResponseCache(backend=RedisCacheBackend())
+    return ResponseCache(backend=MemoryCacheBackend())
+
+
+response_cache = build_response_cache()
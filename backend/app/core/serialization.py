@@ -0,0 +1,43 @@
+"""
+Fast-path JSON serialization for list endpoints and WebSocket fan-out
+"""
+from functools import lru_cache
+from typing import Any, Iterable, List
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+
+class JSONBytesResponse(Response):
+    """Response for a body that is already encoded JSON
+
+    Returning it from a route skips FastAPI's response_model validation
+    and jsonable_encoder pass; the route keeps response_model for the docs.
+    """
+
+    media_type = "application/json"
+
+
+@lru_cache(maxsize=None)
+def adapter(tp: Any) -> TypeAdapter:
+    return TypeAdapter(tp)
+
+
+def encode_rows(model: type, rows: Iterable[Any]) -> bytes:
+    """Validate ORM rows against a response model and encode them to bytes
+
+    Both steps run in pydantic-core: no per-row from_orm call, no
+    intermediate dicts and no jsonable_encoder pass.
+    """
+    rows_adapter = adapter(List[model])
+    return rows_adapter.dump_json(rows_adapter.validate_python(list(rows), from_attributes=True))
+
+
+def encode_row(model: type, row: Any) -> bytes:
+    row_adapter = adapter(model)
+    return row_adapter.dump_json(row_adapter.validate_python(row, from_attributes=True))
+
+
+def encode_json(value: Any) -> bytes:
+    """Encode plain data (dicts, lists, datetimes, pydantic models) as JSON bytes"""
+    return adapter(Any).dump_json(value)
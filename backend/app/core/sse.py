@@ -0,0 +1,49 @@
+"""
+Server-sent events framing for the chat stream
+
+Each chat message is one event whose id is the message id, so a client
+that reconnects with Last-Event-ID resumes exactly where it left off:
+
+    id: 42
+    event: message
+    data: {"id": 42, "channel": "community", ...}
+
+"resync" tells the client it missed more than the server will replay and
+should reload channel history. Comment lines are sent as heartbeats so
+idle connections are not closed by proxies.
+"""
+import os
+from typing import Optional
+
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+# Client reconnect delay sent with the stream's first frame
+SSE_RETRY_MS = 3000
+# Events buffered per slow client before it is disconnected (it resumes from Last-Event-ID)
+SSE_QUEUE_SIZE = 1024
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # nginx: flush events as they are written
+}
+
+HEARTBEAT_FRAME = b": ping\n\n"
+
+
+def event_frame(data: str, event: str = "message", event_id: Optional[int] = None) -> bytes:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+def retry_frame(milliseconds: int = SSE_RETRY_MS) -> bytes:
+    return f"retry: {milliseconds}\n\n".encode()
+
+
+def parse_event_id(value: Optional[str]) -> Optional[int]:
+    """Message id from a Last-Event-ID header or query value; None when absent or malformed"""
+    if value is None or not value.strip().isdigit():
+        return None
+    return int(value.strip())
@@ -0,0 +1,82 @@
+"""
+kcd.msgpack.v1: compact binary WebSocket subprotocol for chat
+
+Clients that offer "kcd.msgpack.v1" in Sec-WebSocket-Protocol (and hit a
+server with msgpack installed) get binary frames; everyone else keeps the
+default one-JSON-object-per-text-frame protocol.
+
+Server to client, each binary frame is a msgpack array of events, holding
+every event produced within one batching window. An event is an array
+whose first element is its kind:
+
+    [0, id, user_id, user_name, channel, content, created_at_us]   chat message
+    [1, channel, joined, left, typing, idle]                       presence diff
+    [2, channel, online, typing]                                   presence snapshot
+    [3, detail]                                                    sent message rejected
+
+joined and online are arrays of [user_id, user_name]; left, typing and
+idle are arrays of user ids. Presence events are only sent to sockets that
+connected with ?presence=true.
+
+created_at_us is microseconds since the Unix epoch (UTC). Field names are
+never sent; the positions above are the schema.
+
+Client to server, a binary frame is a msgpack map {"channel": ..., "content": ...},
+the same fields as the JSON protocol, or {"type": "typing", "channel": ...}.
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Any, List, Optional
+
+try:
+    import msgpack
+except ImportError:  # the binary subprotocol is optional; JSON always works
+    msgpack = None
+
+MSGPACK_SUBPROTOCOL = "kcd.msgpack.v1"
+# Events produced within this window share one frame
+BATCH_WINDOW_SECONDS = float(os.getenv("WS_BATCH_WINDOW_MS", "25")) / 1000
+MAX_BATCH_EVENTS = 256
+
+EVENT_MESSAGE = 0
+EVENT_PRESENCE = 1
+EVENT_PRESENCE_SNAPSHOT = 2
+EVENT_ERROR = 3
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def negotiate_subprotocol(offered: List[str]) -> Optional[str]:
+    """Subprotocol to accept from the client's Sec-WebSocket-Protocol list"""
+    if msgpack is not None and MSGPACK_SUBPROTOCOL in offered:
+        return MSGPACK_SUBPROTOCOL
+    return None
+
+
+def message_event(message: Any) -> list:
+    """Positional event for a chat message (ORM row or response model)"""
+    return [
+        EVENT_MESSAGE,
+        message.id,
+        message.user_id,
+        message.user_name,
+        message.channel,
+        message.content,
+        (message.created_at - EPOCH) // timedelta(microseconds=1),
+    ]
+
+
+def presence_event(diff: dict) -> list:
+    """Positional event for a presence diff or snapshot from PresenceTracker"""
+    members = [[member["user_id"], member["user_name"]] for member in diff.get("online", diff.get("joined", []))]
+    if "online" in diff:
+        return [EVENT_PRESENCE_SNAPSHOT, diff["channel"], members, diff["typing"]]
+    return [EVENT_PRESENCE, diff["channel"], members, diff["left"], diff["typing"], diff["idle"]]
+
+
+def pack_frame(events: list) -> bytes:
+    return msgpack.packb(events, use_bin_type=True)
+
+
+def unpack_frame(data: bytes) -> Any:
+    return msgpack.unpackb(data, raw=False)
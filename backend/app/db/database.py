@@ -1,10 +1,12 @@
 """
 Database configuration and initialization
 """
+import logging
 import os
 from pathlib import Path
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, Session
+from typing import Optional
+from sqlalchemy import create_engine, func, inspect, text
+from sqlalchemy.orm import sessionmaker, Session, Query
 from sqlalchemy.pool import StaticPool
 from sqlalchemy.exc import OperationalError
 from dotenv import load_dotenv
@@ -12,8 +14,12 @@ from dotenv import load_dotenv
 ROOT_DIR = Path(__file__).resolve().parents[3]
 load_dotenv(dotenv_path=ROOT_DIR / ".env", override=True)
 
-# Get database URL from environment or use SQLite as default
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./kcd.db")
+logger = logging.getLogger(__name__)
+
+# Get database URL from environment or use SQLite as default.
+# KCD_DATABASE_URL is not in .env, so it survives the override above; tooling
+# such as benchmarks/loadtest.py uses it to run the app against a scratch database.
+DATABASE_URL = os.getenv("KCD_DATABASE_URL") or os.getenv("DATABASE_URL", "sqlite:///./kcd.db")
 
 if DATABASE_URL.startswith("sqlite:///./"):
     relative_path = DATABASE_URL.replace("sqlite:///./", "")
@@ -44,9 +50,7 @@ try:
             pass  # Just testing the connection
 except (OperationalError, Exception) as e:
     # Fall back to SQLite if connection fails
-    print(f"Warning: Could not connect to {DATABASE_URL}")
-    print(f"Error: {e}")
-    print("Falling back to SQLite...")
+    logger.warning("Could not connect to the configured database, falling back to SQLite: %s", e)
     DATABASE_URL = "sqlite:///./kcd.db"
     engine = create_engine(
         DATABASE_URL,
@@ -64,11 +68,73 @@ def get_db() -> Session:
     finally:
         db.close()
 
+def capped_count(query: Query, cap: int) -> int:
+    """Row count of a query that stops reading after cap + 1 rows"""
+    return query.session.query(func.count()).select_from(query.limit(cap + 1).subquery()).scalar()
+
+def planner_estimate(query: Query) -> Optional[int]:
+    """Row count the query planner expects for a query (PostgreSQL only)
+
+    Free to compute at any table size, and usually within a few percent
+    once the table has been analyzed.
+    """
+    connection = query.session.connection()
+    if connection.dialect.name != "postgresql":
+        return None
+    compiled = query.statement.compile(dialect=connection.dialect)
+    plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+def _index_names(conn, inspector, table_name: str) -> set:
+    if conn.dialect.name == "sqlite":
+        # The SQLite inspector leaves out expression indexes such as lower(email)
+        rows = conn.execute(
+            text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table"),
+            {"table": table_name},
+        )
+        return {name for (name,) in rows}
+    return {index["name"] for index in inspector.get_indexes(table_name)}
+
+def _add_missing_columns(metadata):
+    """Add columns and indexes introduced after a table was first created"""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=engine.dialect)}"
+                default = column.default.arg if column.default is not None and column.default.is_scalar else None
+                if isinstance(default, (bool, int)):
+                    ddl += f" DEFAULT {int(default)}"
+                elif isinstance(default, str):
+                    ddl += f" DEFAULT '{default}'"
+                conn.execute(text(ddl))
+            present = _index_names(conn, inspector, table.name)
+            for index in table.indexes:
+                if index.name not in present:
+                    index.create(bind=conn)
+
+_schema_ready = False
+
 def init_db():
-    """Initialize database tables"""
+    """Initialize database tables
+
+    Idempotent; the self-heal loop calls it every few seconds, so only the
+    first successful run is logged at INFO.
+    """
+    global _schema_ready
     from app.models.user import Base
     Base.metadata.create_all(bind=engine)
-    print("Database tables created successfully!")
+    _add_missing_columns(Base.metadata)
+    if not _schema_ready:
+        logger.info("Database schema ready")
+        _schema_ready = True
+    else:
+        logger.debug("Database schema checked")
 
 if __name__ == "__main__":
     init_db()
@@ -1,24 +1,40 @@
 """
 KCD Application - FastAPI main application entry point
 """
-from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
 import os
 import asyncio
+import logging
 from dotenv import load_dotenv
 from pathlib import Path
 from sqlalchemy import text
 
 from app.api import auth, users, workspaces
-from app.api import chat, portfolio
+from app.api import chat, portfolio, media, bootstrap, moderation
 from app.db.database import init_db, SessionLocal
+from app.core.media_files import MediaFiles
+from app.core.compression import CompressionMiddleware
+from app.core.idempotency import IdempotencyMiddleware
+from app.core.logging_config import RequestContextMiddleware, configure_logging, shutdown_logging
+from app.core.response_cache import response_cache
+from app.api.users import require_roles
+from app.services import derivative_service
+from app.services import jobs  # noqa: F401  registers the job handlers
+from app.services.job_queue import job_pool
+from app.services.content_filter_service import content_filter
+from app.services.provisioning_service import shutdown_hash_pool
+from app.services.storage import UPLOAD_DIR
 
 # Load environment variables
 ROOT_DIR = Path(__file__).resolve().parents[2]
 load_dotenv(dotenv_path=ROOT_DIR / ".env", override=True)
 
+configure_logging()
+logger = logging.getLogger(__name__)
+
 # Create FastAPI app
 app = FastAPI(
     title="KCD API",
@@ -38,6 +54,8 @@ else:
     CORS_ORIGINS = ["*"]
 CORS_ALLOW_CREDENTIALS = False
 
+# Innermost: replayed responses still get CORS headers and compression
+app.add_middleware(IdempotencyMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=CORS_ORIGINS,
@@ -45,7 +63,11 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
     allow_origin_regex=".*",
+    expose_headers=["ETag", "Upload-Offset", "Upload-Length", "X-Next-Cursor", "Link", "X-Request-ID", "Idempotent-Replayed", "Retry-After"],
 )
+app.add_middleware(CompressionMiddleware)
+# Outermost, so the request ID is set for everything below it
+app.add_middleware(RequestContextMiddleware)
 
 async def self_heal_loop():
     """Best-effort self-healing loop to keep core services ready."""
@@ -56,7 +78,7 @@ async def self_heal_loop():
                 db.execute(text("SELECT 1"))
             UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
         except Exception as exc:
-            print(f"Self-heal check failed: {exc}")
+            logger.warning("Self-heal check failed: %s", exc)
         await asyncio.sleep(10)
 
 # Health check endpoint
@@ -69,6 +91,12 @@ async def health_check():
         "version": "1.0.0"
     }
 
+# Response cache statistics
+@app.get("/api/v1/health/cache")
+async def cache_stats(current_user=Depends(require_roles("admin", "manager"))):
+    """Response cache hit ratios per route"""
+    return response_cache.stats()
+
 # Root endpoint
 @app.get("/")
 async def root():
@@ -97,20 +125,48 @@ app.include_router(users.router)
 app.include_router(workspaces.router)
 app.include_router(chat.router)
 app.include_router(portfolio.router)
+app.include_router(media.router)
+app.include_router(bootstrap.router)
+app.include_router(moderation.router)
 
 # Static uploads
-UPLOAD_DIR = ROOT_DIR / "uploads"
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-app.mount("/uploads", StaticFiles(directory=str(UPLOAD_DIR)), name="uploads")
+app.mount("/uploads", MediaFiles(directory=str(UPLOAD_DIR)), name="uploads")
 
 @app.on_event("startup")
 async def start_self_heal():
     asyncio.create_task(self_heal_loop())
 
+@app.on_event("startup")
+async def start_job_workers():
+    job_pool.start()
+    try:
+        await run_in_threadpool(derivative_service.requeue_pending)
+    except Exception as exc:
+        logger.warning("Could not requeue pending derivatives: %s", exc)
+
+@app.on_event("startup")
+async def load_content_filter():
+    # Compile the rules off the event loop so the first chat message does not pay for it
+    await run_in_threadpool(content_filter.refresh)
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    await job_pool.stop()
+
+@app.on_event("shutdown")
+async def stop_hash_pool():
+    shutdown_hash_pool()
+
+@app.on_event("shutdown")
+async def stop_logging():
+    shutdown_logging()
+
 # Error handlers
 @app.exception_handler(Exception)
 async def general_exception_handler(request, exc):
     """Global exception handler"""
+    logger.exception("Unhandled error on %s %s", request.method, request.url.path, exc_info=exc)
     return JSONResponse(
         status_code=500,
         content={
@@ -119,11 +175,15 @@ async def general_exception_handler(request, exc):
         }
     )
 
+# The websockets implementation negotiates permessage-deflate for /chat/ws
+WEBSOCKET_SERVER_OPTIONS = {"ws": "websockets", "ws_per_message_deflate": True}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
         app,
         host="0.0.0.0",
         port=8000,
-        reload=True
+        reload=True,
+        **WEBSOCKET_SERVER_OPTIONS,
     )
@@ -2,7 +2,7 @@
 User model for KCD Platform
 """
 from datetime import datetime
-from sqlalchemy import Column, String, Boolean, DateTime, Integer, JSON, ForeignKey
+from sqlalchemy import Column, String, Boolean, DateTime, Integer, JSON, ForeignKey, Index, LargeBinary, func
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -27,6 +27,19 @@ class User(Base):
     avatar_url = Column(String, nullable=True)
     bio = Column(String, nullable=True)
     user_metadata = Column(JSON, default={})
+
+    # Directory filters, each paired with id for keyset pagination
+    __table_args__ = (
+        Index("ix_users_role_id", "role", "id"),
+        Index("ix_users_tier_id", "subscription_tier", "id"),
+        Index("ix_users_active_id", "is_active", "id"),
+        # Case-insensitive existence checks, e.g. bulk provisioning
+        Index("ix_users_email_lower", func.lower(email)),
+        # Email prefix search with LIKE 'prefix%' under non-C collations
+        Index("ix_users_email_pattern", "email", postgresql_ops={"email": "text_pattern_ops"}).ddl_if(
+            dialect="postgresql"
+        ),
+    )
     
     def __repr__(self):
         return f"<User(id={self.id}, email={self.email}, role={self.role})>"
@@ -45,6 +58,7 @@ class Workspace(Base):
     theme = Column(String, default="aura")  # aura, atelier, ivory, noir
     widgets = Column(JSON, default=[])
     layout = Column(JSON, default={})
+    version = Column(Integer, default=1, nullable=False)  # bumped on every write, for compare-and-swap
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -63,20 +77,134 @@ class ChatMessage(Base):
     content = Column(String, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # History pages, replay and unread counts: id ranges within a channel
+        Index("ix_chat_messages_channel_id", "channel", "id"),
+    )
+
     def __repr__(self):
         return f"<ChatMessage(id={self.id}, user_id={self.user_id}, channel={self.channel})>"
 
 
+class ChatReadCursor(Base):
+    """Newest chat message a user has read in a channel"""
+    __tablename__ = "chat_read_cursors"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    channel = Column(String, primary_key=True)
+    last_read_id = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<ChatReadCursor(user_id={self.user_id}, channel={self.channel}, last_read_id={self.last_read_id})>"
+
+
+class ContentReview(Base):
+    """Chat message or caption flagged by the content filter, awaiting a moderator"""
+    __tablename__ = "content_reviews"
+
+    id = Column(Integer, primary_key=True, index=True)
+    source = Column(String, nullable=False)  # chat_message, media_caption
+    source_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    content = Column(String, nullable=False)  # as submitted, kept if the item is later edited or removed
+    matches = Column(JSON, default=[])  # rules that matched
+    status = Column(String, default="pending", nullable=False)  # pending, approved, removed
+    reviewed_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    reviewed_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # The review queue: oldest first per status
+        Index("ix_content_reviews_status_id", "status", "id"),
+    )
+
+    def __repr__(self):
+        return f"<ContentReview(id={self.id}, source={self.source}, source_id={self.source_id}, status={self.status})>"
+
+
+class MediaBlob(Base):
+    """Content-addressed media file shared by portfolio assets"""
+    __tablename__ = "media_blobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    sha256 = Column(String(64), unique=True, index=True, nullable=False)
+    size = Column(Integer, nullable=False)
+    file_ext = Column(String, default="", nullable=False)
+    storage_key = Column(String, nullable=False)  # sharded key, e.g. ab/cd/<sha256>.jpg
+    storage_backend = Column(String, default="local", nullable=False)  # local, s3
+    ref_count = Column(Integer, default=0, nullable=False)
+    variants = Column(JSON, default={})  # {"w320": url, ..., "poster": url}
+    variants_status = Column(String, default="pending", nullable=False)  # pending, ready, skipped, failed
+    variants_attempts = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<MediaBlob(id={self.id}, sha256={self.sha256}, ref_count={self.ref_count})>"
+
+
 class MediaAsset(Base):
     """Portfolio media asset"""
     __tablename__ = "media_assets"
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    blob_id = Column(Integer, ForeignKey("media_blobs.id"), nullable=True, index=True)
     file_url = Column(String, nullable=False)
     file_type = Column(String, nullable=False)  # image, video
+    variants = Column(JSON, default={})  # copied from the blob once derivatives are ready
     caption = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Portfolio listings: newest first per user, optionally per file type
+        Index("ix_media_assets_user_created", "user_id", created_at.desc(), id.desc()),
+        Index("ix_media_assets_user_type_created", "user_id", "file_type", created_at.desc(), id.desc()),
+    )
+
     def __repr__(self):
         return f"<MediaAsset(id={self.id}, user_id={self.user_id}, file_type={self.file_type})>"
+
+
+class IdempotencyRecord(Base):
+    """Stored response of a write sent with an Idempotency-Key, replayed to retries"""
+    __tablename__ = "idempotency_records"
+
+    key = Column(String(64), primary_key=True)  # sha256 of the user, route and Idempotency-Key
+    status = Column(String, default="pending", nullable=False)  # pending, complete
+    fingerprint = Column(String(64), nullable=True)  # sha256 of the request body
+    response_status = Column(Integer, nullable=True)
+    response_headers = Column(JSON, default=[])
+    response_body = Column(LargeBinary, nullable=True)
+    locked_until = Column(DateTime, nullable=True)  # a pending key past this was abandoned
+    expires_at = Column(DateTime, nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<IdempotencyRecord(key={self.key}, status={self.status})>"
+
+
+class Job(Base):
+    """Deferred work for the job workers; periodic jobs are one row rescheduled after each run"""
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    args = Column(JSON, default=[])
+    key = Column(String, unique=True, nullable=True)  # deduplicates enqueues while the job is queued or running
+    status = Column(String, default="queued", nullable=False)  # queued, running, failed
+    run_at = Column(DateTime, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, default=5, nullable=False)
+    locked_by = Column(String, nullable=True)
+    locked_until = Column(DateTime, nullable=True)  # a running job past this lost its worker
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Workers claim the earliest due job per status
+        Index("ix_jobs_status_run_at", "status", "run_at"),
+    )
+
+    def __repr__(self):
+        return f"<Job(id={self.id}, name={self.name}, status={self.status})>"
@@ -1,8 +1,8 @@
 """
 User schemas for request/response validation
 """
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from pydantic import BaseModel, EmailStr, Field
+from typing import Optional, List, Dict, Literal
 from datetime import datetime
 
 class UserBase(BaseModel):
@@ -16,6 +16,16 @@ class UserCreate(UserBase):
     password: str
     is_verified: bool = False
 
+class UserImportRow(BaseModel):
+    """One row of a bulk user import (CSV or JSONL)"""
+    email: EmailStr
+    password: str
+    full_name: Optional[str] = None
+    role: Literal["admin", "manager", "moderator", "user"] = "user"
+    subscription_tier: Optional[str] = None  # staff accounts default to their role, users to free
+    is_active: bool = True
+    is_verified: bool = False
+
 class UserLogin(BaseModel):
     """User login schema"""
     email: EmailStr
@@ -34,6 +44,13 @@ class UserResponse(UserBase):
     class Config:
         from_attributes = True
 
+class UserDirectoryResponse(BaseModel):
+    """One page of the user directory"""
+    items: List[UserResponse]
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None  # first page only, and null past the count cap without an estimate
+    total_exact: bool = True  # False when total is an estimate or unknown
+
 class WorkspaceBase(BaseModel):
     """Base workspace schema"""
     workspace_name: str
@@ -59,12 +76,17 @@ class WorkspaceResponse(WorkspaceBase):
     id: int
     user_id: Optional[int] = None
     role: str
+    version: int = 1
     created_at: datetime
     updated_at: datetime
     
     class Config:
         from_attributes = True
 
+class WorkspaceVersionResponse(BaseModel):
+    """Minimal response to a workspace patch"""
+    version: int
+
 class TokenResponse(BaseModel):
     """Token response schema"""
     access_token: str
@@ -81,6 +103,25 @@ class ChatMessageCreate(ChatMessageBase):
     pass
 
 
+class ChatTypingEvent(BaseModel):
+    channel: str = "community"
+
+
+class ChatReadUpdate(BaseModel):
+    channel: str = "community"
+    last_read_id: Optional[int] = None  # defaults to the channel's newest message
+
+
+class ChatUnreadCount(BaseModel):
+    """Unread messages in a channel; counting stops at cap, shown as "99+" in badges"""
+    channel: str
+    last_read_id: int
+    unread: int = Field(description="Unread messages from others, at most cap")
+    capped: bool = Field(False, description="True when there are more than cap unread messages")
+    cap: int = Field(description="Counting stops past this many unread messages")
+    label: str = Field(description='Badge text: the count, "99+" style when capped, empty when nothing is unread')
+
+
 class ChatMessageResponse(ChatMessageBase):
     id: int
     user_id: int
@@ -96,8 +137,46 @@ class MediaAssetResponse(BaseModel):
     user_id: int
     file_url: str
     file_type: str
+    variants: Optional[Dict[str, str]] = None
     caption: Optional[str] = None
     created_at: datetime
 
     class Config:
         from_attributes = True
+
+
+class MediaAssetUpdate(BaseModel):
+    caption: Optional[str] = None
+
+
+class ContentReviewResponse(BaseModel):
+    id: int
+    source: str
+    source_id: int
+    user_id: int
+    content: str
+    matches: List[str] = []
+    status: str
+    reviewed_by: Optional[int] = None
+    reviewed_at: Optional[datetime] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class ContentReviewDecision(BaseModel):
+    action: Literal["approve", "remove"]
+
+
+class UploadSessionCreate(BaseModel):
+    filename: str
+    content_type: Optional[str] = None
+    size: int
+
+
+class UploadSessionResponse(BaseModel):
+    upload_id: str
+    offset: int
+    size: int
+    expires_at: datetime
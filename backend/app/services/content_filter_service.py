@@ -0,0 +1,273 @@
+"""
+Blocklist filter for chat messages and media captions
+
+Rules live in a text file (CONTENT_FILTER_RULES), one per line:
+
+    # comments and blank lines are ignored
+    casting fee            flag: stored, and queued for moderator review
+    block: some slur       rejected outright
+    scam*                  trailing * matches any word starting with "scam"
+
+Rules and text are normalized the same way: case-folded, accents removed,
+leetspeak digits and symbols mapped to letters (n00b -> noob, $cam ->
+scam; a symbol ending a word is punctuation, so scam! -> scam),
+punctuation turned into spaces and runs of a letter cut to two (soooo ->
+soo), so doubled letters in ordinary words survive (as and ass stay
+apart). Text is also matched with every run collapsed to one letter, which
+catches stretched words (scaaam, scamm -> scam) for rules that have no
+doubled letter themselves. A rule matches whole words. All rules are compiled into one
+Aho-Corasick automaton, so a check is a single pass over the message
+whatever the number of rules. pyahocorasick is used when installed (the C
+automaton keeps a check in the low microseconds at tens of thousands of
+rules); otherwise a pure-Python automaton does the same work more slowly.
+
+The file is polled every CONTENT_FILTER_RELOAD_SECONDS; a changed file is
+compiled on a background thread and swapped in, with the previous rules
+in use meanwhile.
+"""
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+
+from app.models.user import ContentReview
+
+try:
+    import ahocorasick
+except ImportError:  # optional; the pure-Python automaton is used without it
+    ahocorasick = None
+
+ROOT_DIR = Path(__file__).resolve().parents[3]
+load_dotenv(dotenv_path=ROOT_DIR / ".env", override=True)
+
+CONTENT_FILTER_RULES = Path(os.getenv("CONTENT_FILTER_RULES") or ROOT_DIR / "content_filter_rules.txt")
+CONTENT_FILTER_RELOAD_SECONDS = float(os.getenv("CONTENT_FILTER_RELOAD_SECONDS", "5"))
+
+ACTION_FLAG = "flag"
+ACTION_BLOCK = "block"
+
+LEETSPEAK = {
+    "0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t", "8": "b",
+    "@": "a", "$": "s", "!": "i", "+": "t", "€": "e",
+}
+# A leetspeak symbol stands for a letter only when a letter or digit follows it ($cam, sc@m);
+# at the end of a word it is punctuation (scam!, fee+)
+LEET_SYMBOLS = tuple(key for key in LEETSPEAK if not key.isalnum())
+TRAILING_SYMBOLS = re.compile(f"[{re.escape(''.join(LEET_SYMBOLS))}]+(?![^\\W_])")
+# Leetspeak, then every other ASCII character that is not a letter or digit becomes a space
+NORMALIZE_TABLE = str.maketrans({
+    **{chr(code): " " for code in range(128) if not chr(code).isalnum()},
+    **LEETSPEAK,
+})
+SEPARATORS = re.compile(r"[\W_]+")
+# Drops every space followed by a space, and every other character followed by two more of it:
+# "soooo  cool" -> "soo cool"
+LONG_REPEATS = re.compile(r" (?= )|(.)(?=\1\1)")
+# Drops every character followed by the same one: "soo cool" -> "so col"
+REPEATS = re.compile(r"(.)(?=\1)")
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(text: str) -> str:
+    """Fold case, accents, leetspeak, punctuation and letter runs; words are single-space separated"""
+    text = text.casefold()
+    # Substring tests are far cheaper than the regex, and most texts have no such symbol
+    if any(symbol in text for symbol in LEET_SYMBOLS):
+        text = TRAILING_SYMBOLS.sub(" ", text)
+    if text.isascii():
+        text = text.translate(NORMALIZE_TABLE)
+    else:
+        text = "".join(ch for ch in unicodedata.normalize("NFKD", text) if not unicodedata.combining(ch))
+        text = SEPARATORS.sub(" ", text.translate(NORMALIZE_TABLE))
+    # Literal replacement: much cheaper than expanding a \1 template per match
+    return LONG_REPEATS.sub("", text).strip()
+
+
+class FilterVerdict:
+    """Rules that matched a text; blocked when any of them is a block rule"""
+
+    def __init__(self, matches: List[str], blocked: bool):
+        self.matches = matches
+        self.blocked = blocked
+
+    def __repr__(self):
+        return f"<FilterVerdict(matches={self.matches}, blocked={self.blocked})>"
+
+
+class PythonAutomaton:
+    """Aho-Corasick automaton over dict transitions, with the pyahocorasick calls the filter uses"""
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[tuple] = [()]
+
+    def add_word(self, word: str, value) -> None:
+        state = 0
+        for ch in word:
+            following = self._goto[state].get(ch)
+            if following is None:
+                following = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+                self._goto[state][ch] = following
+            state = following
+        self._out[state] += (value,)
+
+    def make_automaton(self) -> None:
+        goto, fail, out = self._goto, self._fail, self._out
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, following in goto[state].items():
+                queue.append(following)
+                fallback = fail[state]
+                while fallback and ch not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[following] = goto[fallback].get(ch, 0)
+                out[following] += out[fail[following]]
+
+    def iter(self, text: str) -> Iterator[Tuple[int, object]]:
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for end, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for value in out[state]:
+                yield end, value
+
+
+def parse_rules(lines: List[str]) -> Dict[str, Tuple[str, str]]:
+    """Automaton keys for rule lines: ' word ' (or ' prefix' for word*) -> (rule, action)"""
+    rules = {}
+    for line in lines:
+        rule = line.strip()
+        if not rule or rule.startswith("#"):
+            continue
+        action = ACTION_FLAG
+        prefix, _, rest = rule.partition(":")
+        if rest and prefix.strip().lower() in (ACTION_FLAG, ACTION_BLOCK):
+            action, rule = prefix.strip().lower(), rest.strip()
+        wildcard = rule.endswith("*")
+        words = normalize(rule.rstrip("*"))
+        if not words:
+            continue
+        key = f" {words}" if wildcard else f" {words} "
+        # A block rule wins over a flag rule with the same normalized words
+        if rules.get(key, (None, None))[1] != ACTION_BLOCK:
+            rules[key] = (rule, action)
+    return rules
+
+
+def build_automaton(rules: Dict[str, Tuple[str, str]]):
+    if not rules:
+        return None
+    automaton = ahocorasick.Automaton() if ahocorasick is not None else PythonAutomaton()
+    for key, value in rules.items():
+        automaton.add_word(key, value)
+    automaton.make_automaton()
+    return automaton
+
+
+class ContentFilter:
+    def __init__(self, path: Path = CONTENT_FILTER_RULES, reload_seconds: float = CONTENT_FILTER_RELOAD_SECONDS):
+        self.path = Path(path)
+        self.reload_seconds = reload_seconds
+        self.rule_count = 0
+        self._automaton = None
+        self._signature: Optional[tuple] = None
+        self._checked_at: Optional[float] = None
+        self._reloading = threading.Lock()
+
+    def check(self, text: Optional[str]) -> Optional[FilterVerdict]:
+        """Matching rules for text, or None when it is clean"""
+        self.refresh()
+        automaton = self._automaton
+        if automaton is None or not text:
+            return None
+        text = normalize(text)
+        collapsed = REPEATS.sub("", text)
+        # One pass over both forms; no rule spans the newline. A rule with a doubled letter
+        # can only match the first form, so "as soon" never matches "ass"
+        haystack = f" {text} " if collapsed == text else f" {text} \n {collapsed} "
+        matches = {value for _, value in automaton.iter(haystack)}
+        if not matches:
+            return None
+        return FilterVerdict(
+            sorted(rule for rule, _ in matches),
+            any(action == ACTION_BLOCK for _, action in matches),
+        )
+
+    def load(self, lines: List[str]) -> None:
+        """Compile rules and swap them in"""
+        rules = parse_rules(lines)
+        self._automaton = build_automaton(rules)
+        self.rule_count = len(rules)
+
+    def _signature_of_file(self) -> Optional[tuple]:
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def refresh(self) -> None:
+        """Reload the rules file if it changed; checked at most every reload_seconds"""
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.reload_seconds:
+            return
+        first = self._checked_at is None
+        self._checked_at = now
+        signature = self._signature_of_file()
+        if signature == self._signature or not self._reloading.acquire(blocking=False):
+            return
+        if first:
+            # Nothing to fall back on yet: compile before the first check
+            self._reload(signature)
+        else:
+            threading.Thread(target=self._reload, args=(signature,), name="content-filter-reload", daemon=True).start()
+
+    def _reload(self, signature: Optional[tuple]) -> None:
+        try:
+            lines = self.path.read_text(encoding="utf-8").splitlines() if signature is not None else []
+            started = time.perf_counter()
+            self.load(lines)
+            self._signature = signature
+            logger.info(
+                "Content filter loaded %d rules from %s in %.0f ms",
+                self.rule_count, self.path, (time.perf_counter() - started) * 1000,
+            )
+        except Exception:
+            logger.exception("Could not load content filter rules from %s; keeping the previous rules", self.path)
+        finally:
+            self._reloading.release()
+
+
+content_filter = ContentFilter()
+
+
+def queue_review(db: Session, source: str, source_id: int, user_id: int, content: str,
+                 verdict: FilterVerdict) -> ContentReview:
+    """Add a flagged item to the moderators' review queue; committed with the caller's transaction"""
+    review = ContentReview(
+        source=source,
+        source_id=source_id,
+        user_id=user_id,
+        content=content,
+        matches=verdict.matches,
+        created_at=datetime.utcnow(),
+    )
+    db.add(review)
+    return review
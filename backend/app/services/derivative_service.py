@@ -0,0 +1,157 @@
+"""
+Derivative service generating web-optimized variants of portfolio media
+"""
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.db.database import SessionLocal
+from app.models.user import MediaAsset, MediaBlob
+from app.services.job_queue import enqueue
+from app.services.media_service import TMP_DIR
+from app.services.storage import get_storage
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; image variants are skipped without it
+    Image = None
+
+IMAGE_VARIANT_WIDTHS = (320, 640, 1280)
+WEBP_QUALITY = 80
+POSTER_SEEK_SECONDS = "1"
+DERIVATIVE_MAX_ATTEMPTS = int(os.getenv("DERIVATIVE_MAX_ATTEMPTS", "3"))
+
+VIDEO_EXT = {".mp4", ".mov", ".webm", ".m4v"}
+
+logger = logging.getLogger(__name__)
+
+
+class DerivativeUnsupported(Exception):
+    """Raised when the tooling for a media type is not installed"""
+
+
+def variant_key(storage_key: str, suffix: str) -> str:
+    """Storage key of a derivative stored next to its original"""
+    original = Path(storage_key)
+    return (original.parent / f"{original.stem}_{suffix}").as_posix()
+
+
+def _image_variants(source: Path, storage_key: str, output_dir: Path) -> dict:
+    if Image is None:
+        raise DerivativeUnsupported("Pillow is not installed")
+    variants = {}
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        widths = sorted({min(width, image.width) for width in IMAGE_VARIANT_WIDTHS})
+        for width in widths:
+            height = max(1, round(image.height * width / image.width))
+            output = output_dir / f"w{width}.webp"
+            resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+            resized.save(output, "WEBP", quality=WEBP_QUALITY, method=4)
+            variants[f"w{width}"] = (variant_key(storage_key, output.name), output)
+    return variants
+
+
+def _video_variants(source: Path, storage_key: str, output_dir: Path) -> dict:
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise DerivativeUnsupported("ffmpeg is not installed")
+    output = output_dir / "poster.jpg"
+    subprocess.run(
+        [
+            ffmpeg, "-y", "-loglevel", "error",
+            "-ss", POSTER_SEEK_SECONDS, "-i", str(source),
+            "-frames:v", "1", "-vf", f"scale='min({IMAGE_VARIANT_WIDTHS[-1]},iw)':-2",
+            "-q:v", "3", str(output),
+        ],
+        check=True,
+        capture_output=True,
+        timeout=120,
+    )
+    return {"poster": (variant_key(storage_key, output.name), output)}
+
+
+def generate_derivatives(blob: MediaBlob) -> dict:
+    """Render the variants of a stored blob into its storage and return {name: url}"""
+    storage = get_storage(blob.storage_backend)
+    TMP_DIR.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=TMP_DIR) as work_dir:
+        work_dir = Path(work_dir)
+        source = storage.local_path(blob.storage_key)
+        if source is None:
+            source = work_dir / f"source{blob.file_ext}"
+            storage.download(blob.storage_key, source)
+        output_dir = work_dir / "out"
+        output_dir.mkdir()
+
+        if blob.file_ext in VIDEO_EXT:
+            rendered = _video_variants(source, blob.storage_key, output_dir)
+        else:
+            rendered = _image_variants(source, blob.storage_key, output_dir)
+
+        variants = {}
+        for name, (key, path) in rendered.items():
+            storage.save(key, path)
+            variants[name] = storage.url(key)
+        return variants
+
+
+def queue_derivatives(blob_id: int, db: Optional[Session] = None) -> None:
+    """Queue a blob's render unless one is already queued or running for it"""
+    enqueue("render_derivatives", blob_id, key=f"derivatives:{blob_id}", db=db)
+
+
+def requeue_pending() -> None:
+    """Queue blobs left pending without a job, e.g. by an interrupted upload"""
+    with SessionLocal() as db:
+        pending = db.query(MediaBlob.id).filter(MediaBlob.variants_status == "pending").all()
+    for (blob_id,) in pending:
+        queue_derivatives(blob_id)
+
+
+def render_blob(blob_id: int) -> None:
+    """Render one blob's derivatives; raises when the job queue should retry it"""
+    with SessionLocal() as db:
+        blob = db.query(MediaBlob).filter(MediaBlob.id == blob_id).first()
+        if blob is None:
+            return
+        if blob.variants_status == "ready":
+            # Asset created while the blob was being rendered
+            db.execute(
+                update(MediaAsset).where(MediaAsset.blob_id == blob_id).values(variants=blob.variants)
+            )
+            db.commit()
+            return
+        if blob.variants_status != "pending":
+            return
+        try:
+            variants = generate_derivatives(blob)
+            variants_status = "ready"
+        except DerivativeUnsupported as exc:
+            logger.info("Skipping derivatives for blob %s: %s", blob_id, exc)
+            variants, variants_status = {}, "skipped"
+        except Exception:
+            blob.variants_attempts = (blob.variants_attempts or 0) + 1
+            if blob.variants_attempts < DERIVATIVE_MAX_ATTEMPTS:
+                db.commit()
+                raise
+            blob.variants_status = "failed"
+            db.commit()
+            logger.exception("Derivatives for blob %s failed permanently", blob_id)
+            return
+
+        blob.variants = variants
+        blob.variants_status = variants_status
+        db.execute(
+            update(MediaAsset).where(MediaAsset.blob_id == blob_id).values(variants=variants)
+        )
+        db.commit()
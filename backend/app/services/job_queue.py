@@ -0,0 +1,309 @@
+"""
+Durable job queue for work that does not have to finish before the response
+
+A request hands work off with enqueue("touch_last_login", user_id) and
+returns. Jobs are rows in the jobs table, so they survive restarts and
+any worker against the same database can run them: the API's own
+JOB_WORKERS threads, and any number of `python worker.py` processes.
+Handlers are registered with @job in app.services.jobs.
+
+A worker claims the earliest due job with one UPDATE ... RETURNING that
+also leases it for JOB_LEASE_SECONDS; the pool renews the lease every
+JOB_HEARTBEAT_SECONDS while the handler runs, so a long job keeps it.
+On PostgreSQL the candidate row is
+selected FOR UPDATE SKIP LOCKED, so workers never queue up behind each
+other; SQLite serializes writers, and the status and lease conditions
+keep two workers off the same job. A job whose worker died stops being
+renewed and is claimed again once its lease runs out.
+
+A job that raises is retried with exponential backoff starting at
+JOB_RETRY_SECONDS, up to its max_attempts, then kept as failed for
+JOB_FAILED_RETENTION_DAYS, its key released. Periodic jobs (@job(every=seconds)) are a
+single row, rescheduled after each run whatever its outcome.
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy import and_, delete, event, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.db.database import SessionLocal
+from app.models.user import Job
+
+# Worker threads in the API process; 0 leaves all jobs to worker.py processes
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Idle workers look for due jobs this often; enqueues in the same process wake them at once
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+# Leases of running jobs are renewed this often, well before they run out
+JOB_HEARTBEAT_SECONDS = JOB_LEASE_SECONDS / 3
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_SECONDS = float(os.getenv("JOB_RETRY_SECONDS", "5"))
+JOB_MAX_RETRY_SECONDS = 3600
+JOB_FAILED_RETENTION_DAYS = int(os.getenv("JOB_FAILED_RETENTION_DAYS", "7"))
+
+logger = logging.getLogger(__name__)
+
+ClaimedJob = Tuple[int, str, list, int, int]  # id, name, args, attempts, max_attempts
+
+
+class JobSpec:
+    def __init__(self, name: str, func: Callable, every: Optional[float], max_attempts: int):
+        self.name = name
+        self.func = func
+        self.every = every
+        self.max_attempts = max_attempts
+
+
+JOBS: Dict[str, JobSpec] = {}
+
+
+def job(name: str, every: Optional[float] = None, max_attempts: int = JOB_MAX_ATTEMPTS):
+    """Register a function as the handler of a job; every=seconds makes it periodic"""
+    def register(func: Callable) -> Callable:
+        JOBS[name] = JobSpec(name, func, every, max_attempts)
+        return func
+    return register
+
+
+def enqueue(name: str, *args, delay: float = 0, run_at: Optional[datetime] = None, key: Optional[str] = None,
+            max_attempts: Optional[int] = None, db: Optional[Session] = None) -> None:
+    """Queue name(*args) to run after delay seconds, or at run_at
+
+    Arguments are stored as JSON. With db the job joins the caller's
+    transaction and exists only once the caller commits, so workers are
+    woken after that commit; otherwise it is committed right away. With a
+    key, nothing is queued while a job with the same key is queued or
+    running.
+    """
+    spec = JOBS.get(name)
+    now = datetime.utcnow()
+    values = dict(
+        name=name,
+        args=list(args),
+        key=key,
+        status="queued",
+        run_at=run_at or now + timedelta(seconds=delay),
+        attempts=0,
+        max_attempts=max_attempts or (spec.max_attempts if spec is not None else JOB_MAX_ATTEMPTS),
+        created_at=now,
+    )
+    if db is None:
+        with SessionLocal() as own_db:
+            _insert(own_db, values)
+            own_db.commit()
+        job_pool.notify()
+    else:
+        _insert(db, values)
+        # Woken now, a worker would find nothing; a rollback leaves one harmless extra wakeup
+        event.listen(db, "after_commit", _notify_pool, once=True)
+
+
+def _notify_pool(session: Session) -> None:
+    job_pool.notify()
+
+
+def _insert(db: Session, values: dict) -> None:
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(Job).values(**values)
+    if values["key"] is not None:
+        statement = statement.on_conflict_do_nothing(index_elements=[Job.key])
+    db.execute(statement)
+
+
+def _due(now: datetime):
+    return or_(
+        and_(Job.status == "queued", Job.run_at <= now),
+        and_(Job.status == "running", Job.locked_until < now),
+    )
+
+
+def claim(worker_id: str) -> Optional[ClaimedJob]:
+    """Lease the earliest due job to worker_id, or None when nothing is due"""
+    now = datetime.utcnow()
+    with SessionLocal() as db:
+        candidate = select(Job.id).where(_due(now)).order_by(Job.run_at, Job.id).limit(1)
+        if db.get_bind().dialect.name == "postgresql":
+            candidate = candidate.with_for_update(skip_locked=True)
+        claimed = db.execute(
+            update(Job)
+            # The due conditions again: the candidate may have been claimed since it was read
+            .where(Job.id == candidate.scalar_subquery(), _due(now))
+            .values(
+                status="running",
+                locked_by=worker_id,
+                locked_until=now + timedelta(seconds=JOB_LEASE_SECONDS),
+                attempts=Job.attempts + 1,
+            )
+            .returning(Job.id, Job.name, Job.args, Job.attempts, Job.max_attempts)
+            .execution_options(synchronize_session=False)
+        ).first()
+        db.commit()
+    return tuple(claimed) if claimed is not None else None
+
+
+def run_job(claimed: ClaimedJob, worker_id: str) -> None:
+    """Run a claimed job, then delete it, retry it, reschedule it or mark it failed"""
+    job_id, name, args, attempts, max_attempts = claimed
+    spec = JOBS.get(name)
+    error = None
+    started = time.perf_counter()
+    try:
+        if spec is None:
+            raise LookupError(f"No handler registered for job {name!r}")
+        if attempts > max_attempts:
+            raise RuntimeError("Lease expired during the last attempt")
+        spec.func(*(args or []))
+    except Exception as exc:
+        error = f"{type(exc).__name__}: {exc}"[:1000]
+        logger.exception("Job %s #%s failed (attempt %s of %s)", name, job_id, attempts, max_attempts)
+    else:
+        logger.debug("Job %s #%s done in %.0f ms", name, job_id, (time.perf_counter() - started) * 1000)
+
+    now = datetime.utcnow()
+    released = dict(locked_by=None, locked_until=None, last_error=error)
+    if spec is not None and spec.every:
+        values = dict(status="queued", run_at=now + timedelta(seconds=spec.every), attempts=0, **released)
+    elif error is None:
+        values = None
+    elif attempts < max_attempts:
+        retry = min(JOB_RETRY_SECONDS * 2 ** (attempts - 1), JOB_MAX_RETRY_SECONDS)
+        values = dict(status="queued", run_at=now + timedelta(seconds=retry), **released)
+    else:
+        logger.error("Job %s #%s failed permanently: %s", name, job_id, error)
+        # The key is released, so the same work can be queued again
+        values = dict(status="failed", key=None, **released)
+
+    # Only while the lease is still ours: an expired lease may have passed the job to another worker
+    mine = and_(Job.id == job_id, Job.locked_by == worker_id)
+    with SessionLocal() as db:
+        if values is None:
+            db.execute(delete(Job).where(mine))
+        else:
+            db.execute(update(Job).where(mine).values(**values))
+        db.commit()
+
+
+def renew_leases(leases: Dict[int, str]) -> int:
+    """Extend the leases of running jobs, {job id: worker id}; returns how many are still held"""
+    if not leases:
+        return 0
+    with SessionLocal() as db:
+        renewed = db.execute(
+            update(Job)
+            .where(
+                Job.status == "running",
+                or_(*(and_(Job.id == job_id, Job.locked_by == worker_id) for job_id, worker_id in leases.items())),
+            )
+            .values(locked_until=datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+    return renewed
+
+
+def schedule_periodic() -> None:
+    """Give every registered periodic job its row; existing schedules are kept"""
+    for spec in JOBS.values():
+        if spec.every:
+            enqueue(spec.name, key=f"periodic:{spec.name}")
+
+
+def purge_failed(retention_days: int = JOB_FAILED_RETENTION_DAYS) -> int:
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    with SessionLocal() as db:
+        removed = db.query(Job).filter(
+            Job.status == "failed", Job.run_at < cutoff,
+        ).delete(synchronize_session=False)
+        db.commit()
+    return removed
+
+
+class JobWorkerPool:
+    """Worker threads claiming and running jobs, driven from the event loop"""
+
+    def __init__(self, workers: int = JOB_WORKERS, poll_seconds: float = JOB_POLL_SECONDS,
+                 heartbeat_seconds: float = JOB_HEARTBEAT_SECONDS):
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.tasks = []
+        # Jobs being run, {job id: worker id}, whose leases the heartbeat renews
+        self.running: Dict[int, str] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def start(self, workers: Optional[int] = None):
+        """Start workers and schedule periodic jobs; a no-op with zero workers"""
+        if workers is not None:
+            self.workers = workers
+        if self.workers <= 0:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="jobs")
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        self.tasks = [asyncio.create_task(self._worker(f"{prefix}:{n}")) for n in range(self.workers)]
+        self.tasks.append(asyncio.create_task(self._heartbeat()))
+        try:
+            schedule_periodic()
+        except Exception as exc:
+            logger.warning("Could not schedule periodic jobs: %s", exc)
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        self._loop = None
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def notify(self):
+        """Wake idle workers; safe from any thread"""
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _worker(self, worker_id: str):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Cleared before claiming, so an enqueue during the claim is not missed
+            self._wakeup.clear()
+            try:
+                claimed = await loop.run_in_executor(self.executor, claim, worker_id)
+                if claimed is not None:
+                    self.running[claimed[0]] = worker_id
+                    try:
+                        await loop.run_in_executor(self.executor, run_job, claimed, worker_id)
+                    finally:
+                        self.running.pop(claimed[0], None)
+                    continue
+            except Exception as exc:
+                # The lease runs out and the job is claimed again
+                logger.warning("Job worker %s could not claim or settle a job: %s", worker_id, exc)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _heartbeat(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            try:
+                # Not on self.executor: its threads may all be busy running the jobs being renewed
+                await loop.run_in_executor(None, renew_leases, dict(self.running))
+            except Exception as exc:
+                logger.warning("Could not renew job leases: %s", exc)
+
+
+job_pool = JobWorkerPool()
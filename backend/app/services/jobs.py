@@ -0,0 +1,57 @@
+"""
+Job handlers, registered by name with the job queue
+
+Imported by the API and by worker.py, so every worker knows every job.
+Arguments arrive as stored JSON: ids, strings and numbers.
+"""
+import logging
+import os
+from datetime import datetime
+
+from app.core.idempotency import idempotency_store
+from app.db.database import SessionLocal
+from app.services.derivative_service import DERIVATIVE_MAX_ATTEMPTS, render_blob
+from app.services.job_queue import job, purge_failed
+from app.services.media_service import MediaService
+from app.services.upload_session_service import UploadSessionService
+from app.services.user_service import UserService
+
+MEDIA_GC_INTERVAL_SECONDS = int(os.getenv("MEDIA_GC_INTERVAL_SECONDS", str(6 * 3600)))
+
+logger = logging.getLogger(__name__)
+
+
+@job("touch_last_login")
+def touch_last_login(user_id: int, logged_in_at: str) -> None:
+    with SessionLocal() as db:
+        UserService.record_login(db, user_id, datetime.fromisoformat(logged_in_at))
+
+
+@job("render_derivatives", max_attempts=DERIVATIVE_MAX_ATTEMPTS)
+def render_derivatives(blob_id: int) -> None:
+    render_blob(blob_id)
+
+
+@job("expire_upload_sessions", every=60)
+def expire_upload_sessions() -> None:
+    UploadSessionService.expire_sessions()
+
+
+@job("purge_idempotency_keys", every=600)
+def purge_idempotency_keys() -> None:
+    idempotency_store.purge_expired()
+
+
+@job("collect_media_garbage", every=MEDIA_GC_INTERVAL_SECONDS)
+def collect_media_garbage() -> None:
+    with SessionLocal() as db:
+        stats = MediaService.collect_garbage(db)
+    logger.info(
+        "Media GC removed %d blobs, %d orphaned files, %d temp files (%d bytes)",
+        stats["blobs"], stats["orphans"], stats["temp_files"], stats["bytes"],
+    )
+
+
+@job("purge_failed_jobs", every=24 * 3600)
+def purge_failed_jobs() -> None:
+    purge_failed()
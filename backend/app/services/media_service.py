@@ -0,0 +1,209 @@
+"""
+Media service for content-addressed portfolio storage
+"""
+import hashlib
+import shutil
+import time
+import uuid
+from pathlib import Path
+
+import aiofiles
+from fastapi import HTTPException, UploadFile, status
+from sqlalchemy import update, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.user import MediaAsset, MediaBlob
+from app.services.storage import UPLOAD_DIR, get_storage
+
+TMP_DIR = UPLOAD_DIR / ".tmp"
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+# ref_count of a blob whose files collect_garbage is deleting
+COLLECTING = -1
+ACQUIRE_ATTEMPTS = 5
+ACQUIRE_RETRY_SECONDS = 0.1
+
+
+class MediaService:
+    """Content-addressed media storage with reference counting"""
+
+    @staticmethod
+    def blob_key(sha256: str, file_ext: str) -> str:
+        """Sharded storage key, e.g. ab/cd/abcd...ef.jpg"""
+        return f"{sha256[:2]}/{sha256[2:4]}/{sha256}{file_ext}"
+
+    @staticmethod
+    def blob_url(blob: MediaBlob) -> str:
+        """Public URL of a stored blob"""
+        return get_storage(blob.storage_backend).url(blob.storage_key)
+
+    @staticmethod
+    async def receive_upload(file: UploadFile, max_bytes: int) -> tuple:
+        """Stream an upload to a temporary file while hashing it
+
+        Returns (temp_path, sha256, size).
+        """
+        TMP_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = TMP_DIR / uuid.uuid4().hex
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            async with aiofiles.open(tmp_path, "wb") as out:
+                while True:
+                    chunk = await file.read(UPLOAD_CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise HTTPException(
+                            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail="File too large",
+                        )
+                    digest.update(chunk)
+                    await out.write(chunk)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        return tmp_path, digest.hexdigest(), size
+
+    @staticmethod
+    def acquire_blob(db: Session, tmp_path: Path, sha256: str, size: int, file_ext: str) -> MediaBlob:
+        """Store a received file once and take a reference on its blob
+
+        The temporary file is consumed: it is moved into place for new
+        content and discarded when the content is already stored.
+        """
+        try:
+            for attempt in range(ACQUIRE_ATTEMPTS):
+                blob = db.query(MediaBlob).filter(MediaBlob.sha256 == sha256).first()
+                if blob is not None and blob.ref_count == COLLECTING:
+                    # collect_garbage is deleting this content; the row goes once the files are gone
+                    db.rollback()
+                    time.sleep(ACQUIRE_RETRY_SECONDS * (attempt + 1))
+                    continue
+                if blob is not None:
+                    # The blob may be collected between the lookup and the update
+                    result = db.execute(
+                        update(MediaBlob)
+                        .where(MediaBlob.id == blob.id, MediaBlob.ref_count >= 0)
+                        .values(ref_count=MediaBlob.ref_count + 1)
+                    )
+                    if result.rowcount:
+                        db.commit()
+                        db.refresh(blob)
+                        storage = get_storage(blob.storage_backend)
+                        if not storage.exists(blob.storage_key):
+                            storage.save(blob.storage_key, tmp_path)
+                        return blob
+                    db.rollback()
+                    continue
+
+                storage = get_storage()
+                storage_key = MediaService.blob_key(sha256, file_ext)
+                storage.save(storage_key, tmp_path)
+                blob = MediaBlob(
+                    sha256=sha256,
+                    size=size,
+                    file_ext=file_ext,
+                    storage_key=storage_key,
+                    storage_backend=storage.name,
+                    ref_count=1,
+                )
+                db.add(blob)
+                try:
+                    db.commit()
+                except IntegrityError:
+                    # Concurrent upload of the same content won the insert
+                    db.rollback()
+                    continue
+                db.refresh(blob)
+                return blob
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Could not store file, please retry",
+            )
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+    @staticmethod
+    def release_blob(db: Session, blob_id: int) -> None:
+        """Drop one reference on a blob; unreferenced blobs are left for collect_garbage"""
+        db.execute(
+            update(MediaBlob)
+            .where(MediaBlob.id == blob_id, MediaBlob.ref_count > 0)
+            .values(ref_count=MediaBlob.ref_count - 1)
+        )
+
+    @staticmethod
+    def delete_asset(db: Session, asset: MediaAsset) -> None:
+        """Delete an asset and release its blob"""
+        if asset.blob_id is not None:
+            MediaService.release_blob(db, asset.blob_id)
+        elif asset.file_url.startswith("/uploads/"):
+            # Legacy per-upload file, not shared with other assets
+            (UPLOAD_DIR / asset.file_url[len("/uploads/"):]).unlink(missing_ok=True)
+        db.delete(asset)
+        db.commit()
+
+    @staticmethod
+    def delete_stored_blob(storage_backend: str, storage_key: str) -> None:
+        """Remove a blob's original and derivatives from its storage backend"""
+        storage = get_storage(storage_backend)
+        storage.delete(storage_key)
+        variant_prefix = storage_key.rsplit(".", 1)[0] + "_"
+        for key, _, _ in list(storage.list(variant_prefix)):
+            storage.delete(key)
+
+    @staticmethod
+    def collect_garbage(db: Session, grace_seconds: int = 3600, dry_run: bool = False) -> dict:
+        """Remove unreferenced blobs, orphaned blob files and stale temp files"""
+        stats = {"blobs": 0, "orphans": 0, "temp_files": 0, "bytes": 0}
+        cutoff = time.time() - grace_seconds
+
+        unreferenced = (
+            db.query(MediaBlob.id, MediaBlob.storage_backend, MediaBlob.storage_key, MediaBlob.size)
+            .filter(MediaBlob.ref_count <= 0)
+            .all()
+        )
+        for blob_id, storage_backend, storage_key, size in unreferenced:
+            if not dry_run:
+                # Keep the row, marked, until the files are gone: its unique sha256 stops
+                # acquire_blob from storing the same content at the same key meanwhile
+                result = db.execute(
+                    update(MediaBlob)
+                    .where(MediaBlob.id == blob_id, MediaBlob.ref_count <= 0)
+                    .values(ref_count=COLLECTING)
+                )
+                db.commit()
+                if not result.rowcount:
+                    continue
+                MediaService.delete_stored_blob(storage_backend, storage_key)
+                db.execute(delete(MediaBlob).where(MediaBlob.id == blob_id, MediaBlob.ref_count == COLLECTING))
+                db.commit()
+            stats["blobs"] += 1
+            stats["bytes"] += size
+
+        # Derivatives are named <sha256>_<variant>, so match objects on the hash prefix
+        known_hashes = {sha256 for (sha256,) in db.query(MediaBlob.sha256).all()}
+        storage = get_storage()
+        for key, size, mtime in list(storage.list()):
+            if key.rsplit("/", 1)[-1][:64] in known_hashes or mtime > cutoff:
+                continue
+            stats["orphans"] += 1
+            stats["bytes"] += size
+            if not dry_run:
+                storage.delete(key)
+
+        if TMP_DIR.exists():
+            for path in TMP_DIR.iterdir():
+                if path.stat().st_mtime > cutoff:
+                    continue
+                stats["temp_files"] += 1
+                if dry_run:
+                    continue
+                if path.is_dir():
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    path.unlink(missing_ok=True)
+
+        return stats
@@ -0,0 +1,119 @@
+"""
+Presence and typing state for chat channels, published as coalesced diffs
+
+Joins, leaves and typing changes only mark a channel dirty. Once per tick
+the tracker compares each dirty channel with what was last announced and
+returns one diff per channel, so a burst of N events in a room of M
+members costs M sends, not N x M. Typing state expires after
+TYPING_TTL_SECONDS unless the client renews it.
+"""
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+PRESENCE_TICK_SECONDS = float(os.getenv("PRESENCE_TICK_MS", "1000")) / 1000
+TYPING_TTL_SECONDS = float(os.getenv("TYPING_TTL_SECONDS", "6"))
+
+
+class ChannelPresence:
+    """Connection counts and typing deadlines for one channel, plus what was last announced"""
+
+    def __init__(self):
+        self.connections: Dict[int, int] = {}  # user_id -> open connections
+        self.typing: Dict[int, float] = {}  # user_id -> monotonic expiry
+        self.announced_online: Set[int] = set()
+        self.announced_typing: Set[int] = set()
+
+    def is_empty(self) -> bool:
+        return not (self.connections or self.typing or self.announced_online or self.announced_typing)
+
+
+class PresenceTracker:
+    def __init__(self, typing_ttl: float = TYPING_TTL_SECONDS):
+        self.typing_ttl = typing_ttl
+        self.channels: Dict[str, ChannelPresence] = {}
+        self.names: Dict[int, str] = {}
+        self._dirty: Set[str] = set()
+
+    def _channel(self, channel: str) -> ChannelPresence:
+        state = self.channels.get(channel)
+        if state is None:
+            state = self.channels[channel] = ChannelPresence()
+        return state
+
+    def join(self, channels: Iterable[str], user_id: int, user_name: str) -> None:
+        self.names[user_id] = user_name
+        for channel in channels:
+            state = self._channel(channel)
+            state.connections[user_id] = state.connections.get(user_id, 0) + 1
+            self._dirty.add(channel)
+
+    def leave(self, channels: Iterable[str], user_id: int) -> None:
+        for channel in channels:
+            state = self.channels.get(channel)
+            if state is None or user_id not in state.connections:
+                continue
+            state.connections[user_id] -= 1
+            if state.connections[user_id] <= 0:
+                del state.connections[user_id]
+                state.typing.pop(user_id, None)
+            self._dirty.add(channel)
+
+    def set_typing(self, channel: str, user_id: int, user_name: str, now: Optional[float] = None) -> None:
+        self.names.setdefault(user_id, user_name)
+        state = self._channel(channel)
+        if user_id not in state.typing:
+            self._dirty.add(channel)
+        state.typing[user_id] = (now if now is not None else time.monotonic()) + self.typing_ttl
+
+    def clear_typing(self, channel: str, user_id: int) -> None:
+        state = self.channels.get(channel)
+        if state is not None and state.typing.pop(user_id, None) is not None:
+            self._dirty.add(channel)
+
+    def snapshot(self, channel: str) -> dict:
+        """Announced state of a channel; later diffs apply on top of it"""
+        state = self.channels.get(channel) or ChannelPresence()
+        return {
+            "channel": channel,
+            "online": [self._member(user_id) for user_id in sorted(state.announced_online)],
+            "typing": sorted(state.announced_typing),
+        }
+
+    def collect(self, now: Optional[float] = None) -> List[dict]:
+        """Expire typing and return one diff per channel whose announced state changed"""
+        now = now if now is not None else time.monotonic()
+        for channel, state in self.channels.items():
+            expired = [user_id for user_id, expires_at in state.typing.items() if expires_at <= now]
+            for user_id in expired:
+                del state.typing[user_id]
+            if expired:
+                self._dirty.add(channel)
+
+        diffs = []
+        dirty, self._dirty = self._dirty, set()
+        for channel in sorted(dirty):
+            state = self.channels.get(channel)
+            if state is None:
+                continue
+            online = set(state.connections)
+            typing = set(state.typing)
+            diff = {
+                "channel": channel,
+                "joined": [self._member(user_id) for user_id in sorted(online - state.announced_online)],
+                "left": sorted(state.announced_online - online),
+                "typing": sorted(typing - state.announced_typing),
+                "idle": sorted(state.announced_typing - typing),
+            }
+            state.announced_online, state.announced_typing = online, typing
+            if state.is_empty():
+                del self.channels[channel]
+            if diff["joined"] or diff["left"] or diff["typing"] or diff["idle"]:
+                diffs.append(diff)
+        return diffs
+
+    def is_idle(self) -> bool:
+        return not self.channels and not self._dirty
+
+    def _member(self, user_id: int) -> dict:
+        return {"user_id": user_id, "user_name": self.names.get(user_id, "")}
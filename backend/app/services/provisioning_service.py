@@ -0,0 +1,218 @@
+"""
+Bulk user provisioning: CSV / JSONL imports with parallel hashing and batched inserts
+"""
+import csv
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import IO, Iterable, Iterator, Optional
+
+from pydantic import ValidationError
+from sqlalchemy import func, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.user import User, Workspace
+from app.schemas.user_schema import UserImportRow
+from app.services.user_service import pwd_context
+from app.services.workspace_templates import workspace_template
+
+PROVISIONING_BATCH_SIZE = int(os.getenv("PROVISIONING_BATCH_SIZE", "500"))
+PROVISIONING_HASH_WORKERS = int(os.getenv("PROVISIONING_HASH_WORKERS", "0")) or os.cpu_count() or 1
+IMPORT_FORMATS = ("csv", "jsonl")
+
+_hash_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _hash_password(password: str) -> str:
+    # Module-level so worker processes can unpickle it
+    return pwd_context.hash(password)
+
+
+def get_hash_pool() -> ProcessPoolExecutor:
+    """Process pool shared by imports; argon2 is CPU-bound and holds the GIL for most of a hash"""
+    global _hash_pool
+    if _hash_pool is None:
+        _hash_pool = ProcessPoolExecutor(max_workers=PROVISIONING_HASH_WORKERS)
+    return _hash_pool
+
+
+def shutdown_hash_pool() -> None:
+    global _hash_pool
+    if _hash_pool is not None:
+        _hash_pool.shutdown(cancel_futures=True)
+        _hash_pool = None
+
+
+def detect_format(filename: Optional[str], content_type: Optional[str]) -> Optional[str]:
+    """Import format from a file name or content type, if recognisable"""
+    suffix = os.path.splitext(filename or "")[1].lower()
+    if suffix == ".csv" or (content_type or "").startswith("text/csv"):
+        return "csv"
+    if suffix in (".jsonl", ".ndjson") or (content_type or "").split(";")[0] in (
+        "application/jsonl",
+        "application/x-ndjson",
+    ):
+        return "jsonl"
+    return None
+
+
+def read_rows(stream: IO[bytes], fmt: str) -> Iterator[tuple]:
+    """Yield (line_number, row) from a binary CSV or JSONL stream
+
+    Rows that cannot be parsed are yielded as the error message instead of a dict.
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        for row in reader:
+            # Empty cells mean "use the default" rather than an empty string
+            yield reader.line_num, {key: value for key, value in row.items() if key and value not in ("", None)}
+        return
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield line_number, f"Invalid JSON: {exc}"
+            continue
+        yield line_number, row if isinstance(row, dict) else "Each line must be a JSON object"
+
+
+def subscription_tier(row: UserImportRow) -> str:
+    return row.subscription_tier or ("free" if row.role == "user" else row.role)
+
+
+def workspace_for(user_id: int, row: UserImportRow) -> dict:
+    template = workspace_template(row.role, subscription_tier(row))
+    return {"user_id": user_id, "user_email": row.email, "role": row.role, "version": 1, **template}
+
+
+class ProvisioningService:
+    """Bulk account creation for agency onboarding"""
+
+    @staticmethod
+    def import_rows(
+        db: Session,
+        rows: Iterable[tuple],
+        allowed_roles: Optional[set] = None,
+        batch_size: int = PROVISIONING_BATCH_SIZE,
+    ) -> Iterator[dict]:
+        """Create users and workspaces from parsed rows, yielding one result per row
+
+        Rows are validated and de-duplicated, then handled a batch at a
+        time: passwords are hashed across the process pool and users and
+        workspaces go in with one multi-row INSERT each, committed per
+        batch. Results carry status created, exists, duplicate or error.
+        The last item is {"summary": {status: count}}.
+        """
+        summary = {"created": 0, "exists": 0, "duplicate": 0, "error": 0}
+        seen = set()
+        batch = []
+
+        def flush():
+            for result in ProvisioningService._insert_batch(db, batch):
+                summary[result["status"]] += 1
+                yield result
+            batch.clear()
+
+        for line, raw in rows:
+            if isinstance(raw, str):
+                summary["error"] += 1
+                yield {"line": line, "status": "error", "detail": raw}
+                continue
+            try:
+                row = UserImportRow.model_validate(raw)
+            except ValidationError as exc:
+                summary["error"] += 1
+                detail = "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in exc.errors())
+                yield {"line": line, "email": raw.get("email"), "status": "error", "detail": detail}
+                continue
+            if allowed_roles is not None and row.role not in allowed_roles:
+                summary["error"] += 1
+                yield {"line": line, "email": row.email, "status": "error",
+                       "detail": f"Not allowed to create {row.role} accounts"}
+                continue
+            email = row.email.lower()
+            if email in seen:
+                summary["duplicate"] += 1
+                yield {"line": line, "email": row.email, "status": "duplicate"}
+                continue
+            seen.add(email)
+            batch.append((line, row))
+            if len(batch) >= batch_size:
+                yield from flush()
+        if batch:
+            yield from flush()
+        yield {"summary": summary}
+
+    @staticmethod
+    def _insert_batch(db: Session, batch: list) -> Iterator[dict]:
+        # Compared lowercased on both sides: Alice@x.com is the account alice@x.com
+        existing = {
+            email.lower()
+            for (email,) in db.query(User.email).filter(
+                func.lower(User.email).in_([row.email.lower() for _, row in batch])
+            )
+        }
+        pending = [(line, row) for line, row in batch if row.email.lower() not in existing]
+        for line, row in batch:
+            if row.email.lower() in existing:
+                yield {"line": line, "email": row.email, "status": "exists"}
+        if not pending:
+            return
+
+        hashes = get_hash_pool().map(_hash_password, [row.password for _, row in pending], chunksize=16)
+        now = datetime.utcnow()
+        user_rows = [
+            {
+                "email": row.email,
+                "hashed_password": hashed,
+                "full_name": row.full_name,
+                "role": row.role,
+                "subscription_tier": subscription_tier(row),
+                "is_active": row.is_active,
+                "is_verified": row.is_verified,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for (_, row), hashed in zip(pending, hashes)
+        ]
+
+        try:
+            # insertmanyvalues: one multi-row INSERT ... RETURNING per page of rows
+            inserted = db.execute(insert(User).returning(User.id, User.email), user_rows).all()
+            ids = {email.lower(): user_id for user_id, email in inserted}
+            db.execute(
+                insert(Workspace),
+                [workspace_for(ids[row.email.lower()], row) for _, row in pending],
+            )
+            db.commit()
+        except IntegrityError:
+            # An account was created concurrently; fall back to one savepoint per row
+            db.rollback()
+            yield from ProvisioningService._insert_rows(db, pending, user_rows)
+            return
+
+        for line, row in pending:
+            yield {"line": line, "email": row.email, "status": "created", "id": ids[row.email.lower()]}
+
+    @staticmethod
+    def _insert_rows(db: Session, pending: list, user_rows: list) -> Iterator[dict]:
+        for (line, row), user_row in zip(pending, user_rows):
+            # The unique constraint is case-sensitive; the concurrent account may differ in case
+            if db.query(User.id).filter(func.lower(User.email) == row.email.lower()).first() is not None:
+                yield {"line": line, "email": row.email, "status": "exists"}
+                continue
+            try:
+                with db.begin_nested():
+                    user_id = db.execute(insert(User).returning(User.id), user_row).scalar_one()
+                    db.execute(insert(Workspace), workspace_for(user_id, row))
+            except IntegrityError:
+                yield {"line": line, "email": row.email, "status": "exists"}
+                continue
+            yield {"line": line, "email": row.email, "status": "created", "id": user_id}
+        db.commit()
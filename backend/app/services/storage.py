@@ -0,0 +1,196 @@
+"""
+Media storage backends: sharded local filesystem and S3-compatible object storage
+"""
+import mimetypes
+import os
+import shutil
+from pathlib import Path
+from typing import Iterator, Optional
+from dotenv import load_dotenv
+
+from app.core.media_files import IMMUTABLE_CACHE_CONTROL
+
+ROOT_DIR = Path(__file__).resolve().parents[3]
+load_dotenv(dotenv_path=ROOT_DIR / ".env", override=True)
+
+UPLOAD_DIR = Path(os.getenv("MEDIA_ROOT") or ROOT_DIR / "uploads")
+
+MEDIA_STORAGE_BACKEND = os.getenv("MEDIA_STORAGE_BACKEND", "local")
+S3_BUCKET = os.getenv("S3_BUCKET", "")
+S3_PREFIX = os.getenv("S3_PREFIX", "")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None  # e.g. a local MinIO or moto server
+S3_REGION = os.getenv("S3_REGION") or None
+S3_PUBLIC_BASE_URL = os.getenv("S3_PUBLIC_BASE_URL", "")  # CDN / public bucket; presigned redirects otherwise
+S3_PRESIGN_SECONDS = int(os.getenv("S3_PRESIGN_SECONDS", "3600"))
+
+
+class StorageBackend:
+    """Interface for media blob storage
+
+    Keys are sharded relative paths such as ab/cd/<sha256>.jpg.
+    """
+
+    name = ""
+
+    def save(self, key: str, source: Path) -> None:
+        """Store a local file under key; the source file is consumed"""
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def download(self, key: str, destination: Path) -> None:
+        """Copy the stored object to a local file"""
+        raise NotImplementedError
+
+    def list(self, prefix: str = "") -> Iterator[tuple]:
+        """Yield (key, size, mtime) for stored objects under prefix"""
+        raise NotImplementedError
+
+    def url(self, key: str) -> str:
+        """URL stored on assets and returned to clients"""
+        raise NotImplementedError
+
+    def redirect_url(self, key: str) -> str:
+        """Short-lived URL the /api/v1/media route redirects to"""
+        return self.url(key)
+
+    def local_path(self, key: str) -> Optional[Path]:
+        """Filesystem path of the object when it is stored locally"""
+        return None
+
+
+class LocalStorage(StorageBackend):
+    """Hash-sharded directory tree served by the /uploads mount"""
+
+    name = "local"
+
+    def __init__(self, root: Path = UPLOAD_DIR, base_url: str = "/uploads"):
+        self.root = Path(root)
+        self.base_url = base_url.rstrip("/")
+
+    def local_path(self, key: str) -> Path:
+        return self.root / key
+
+    def save(self, key: str, source: Path) -> None:
+        destination = self.root / key
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.replace(source, destination)
+        except OSError:
+            # Staging directory on another filesystem
+            shutil.move(str(source), destination)
+
+    def exists(self, key: str) -> bool:
+        return (self.root / key).exists()
+
+    def delete(self, key: str) -> None:
+        (self.root / key).unlink(missing_ok=True)
+
+    def download(self, key: str, destination: Path) -> None:
+        shutil.copyfile(self.root / key, destination)
+
+    def list(self, prefix: str = "") -> Iterator[tuple]:
+        # Only the two-level shard directories; hidden staging directories are skipped
+        for path in self.root.glob("??/??/*"):
+            key = path.relative_to(self.root).as_posix()
+            if key.startswith(prefix) and path.is_file():
+                stat_result = path.stat()
+                yield key, stat_result.st_size, stat_result.st_mtime
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+
+class S3Storage(StorageBackend):
+    """S3-compatible object storage (AWS S3, MinIO, moto server, ...)"""
+
+    name = "s3"
+
+    def __init__(
+        self,
+        bucket: str = S3_BUCKET,
+        prefix: str = S3_PREFIX,
+        endpoint_url: Optional[str] = S3_ENDPOINT_URL,
+        region: Optional[str] = S3_REGION,
+        public_base_url: str = S3_PUBLIC_BASE_URL,
+        presign_seconds: int = S3_PRESIGN_SECONDS,
+    ):
+        try:
+            import boto3
+            from botocore.exceptions import ClientError
+        except ImportError:
+            raise RuntimeError("boto3 is required for the s3 media storage backend")
+        if not bucket:
+            raise RuntimeError("S3_BUCKET must be set for the s3 media storage backend")
+        self.client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region)
+        self.client_error = ClientError
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.public_base_url = public_base_url.rstrip("/")
+        self.presign_seconds = presign_seconds
+
+    def _object_key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def save(self, key: str, source: Path) -> None:
+        content_type = mimetypes.guess_type(key)[0] or "application/octet-stream"
+        self.client.upload_file(
+            str(source),
+            self.bucket,
+            self._object_key(key),
+            ExtraArgs={"ContentType": content_type, "CacheControl": IMMUTABLE_CACHE_CONTROL},
+        )
+        Path(source).unlink(missing_ok=True)
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+            return True
+        except self.client_error as exc:
+            if exc.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+
+    def download(self, key: str, destination: Path) -> None:
+        self.client.download_file(self.bucket, self._object_key(key), str(destination))
+
+    def list(self, prefix: str = "") -> Iterator[tuple]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._object_key(prefix)):
+            for obj in page.get("Contents", []):
+                yield obj["Key"][len(self.prefix):], obj["Size"], obj["LastModified"].timestamp()
+
+    def url(self, key: str) -> str:
+        if self.public_base_url:
+            return f"{self.public_base_url}/{key}"
+        return f"/api/v1/media/{key}"
+
+    def redirect_url(self, key: str) -> str:
+        if self.public_base_url:
+            return self.url(key)
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": self._object_key(key)},
+            ExpiresIn=self.presign_seconds,
+        )
+
+
+STORAGE_BACKENDS = {"local": LocalStorage, "s3": S3Storage}
+_storages: dict = {}
+
+
+def get_storage(name: Optional[str] = None) -> StorageBackend:
+    """Storage backend by name; defaults to MEDIA_STORAGE_BACKEND"""
+    name = name or MEDIA_STORAGE_BACKEND
+    if name not in _storages:
+        if name not in STORAGE_BACKENDS:
+            raise RuntimeError(f"Unknown media storage backend: {name}")
+        _storages[name] = STORAGE_BACKENDS[name]()
+    return _storages[name]
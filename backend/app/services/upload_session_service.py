@@ -0,0 +1,181 @@
+"""
+Upload session service for resumable chunked uploads
+"""
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+import aiofiles
+from fastapi import HTTPException, status
+
+from app.services.media_service import TMP_DIR, UPLOAD_DIR, UPLOAD_CHUNK_BYTES
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; PATCHes are then only serialized within a process
+    fcntl = None
+
+PARTIAL_DIR = UPLOAD_DIR / ".partial"
+RESUMABLE_MAX_UPLOAD_BYTES = int(os.getenv("RESUMABLE_MAX_UPLOAD_BYTES", str(2 * 1024 * 1024 * 1024)))
+UPLOAD_SESSION_TTL_SECONDS = int(os.getenv("UPLOAD_SESSION_TTL_SECONDS", str(24 * 3600)))
+
+# Serializes PATCH requests per session within this process; a flock on the
+# .part file keeps PATCHes from other worker processes out as well
+_session_locks: dict = {}
+
+
+class UploadSessionService:
+    """Resumable upload sessions kept on disk until finalized or expired
+
+    Each session is a JSON metadata file plus a .part file under
+    uploads/.partial; the size of the .part file is the current offset.
+    The .part file is only removed once its content is stored, so a
+    completion that fails can be retried without sending the file again.
+    """
+
+    @staticmethod
+    def _meta_path(upload_id: str) -> Path:
+        return PARTIAL_DIR / f"{upload_id}.json"
+
+    @staticmethod
+    def part_path(upload_id: str) -> Path:
+        return PARTIAL_DIR / f"{upload_id}.part"
+
+    @staticmethod
+    def create(user_id: int, filename: str, content_type: str, file_ext: str, file_type: str, size: int) -> dict:
+        """Create a session and its empty .part file"""
+        PARTIAL_DIR.mkdir(parents=True, exist_ok=True)
+        session = {
+            "upload_id": uuid.uuid4().hex,
+            "user_id": user_id,
+            "filename": filename,
+            "content_type": content_type,
+            "file_ext": file_ext,
+            "file_type": file_type,
+            "size": size,
+            "created_at": time.time(),
+        }
+        UploadSessionService.part_path(session["upload_id"]).touch()
+        UploadSessionService._meta_path(session["upload_id"]).write_text(json.dumps(session))
+        return session
+
+    @staticmethod
+    def get(upload_id: str, user_id: int) -> dict:
+        """Load a live session owned by the user"""
+        meta_path = UploadSessionService._meta_path(upload_id)
+        if not upload_id.isalnum() or not meta_path.exists():
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload session not found")
+        session = json.loads(meta_path.read_text())
+        if session["user_id"] != user_id:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload session not found")
+        if UploadSessionService.expires_at(session) < time.time():
+            UploadSessionService.discard(upload_id)
+            raise HTTPException(status_code=status.HTTP_410_GONE, detail="Upload session expired")
+        return session
+
+    @staticmethod
+    def offset(upload_id: str) -> int:
+        return UploadSessionService.part_path(upload_id).stat().st_size
+
+    @staticmethod
+    def expires_at(session: dict) -> float:
+        """Sessions expire a TTL after their last received chunk"""
+        part_path = UploadSessionService.part_path(session["upload_id"])
+        last_activity = part_path.stat().st_mtime if part_path.exists() else session["created_at"]
+        return last_activity + UPLOAD_SESSION_TTL_SECONDS
+
+    @staticmethod
+    async def append(session: dict, offset: int, chunks: AsyncIterator[bytes]) -> int:
+        """Append a chunk written at the given offset and return the new offset"""
+        upload_id = session["upload_id"]
+        lock = _session_locks.setdefault(upload_id, asyncio.Lock())
+        async with lock:
+            part_path = UploadSessionService.part_path(upload_id)
+            async with aiofiles.open(part_path, "ab") as out:
+                if fcntl is not None:
+                    try:
+                        # Never waits: a PATCH still streaming in another process holds the session
+                        fcntl.flock(out.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        raise HTTPException(
+                            status_code=status.HTTP_409_CONFLICT,
+                            detail="Another request is writing to this upload",
+                            headers={"Upload-Offset": str(UploadSessionService.offset(upload_id)), "Retry-After": "1"},
+                        )
+                # Read under the lock, so two PATCHes at one offset cannot both append
+                current = os.fstat(out.fileno()).st_size
+                if offset != current:
+                    raise HTTPException(
+                        status_code=status.HTTP_409_CONFLICT,
+                        detail="Upload-Offset does not match the current offset",
+                        headers={"Upload-Offset": str(current)},
+                    )
+                written = current
+                async for chunk in chunks:
+                    written += len(chunk)
+                    if written > session["size"]:
+                        await out.truncate(current)
+                        raise HTTPException(
+                            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail="Chunk exceeds the declared upload size",
+                        )
+                    await out.write(chunk)
+                # Written out before the lock is released with the file
+                await out.flush()
+            return written
+
+    @staticmethod
+    def hash_part(upload_id: str) -> str:
+        """SHA-256 of the received bytes"""
+        digest = hashlib.sha256()
+        with open(UploadSessionService.part_path(upload_id), "rb") as f:
+            for chunk in iter(lambda: f.read(UPLOAD_CHUNK_BYTES), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def stage_part(upload_id: str) -> Path:
+        """A temporary path with the received bytes, for MediaService.acquire_blob to consume
+
+        A hard link, so nothing is copied and the .part file outlives a
+        failed store; copied when the staging directory is on another
+        filesystem.
+        """
+        TMP_DIR.mkdir(parents=True, exist_ok=True)
+        staged = TMP_DIR / uuid.uuid4().hex
+        try:
+            os.link(UploadSessionService.part_path(upload_id), staged)
+        except OSError:
+            shutil.copyfile(UploadSessionService.part_path(upload_id), staged)
+        return staged
+
+    @staticmethod
+    def discard(upload_id: str) -> None:
+        """Remove a session and whatever it received"""
+        UploadSessionService._meta_path(upload_id).unlink(missing_ok=True)
+        UploadSessionService.part_path(upload_id).unlink(missing_ok=True)
+        _session_locks.pop(upload_id, None)
+
+    @staticmethod
+    def expire_sessions(now: Optional[float] = None) -> int:
+        """Discard sessions idle for longer than the TTL"""
+        if not PARTIAL_DIR.exists():
+            return 0
+        now = now or time.time()
+        expired = 0
+        for meta_path in PARTIAL_DIR.glob("*.json"):
+            try:
+                session = json.loads(meta_path.read_text())
+                if UploadSessionService.expires_at(session) >= now:
+                    continue
+            except (OSError, ValueError, KeyError):
+                pass
+            UploadSessionService.discard(meta_path.stem)
+            expired += 1
+        return expired
@@ -4,6 +4,7 @@ User service for authentication and user management
 from datetime import datetime, timedelta
 from typing import Optional
 from passlib.context import CryptContext
+from sqlalchemy import or_
 from sqlalchemy.orm import Session
 from jose import JWTError, jwt
 import os
@@ -12,6 +13,7 @@ from pathlib import Path
 
 from app.models.user import User, Workspace
 from app.schemas.user_schema import UserCreate, UserLogin, UserResponse
+from app.core.response_cache import response_cache
 
 ROOT_DIR = Path(__file__).resolve().parents[3]
 load_dotenv(dotenv_path=ROOT_DIR / ".env", override=True)
@@ -80,7 +82,22 @@ class UserService:
         db.add(db_user)
         db.commit()
         db.refresh(db_user)
+        response_cache.invalidate(f"user:{db_user.id}")
         return db_user
+
+    @staticmethod
+    def record_login(db: Session, user_id: int, logged_in_at: datetime) -> None:
+        """Stamp last_login and drop cached copies of the user
+
+        Runs as the touch_last_login job, so a stamp may arrive after a
+        later one; last_login only moves forward.
+        """
+        db.query(User).filter(
+            User.id == user_id,
+            or_(User.last_login.is_(None), User.last_login < logged_in_at),
+        ).update({"last_login": logged_in_at}, synchronize_session=False)
+        db.commit()
+        response_cache.invalidate(f"user:{user_id}")
     
     @staticmethod
     def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
@@ -106,6 +123,7 @@ class UserService:
         db.add(workspace)
         db.commit()
         db.refresh(workspace)
+        response_cache.invalidate(f"workspace:{user_id}")
         return workspace
     
     @staticmethod
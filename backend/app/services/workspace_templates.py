@@ -0,0 +1,88 @@
+"""
+Workspace templates: the workspace each new account starts with
+
+Staff accounts get their role's template and plain users their
+subscription tier's; anything else falls back to the free template.
+Used by bulk provisioning, the seed scripts and the dataset generator.
+"""
+import copy
+from typing import Optional
+
+# Keyed by role (staff) or subscription tier (users)
+WORKSPACE_TEMPLATES = {
+    "admin": {
+        "workspace_name": "System Atelier",
+        "workspace_description": "Gouvernance de la plateforme et supervision globale",
+        "theme": "aura",
+        "widgets": [
+            "platform_health",
+            "talent_registry",
+            "casting_pipeline",
+            "compliance_review",
+            "risk_alerts",
+            "partner_access",
+        ]
+    },
+    "manager": {
+        "workspace_name": "Platform Direction",
+        "workspace_description": "Pilotage des opérations et des équipes",
+        "theme": "aura",
+        "widgets": [
+            "portfolio_approvals",
+            "booking_flow",
+            "client_briefs",
+            "content_standards",
+            "team_overview",
+        ]
+    },
+    "moderator": {
+        "workspace_name": "Moderation Studio",
+        "workspace_description": "Qualité, conformité et sécurité des contenus",
+        "theme": "aura",
+        "widgets": [
+            "content_review",
+            "flagged_profiles",
+            "photo_rights",
+            "feedback_queue",
+        ]
+    },
+    "premium": {
+        "workspace_name": "Premium Model Studio",
+        "workspace_description": "Outils avancés pour portfolios et castings",
+        "theme": "aura",
+        "widgets": [
+            "portfolio_editor",
+            "casting_invites",
+            "brand_deals",
+            "analytics",
+            "availability_calendar",
+        ]
+    },
+    "free": {
+        "workspace_name": "Model Workspace",
+        "workspace_description": "Gérez votre book et votre présence",
+        "theme": "aura",
+        "widgets": [
+            "portfolio_overview",
+            "applications",
+            "messages",
+            "notifications",
+        ]
+    },
+    "demo": {
+        "workspace_name": "Demo Atelier",
+        "workspace_description": "Découverte guidée de l’écosystème",
+        "theme": "aura",
+        "widgets": [
+            "guided_tour",
+            "sample_portfolio",
+            "sample_castings",
+        ]
+    },
+}
+
+
+def workspace_template(role: str, subscription_tier: Optional[str] = None) -> dict:
+    """Workspace fields (name, description, theme, widgets) for a new account; a copy, free to modify"""
+    key = (subscription_tier or "free") if role == "user" else role
+    return copy.deepcopy(WORKSPACE_TEMPLATES.get(key, WORKSPACE_TEMPLATES["free"]))
@@ -0,0 +1,297 @@
+#!/usr/bin/env python
+"""
+Micro-benchmarks for code that runs on every request
+
+Covers token creation and verification, password verification,
+get_user_from_token, ChatMessageResponse.from_orm over a chat history
+page, ConnectionManager.broadcast to fake sockets, the content filter
+over a synthetic blocklist and get_db session setup/teardown, against a
+scratch SQLite file.
+
+Timings follow timeit: each sample runs the operation enough times to
+take at least --min-sample-ms, the garbage collector is off while
+sampling, and the median of --samples samples is reported with its
+interquartile range. Compare runs on the same machine only.
+
+--record appends the run as one JSON line to the history file (default
+benchmarks/history/hotpaths.jsonl), tagged with the git commit, so the
+history diff shows up in the pull request. --compare checks the run
+against the latest recorded run from the same machine and exits 1 when a
+median slowed down by more than --max-slowdown.
+
+Run with: python benchmarks/bench_hotpaths.py [--only verify_token,broadcast] [--sockets 500]
+          python benchmarks/bench_hotpaths.py --compare --record
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+DEFAULT_HISTORY = BACKEND_DIR / "benchmarks" / "history" / "hotpaths.jsonl"
+BENCH_EMAIL = "bench@example.com"
+
+
+def autorange(timer: Callable[[int], float], min_seconds: float) -> int:
+    """Smallest loop count (1, 2, 5, 10, 20, ...) whose run takes at least min_seconds"""
+    loops = 1
+    while True:
+        for multiplier in (1, 2, 5):
+            if timer(loops * multiplier) >= min_seconds:
+                return loops * multiplier
+        loops *= 10
+
+
+def measure(timer: Callable[[int], float], samples: int, min_seconds: float) -> dict:
+    """Per-operation timings in microseconds; timer(loops) returns elapsed seconds"""
+    timer(1)  # warm-up: imports, caches, lazily compiled validators
+    loops = autorange(timer, min_seconds)
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        timings = sorted(timer(loops) / loops * 1e6 for _ in range(samples))
+    finally:
+        if enabled:
+            gc.enable()
+    quartiles = statistics.quantiles(timings, n=4) if len(timings) > 1 else [timings[0]] * 3
+    return {
+        "median_us": round(statistics.median(timings), 3),
+        "min_us": round(timings[0], 3),
+        "iqr_us": round(quartiles[2] - quartiles[0], 3),
+        "loops": loops,
+        "samples": samples,
+    }
+
+
+def sync_timer(func: Callable[[], object]) -> Callable[[int], float]:
+    def timer(loops: int) -> float:
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        return time.perf_counter() - started
+    return timer
+
+
+def async_timer(loop: asyncio.AbstractEventLoop, func) -> Callable[[int], float]:
+    """Time an async callable inside the event loop, so run_until_complete is not counted"""
+    async def run(loops: int) -> float:
+        started = time.perf_counter()
+        for _ in range(loops):
+            await func()
+        return time.perf_counter() - started
+
+    return lambda loops: loop.run_until_complete(run(loops))
+
+
+def make_sockets(count: int) -> list:
+    from starlette.websockets import WebSocket, WebSocketState
+
+    async def receive():
+        return {"type": "websocket.disconnect"}
+
+    async def send(message):
+        pass
+
+    sockets = []
+    for _ in range(count):
+        websocket = WebSocket({"type": "websocket", "path": "/ws", "headers": []}, receive, send)
+        websocket.client_state = WebSocketState.CONNECTED
+        websocket.application_state = WebSocketState.CONNECTED
+        sockets.append(websocket)
+    return sockets
+
+
+def build_benchmarks(args, loop: asyncio.AbstractEventLoop, workdir: Path) -> Dict[str, Callable[[int], float]]:
+    # Imported here: the app reads KCD_DATABASE_URL at import time
+    from sqlalchemy import text
+
+    from app.api.chat import ConnectionManager, get_user_from_token
+    from app.core.serialization import encode_row, encode_rows
+    from app.db.database import SessionLocal, get_db, init_db
+    from app.models.user import ChatMessage, User
+    from app.schemas.user_schema import ChatMessageResponse
+    from app.services.content_filter_service import ContentFilter
+    from app.services.user_service import UserService
+
+    init_db()
+    password_hash = UserService.hash_password("bench-password")
+    with SessionLocal() as db:
+        db.add(User(email=BENCH_EMAIL, hashed_password=password_hash, full_name="Bench", role="user"))
+        db.commit()
+    token = UserService.create_access_token({"sub": BENCH_EMAIL}, expires_delta=timedelta(hours=1))
+
+    started = datetime(2024, 1, 1)
+    messages = [
+        ChatMessage(
+            id=i,
+            user_id=i % 50,
+            user_name=f"Model {i % 50}",
+            channel="community",
+            content=f"Casting update {i}: call sheet moved to 9:30, bring comp cards",
+            created_at=started + timedelta(seconds=i),
+        )
+        for i in range(args.rows)
+    ]
+
+    manager = ConnectionManager()
+    manager.active_connections = make_sockets(args.sockets)
+    body = encode_row(ChatMessageResponse, messages[0])
+
+    # Random one- and two-word rules; the message matches none, the common case
+    rng = random.Random(0)
+    rules = [
+        " ".join("".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(4, 9)))
+                 for _ in range(rng.randint(1, 2)))
+        for _ in range(args.rules)
+    ]
+    content_filter = ContentFilter(path=workdir / "no-rules-file", reload_seconds=float("inf"))
+    content_filter.refresh()
+    content_filter.load(rules)
+
+    def session_user():
+        with SessionLocal() as db:
+            return get_user_from_token(token, db)
+
+    def get_db_cycle(query: bool):
+        generator = get_db()
+        db = next(generator)
+        if query:
+            db.execute(text("SELECT 1"))
+        generator.close()
+
+    return {
+        "create_access_token": sync_timer(
+            lambda: UserService.create_access_token({"sub": BENCH_EMAIL}, expires_delta=timedelta(minutes=30))
+        ),
+        "verify_token": sync_timer(lambda: UserService.verify_token(token)),
+        "verify_password": sync_timer(lambda: UserService.verify_password("bench-password", password_hash)),
+        "get_user_from_token": sync_timer(session_user),
+        f"from_orm[{args.rows}]": sync_timer(lambda: [ChatMessageResponse.from_orm(m) for m in messages]),
+        f"encode_rows[{args.rows}]": sync_timer(lambda: encode_rows(ChatMessageResponse, messages)),
+        f"broadcast[{args.sockets}]": async_timer(loop, lambda: manager.broadcast(body)),
+        f"content_filter[{args.rules}]": sync_timer(lambda: content_filter.check(messages[0].content)),
+        "get_db": sync_timer(lambda: get_db_cycle(False)),
+        "get_db+select": sync_timer(lambda: get_db_cycle(True)),
+    }
+
+
+def machine() -> dict:
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "system": platform.system(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def latest_run(history: Path, current_machine: dict) -> Optional[dict]:
+    if not history.exists():
+        return None
+    runs = [json.loads(line) for line in history.read_text().splitlines() if line.strip()]
+    same_machine = [run for run in runs if run.get("machine") == current_machine]
+    return same_machine[-1] if same_machine else None
+
+
+def compare(results: dict, previous: dict, max_slowdown: float) -> List[str]:
+    """Print the change per benchmark; returns the ones past max_slowdown"""
+    slower = []
+    print(f"\nAgainst {previous.get('commit') or 'unknown commit'} ({previous['timestamp']})")
+    for name, result in results.items():
+        before = previous["results"].get(name)
+        if before is None:
+            continue
+        change = result["median_us"] / before["median_us"] - 1
+        # A change inside the combined noise band is not counted as a slowdown
+        noise = (result["iqr_us"] + before["iqr_us"]) / before["median_us"]
+        flag = ""
+        if change > max(max_slowdown, noise):
+            flag = "  ✗ slower"
+            slower.append(name)
+        print(f"{name:<24}{before['median_us']:>14.2f}{result['median_us']:>14.2f}{change:>+10.1%}{flag}")
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark per-request hot paths")
+    parser.add_argument("--only", help="Comma-separated benchmark names (prefix match, e.g. broadcast)")
+    parser.add_argument("--rows", type=int, default=200, help="Chat messages per from_orm / encode_rows call")
+    parser.add_argument("--sockets", type=int, default=500, help="Fake sockets for broadcast")
+    parser.add_argument("--rules", type=int, default=20000, help="Blocklist rules for content_filter")
+    parser.add_argument("--samples", type=int, default=15, help="Samples per benchmark")
+    parser.add_argument("--min-sample-ms", type=float, default=50.0, help="Minimum duration of one sample")
+    parser.add_argument("--history", default=str(DEFAULT_HISTORY), help="JSON-lines history file")
+    parser.add_argument("--record", action="store_true", help="Append this run to the history file")
+    parser.add_argument("--compare", action="store_true", help="Compare with the latest run on this machine")
+    parser.add_argument("--max-slowdown", type=float, default=0.10, help="Allowed relative slowdown (default 0.10)")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="kcd-bench-"))
+    os.environ["KCD_DATABASE_URL"] = f"sqlite:///{(workdir / 'bench.db').as_posix()}"
+    loop = asyncio.new_event_loop()
+    try:
+        benchmarks = build_benchmarks(args, loop, workdir)
+        selected = [name.strip() for name in (args.only or "").split(",") if name.strip()]
+        results = {}
+        print(f"{'benchmark':<24}{'median µs':>14}{'min µs':>14}{'IQR µs':>12}{'loops':>8}")
+        for name, timer in benchmarks.items():
+            if selected and not any(name.startswith(prefix) for prefix in selected):
+                continue
+            result = measure(timer, args.samples, args.min_sample_ms / 1000)
+            results[name] = result
+            print(f"{name:<24}{result['median_us']:>14.2f}{result['min_us']:>14.2f}{result['iqr_us']:>12.2f}{result['loops']:>8}")
+    finally:
+        loop.close()
+        for path in workdir.iterdir():
+            path.unlink()
+        workdir.rmdir()
+
+    run = {
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "commit": git_revision(),
+        "machine": machine(),
+        "results": results,
+    }
+    history = Path(args.history)
+    slower = []
+    if args.compare:
+        previous = latest_run(history, run["machine"])
+        if previous is None:
+            print("\nNo recorded run from this machine to compare with")
+        else:
+            slower = compare(results, previous, args.max_slowdown)
+    if args.record:
+        history.parent.mkdir(parents=True, exist_ok=True)
+        with history.open("a") as handle:
+            handle.write(json.dumps(run, sort_keys=True) + "\n")
+        print(f"\nRecorded in {history}")
+    if slower:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
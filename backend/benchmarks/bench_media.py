@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+"""
+Large-file throughput benchmark for /uploads media serving
+
+Compares the stock StaticFiles mount with MediaFiles for full downloads,
+single byte ranges (video seeking) and the zero-copy path, driving the
+ASGI apps directly so the numbers reflect server-side cost only.
+Pass --url to measure a running server over HTTP instead.
+
+Run with: python benchmarks/bench_media.py [--size-mb 256] [--rounds 5]
+          python benchmarks/bench_media.py --url http://localhost:8000/uploads/ab/cd/<file>
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from starlette.staticfiles import StaticFiles
+
+from app.core.media_files import MediaFiles
+
+FILE_NAME = "0" * 64 + ".mp4"
+
+
+def make_scope(path: str, headers: dict, zerocopy: bool) -> dict:
+    return {
+        "type": "http",
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+        "server": ("bench", 80),
+        "extensions": {"http.response.zerocopy": {}} if zerocopy else {},
+    }
+
+
+async def fetch(app, headers: dict, zerocopy: bool = False) -> tuple:
+    """Run one request through the app and return (status, body_bytes)"""
+    result = {"status": 0, "bytes": 0}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            result["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            result["bytes"] += len(message.get("body", b""))
+        elif message["type"] == "http.response.zerocopy":
+            # Stand-in for the server: kernel-side copy to /dev/null
+            with open(os.devnull, "wb") as sink:
+                offset, remaining = message.get("offset", 0), message["count"]
+                while remaining:
+                    sent = os.sendfile(sink.fileno(), message["file"].fileno(), offset, remaining)
+                    offset += sent
+                    remaining -= sent
+                    result["bytes"] += sent
+
+    await app(make_scope(f"/{FILE_NAME}", headers, zerocopy), receive, send)
+    return result["status"], result["bytes"]
+
+
+async def run_case(app, headers: dict, rounds: int, zerocopy: bool = False) -> dict:
+    timings = []
+    received = 0
+    for _ in range(rounds):
+        started = time.perf_counter()
+        status, received = await fetch(app, headers, zerocopy)
+        timings.append(time.perf_counter() - started)
+    median = statistics.median(timings)
+    return {"status": status, "bytes": received, "median_s": median, "mb_s": received / median / 1e6}
+
+
+async def run_asgi(size_mb: int, rounds: int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / FILE_NAME
+        with open(path, "wb") as out:
+            block = os.urandom(1024 * 1024)
+            for _ in range(size_mb):
+                out.write(block)
+
+        apps = {
+            "StaticFiles": StaticFiles(directory=directory),
+            "MediaFiles": MediaFiles(directory=directory),
+        }
+        seek = f"bytes={size_mb * 1024 * 1024 // 2}-"
+        cases = [
+            ("full", {}, False),
+            ("range 2nd half", {"Range": seek}, False),
+            ("range 1 MB", {"Range": "bytes=0-1048575"}, False),
+        ]
+
+        print(f"File: {size_mb} MB, {rounds} rounds, median per request")
+        print(f"{'app':<14}{'case':<24}{'status':>7}{'MB':>10}{'ms':>10}{'MB/s':>10}")
+        for name, app in apps.items():
+            for case, headers, zerocopy in cases:
+                stats = await run_case(app, headers, rounds, zerocopy)
+                print(f"{name:<14}{case:<24}{stats['status']:>7}{stats['bytes'] / 1e6:>10.1f}"
+                      f"{stats['median_s'] * 1000:>10.1f}{stats['mb_s']:>10.0f}")
+        for case, headers in [("full", {}), ("range 2nd half", {"Range": seek})]:
+            stats = await run_case(apps["MediaFiles"], headers, rounds, zerocopy=True)
+            print(f"{'MediaFiles':<14}{case + ' (0-copy)':<24}{stats['status']:>7}{stats['bytes'] / 1e6:>10.1f}"
+                  f"{stats['median_s'] * 1000:>10.1f}{stats['mb_s']:>10.0f}")
+
+
+def run_http(url: str, rounds: int) -> None:
+    import httpx
+
+    timings = []
+    received = 0
+    with httpx.Client(timeout=None) as client:
+        for _ in range(rounds):
+            started = time.perf_counter()
+            received = 0
+            with client.stream("GET", url) as response:
+                response.raise_for_status()
+                for chunk in response.iter_raw(1024 * 1024):
+                    received += len(chunk)
+            timings.append(time.perf_counter() - started)
+    median = statistics.median(timings)
+    print(f"{url}: {received / 1e6:.1f} MB in {median * 1000:.1f} ms median ({received / median / 1e6:.0f} MB/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark large-file media serving")
+    parser.add_argument("--size-mb", type=int, default=256, help="Size of the generated test file")
+    parser.add_argument("--rounds", type=int, default=5, help="Requests per case")
+    parser.add_argument("--url", help="Benchmark a running server instead of the ASGI apps")
+    args = parser.parse_args()
+
+    if args.url:
+        run_http(args.url, args.rounds)
+    else:
+        asyncio.run(run_asgi(args.size_mb, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
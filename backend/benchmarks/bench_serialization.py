@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+"""
+Serialization benchmark for list endpoints and chat fan-out
+
+Compares the response_model path (from_orm per row, then FastAPI's
+validation and jsonable_encoder pass) with the pre-encoded fast path in
+app.core.serialization, driving minimal FastAPI apps over ASGI so routing
+is included but the database is not. Also compares per-socket send_json
+with encode-once send_text for a chat broadcast.
+
+Run with: python benchmarks/bench_serialization.py [--rows 200] [--sockets 500] [--rounds 200]
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from starlette.websockets import WebSocket, WebSocketState
+
+from app.core.serialization import JSONBytesResponse, encode_json, encode_row, encode_rows
+from app.models.user import ChatMessage
+from app.schemas.user_schema import ChatMessageResponse
+
+
+def make_messages(count: int) -> list:
+    started = datetime(2024, 1, 1)
+    return [
+        ChatMessage(
+            id=i,
+            user_id=i % 50,
+            user_name=f"Model {i % 50}",
+            channel="community",
+            content=f"Casting update {i}: call sheet moved to 9:30, bring comp cards " * 2,
+            created_at=started + timedelta(seconds=i),
+        )
+        for i in range(count)
+    ]
+
+
+def make_assets(count: int) -> list:
+    started = datetime(2024, 1, 1)
+    return [
+        {
+            "id": i,
+            "file_url": f"/uploads/ab/cd/{i:064x}.jpg",
+            "file_type": "image",
+            "variants": {"w320": f"/uploads/ab/cd/{i:064x}_w320.webp", "w640": f"/uploads/ab/cd/{i:064x}_w640.webp"},
+            "created_at": started + timedelta(seconds=i),
+        }
+        for i in range(count)
+    ]
+
+
+def build_apps(messages: list, assets: list) -> dict:
+    baseline = FastAPI()
+    fast = FastAPI()
+
+    @baseline.get("/messages", response_model=List[ChatMessageResponse])
+    async def baseline_messages():
+        return [ChatMessageResponse.from_orm(message) for message in messages]
+
+    @fast.get("/messages", response_model=List[ChatMessageResponse])
+    async def fast_messages():
+        return JSONBytesResponse(encode_rows(ChatMessageResponse, messages))
+
+    @baseline.get("/assets")
+    async def baseline_assets():
+        return JSONResponse(content=jsonable_encoder(assets))
+
+    @fast.get("/assets")
+    async def fast_assets():
+        return JSONBytesResponse(encode_json(assets))
+
+    return {"response_model": baseline, "fast path": fast}
+
+
+async def fetch(app, path: str) -> int:
+    """Run one GET through the app and return the body size"""
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [],
+        "server": ("bench", 80),
+    }
+    received = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal received
+        if message["type"] == "http.response.body":
+            received += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return received
+
+
+async def time_rounds(rounds: int, func) -> float:
+    """Median seconds per call of an async callable"""
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        await func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def make_sockets(count: int) -> list:
+    async def receive():
+        return {"type": "websocket.disconnect"}
+
+    async def send(message):
+        pass
+
+    sockets = []
+    for _ in range(count):
+        websocket = WebSocket({"type": "websocket", "path": "/ws", "headers": []}, receive, send)
+        websocket.client_state = WebSocketState.CONNECTED
+        websocket.application_state = WebSocketState.CONNECTED
+        sockets.append(websocket)
+    return sockets
+
+
+async def run(rows: int, sockets: int, rounds: int) -> None:
+    messages = make_messages(rows)
+    apps = build_apps(messages, make_assets(rows))
+
+    print(f"HTTP: {rows} rows, {rounds} rounds, median per request")
+    print(f"{'path':<12}{'serializer':<18}{'KB':>8}{'ms':>10}{'speedup':>10}")
+    for path in ("/messages", "/assets"):
+        baseline = None
+        for name, app in apps.items():
+            size = await fetch(app, path)
+            median = await time_rounds(rounds, lambda: fetch(app, path))
+            baseline = baseline or median
+            print(f"{path:<12}{name:<18}{size / 1024:>8.1f}{median * 1000:>10.3f}{baseline / median:>9.1f}x")
+
+    connections = make_sockets(sockets)
+    message = messages[0]
+
+    async def send_json_each():
+        payload = ChatMessageResponse.from_orm(message).dict()
+        for websocket in connections:
+            await websocket.send_json(jsonable_encoder(payload))
+
+    async def encode_once():
+        text = encode_row(ChatMessageResponse, message).decode()
+        for websocket in connections:
+            await websocket.send_text(text)
+
+    print(f"\nBroadcast: one message to {sockets} sockets, median per broadcast")
+    baseline = await time_rounds(rounds, send_json_each)
+    fast = await time_rounds(rounds, encode_once)
+    print(f"{'send_json per socket':<30}{baseline * 1000:>10.3f} ms")
+    print(f"{'encode once, send_text':<30}{fast * 1000:>10.3f} ms{baseline / fast:>9.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark response serialization paths")
+    parser.add_argument("--rows", type=int, default=200, help="Rows per list response")
+    parser.add_argument("--sockets", type=int, default=500, help="Connected sockets for the broadcast case")
+    parser.add_argument("--rounds", type=int, default=200, help="Requests per case")
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.sockets, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""
+Media garbage collection for KCD Platform
+
+Removes content-addressed blobs no portfolio asset references any more,
+blob files without a database row, abandoned temporary uploads and
+resumable upload sessions idle for longer than their TTL.
+Run with: python gc_media.py [--dry-run] [--grace-seconds N]
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.db.database import SessionLocal, init_db
+from app.services.media_service import MediaService
+from app.services.upload_session_service import UploadSessionService
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Collect unreferenced media files")
+    parser.add_argument("--dry-run", action="store_true", help="Report without deleting")
+    parser.add_argument(
+        "--grace-seconds",
+        type=int,
+        default=3600,
+        help="Keep untracked files younger than this (in-flight uploads)",
+    )
+    args = parser.parse_args()
+
+    init_db()
+    if not args.dry_run:
+        expired = UploadSessionService.expire_sessions()
+        print(f"Expired {expired} idle resumable upload sessions")
+
+    db = SessionLocal()
+    try:
+        stats = MediaService.collect_garbage(
+            db, grace_seconds=args.grace_seconds, dry_run=args.dry_run
+        )
+    finally:
+        db.close()
+
+    action = "Would remove" if args.dry_run else "Removed"
+    print(f"{action} {stats['blobs']} unreferenced blobs, {stats['orphans']} orphaned files, "
+          f"{stats['temp_files']} temp files ({stats['bytes'] / (1024 * 1024):.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+"""
+Media storage migration for KCD Platform
+
+Moves content-addressed blobs and their derivatives from one storage
+backend to another and rewrites the URLs stored on portfolio assets.
+With --adopt-legacy, flat uploads from before content addressing
+({user_id}_{timestamp}.ext) are first hashed into blobs.
+
+Run with: python migrate_media.py --from local --to s3 [--adopt-legacy] [--keep-source]
+"""
+
+import argparse
+import hashlib
+import sys
+import uuid
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from sqlalchemy import update
+
+from app.db.database import SessionLocal, init_db
+from app.models.user import MediaAsset, MediaBlob
+from app.services.media_service import MediaService, TMP_DIR, UPLOAD_CHUNK_BYTES
+from app.services.storage import STORAGE_BACKENDS, UPLOAD_DIR, get_storage
+
+
+def adopt_legacy_uploads(db) -> int:
+    """Turn flat legacy upload files into content-addressed blobs"""
+    adopted = 0
+    legacy_assets = (
+        db.query(MediaAsset)
+        .filter(MediaAsset.blob_id.is_(None), MediaAsset.file_url.like("/uploads/%"))
+        .all()
+    )
+    for asset in legacy_assets:
+        legacy_path = UPLOAD_DIR / asset.file_url[len("/uploads/"):]
+        if not legacy_path.is_file():
+            print(f"  ! Missing file for asset {asset.id}: {legacy_path}")
+            continue
+
+        TMP_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = TMP_DIR / uuid.uuid4().hex
+        digest = hashlib.sha256()
+        with open(legacy_path, "rb") as src, open(tmp_path, "wb") as dst:
+            for chunk in iter(lambda: src.read(UPLOAD_CHUNK_BYTES), b""):
+                digest.update(chunk)
+                dst.write(chunk)
+
+        blob = MediaService.acquire_blob(
+            db, tmp_path, digest.hexdigest(), legacy_path.stat().st_size, legacy_path.suffix.lower()
+        )
+        asset.blob_id = blob.id
+        asset.file_url = MediaService.blob_url(blob)
+        asset.variants = blob.variants or {}
+        db.commit()
+        legacy_path.unlink(missing_ok=True)
+        adopted += 1
+    return adopted
+
+
+def migrate_blob(db, blob: MediaBlob, source, target, keep_source: bool) -> int:
+    """Copy one blob and its derivatives to the target backend; returns bytes copied"""
+    variant_prefix = blob.storage_key.rsplit(".", 1)[0] + "_"
+    keys = [blob.storage_key] + [key for key, _, _ in source.list(variant_prefix)]
+
+    copied = 0
+    TMP_DIR.mkdir(parents=True, exist_ok=True)
+    for key in keys:
+        staged = TMP_DIR / uuid.uuid4().hex
+        source.download(key, staged)
+        copied += staged.stat().st_size
+        target.save(key, staged)
+
+    url_map = {source.url(key): target.url(key) for key in keys}
+    variants = {name: url_map.get(url, url) for name, url in (blob.variants or {}).items()}
+    blob.storage_backend = target.name
+    blob.variants = variants
+    db.execute(
+        update(MediaAsset)
+        .where(MediaAsset.blob_id == blob.id)
+        .values(file_url=target.url(blob.storage_key), variants=variants)
+    )
+    db.commit()
+
+    if not keep_source:
+        for key in keys:
+            source.delete(key)
+    return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move media blobs between storage backends")
+    parser.add_argument("--from", dest="source", choices=sorted(STORAGE_BACKENDS), required=True)
+    parser.add_argument("--to", dest="target", choices=sorted(STORAGE_BACKENDS), required=True)
+    parser.add_argument("--adopt-legacy", action="store_true", help="Hash flat legacy uploads into blobs first")
+    parser.add_argument("--keep-source", action="store_true", help="Do not delete objects from the source backend")
+    parser.add_argument("--limit", type=int, default=None, help="Migrate at most this many blobs")
+    args = parser.parse_args()
+
+    if args.source == args.target:
+        parser.error("--from and --to must differ")
+
+    init_db()
+    source = get_storage(args.source)
+    target = get_storage(args.target)
+    db = SessionLocal()
+    try:
+        if args.adopt_legacy:
+            print(f"✓ Adopted {adopt_legacy_uploads(db)} legacy uploads")
+
+        query = db.query(MediaBlob).filter(MediaBlob.storage_backend == source.name).order_by(MediaBlob.id)
+        if args.limit:
+            query = query.limit(args.limit)
+        migrated, copied = 0, 0
+        for blob in query.all():
+            try:
+                copied += migrate_blob(db, blob, source, target, args.keep_source)
+                migrated += 1
+            except Exception as e:
+                db.rollback()
+                print(f"  ✗ Blob {blob.id} ({blob.storage_key}): {e}")
+        print(f"✓ Migrated {migrated} blobs from {source.name} to {target.name} "
+              f"({copied / (1024 * 1024):.1f} MB)")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+"""
+Bulk user provisioning for KCD Platform
+
+Creates users and their role workspaces from a CSV (with a header row)
+or JSONL file, hashing passwords across a process pool and inserting in
+batches. Accounts whose email already exists are reported and skipped,
+so an interrupted import can simply be run again.
+
+Run with: python provision_users.py agency.csv [--format csv|jsonl] [--batch-size N] [--workers N] [--ndjson]
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.db.database import SessionLocal, init_db
+from app.services import provisioning_service
+from app.services.provisioning_service import (
+    IMPORT_FORMATS,
+    PROVISIONING_BATCH_SIZE,
+    ProvisioningService,
+    detect_format,
+    read_rows,
+    shutdown_hash_pool,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create users in bulk from CSV or JSONL")
+    parser.add_argument("input", help="CSV or JSONL file, or - for stdin")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="Defaults to the file extension")
+    parser.add_argument("--batch-size", type=int, default=PROVISIONING_BATCH_SIZE, help="Rows per INSERT batch")
+    parser.add_argument("--workers", type=int, default=None, help="Password hashing processes")
+    parser.add_argument("--ndjson", action="store_true", help="Print every row result as NDJSON")
+    args = parser.parse_args()
+
+    fmt = args.format or detect_format(args.input, None)
+    if fmt is None:
+        parser.error("cannot tell the format from the file name, pass --format")
+    if args.workers:
+        provisioning_service.PROVISIONING_HASH_WORKERS = args.workers
+
+    init_db()
+    stream = sys.stdin.buffer if args.input == "-" else open(args.input, "rb")
+    db = SessionLocal()
+    try:
+        for result in ProvisioningService.import_rows(db, read_rows(stream, fmt), batch_size=args.batch_size):
+            if args.ndjson:
+                print(json.dumps(result))
+            elif "summary" in result:
+                summary = result["summary"]
+                print(f"✓ Created {summary['created']} users, {summary['exists']} already existed, "
+                      f"{summary['duplicate']} duplicates, {summary['error']} errors")
+            elif result["status"] == "error":
+                print(f"  ✗ Line {result['line']}: {result['detail']}")
+    finally:
+        db.close()
+        shutdown_hash_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -17,6 +17,7 @@ from sqlalchemy.orm import Session
 from app.db.database import engine, SessionLocal, init_db
 from app.models.user import Base, User, Workspace
 from app.services.user_service import UserService
+from app.services.workspace_templates import workspace_template
 
 # Test users configuration
 TEST_USERS = [
@@ -70,79 +71,6 @@ TEST_USERS = [
     },
 ]
 
-# Workspace templates by role
-WORKSPACE_TEMPLATES = {
-    "admin": {
-        "workspace_name": "System Atelier",
-        "workspace_description": "Gouvernance de la plateforme et supervision globale",
-        "theme": "aura",
-        "widgets": [
-            "platform_health",
-            "talent_registry",
-            "casting_pipeline",
-            "compliance_review",
-            "risk_alerts",
-            "partner_access",
-        ]
-    },
-    "manager": {
-        "workspace_name": "Platform Direction",
-        "workspace_description": "Pilotage des opérations et des équipes",
-        "theme": "aura",
-        "widgets": [
-            "portfolio_approvals",
-            "booking_flow",
-            "client_briefs",
-            "content_standards",
-            "team_overview",
-        ]
-    },
-    "moderator": {
-        "workspace_name": "Moderation Studio",
-        "workspace_description": "Qualité, conformité et sécurité des contenus",
-        "theme": "aura",
-        "widgets": [
-            "content_review",
-            "flagged_profiles",
-            "photo_rights",
-            "feedback_queue",
-        ]
-    },
-    "premium": {
-        "workspace_name": "Premium Model Studio",
-        "workspace_description": "Outils avancés pour portfolios et castings",
-        "theme": "aura",
-        "widgets": [
-            "portfolio_editor",
-            "casting_invites",
-            "brand_deals",
-            "analytics",
-            "availability_calendar",
-        ]
-    },
-    "free": {
-        "workspace_name": "Model Workspace",
-        "workspace_description": "Gérez votre book et votre présence",
-        "theme": "aura",
-        "widgets": [
-            "portfolio_overview",
-            "applications",
-            "messages",
-            "notifications",
-        ]
-    },
-    "demo": {
-        "workspace_name": "Demo Atelier",
-        "workspace_description": "Découverte guidée de l’écosystème",
-        "theme": "aura",
-        "widgets": [
-            "guided_tour",
-            "sample_portfolio",
-            "sample_castings",
-        ]
-    },
-}
-
 def clear_existing_data(db: Session):
     """Clear existing users and workspaces"""
     print("Clearing existing data...")
@@ -199,13 +127,7 @@ def create_seed_users(db: Session):
             db.flush()  # Flush to get the ID
             
             # Get workspace template
-            role_key = user_data["role"]
-            tier_key = user_data.get("subscription_tier", "free")
-            template_key = tier_key if role_key == "user" else role_key
-            workspace_config = WORKSPACE_TEMPLATES.get(
-                template_key,
-                WORKSPACE_TEMPLATES["free"],
-            ).copy()
+            workspace_config = workspace_template(user_data["role"], user_data.get("subscription_tier", "free"))
             
             # Create workspace for user
             workspace = Workspace(
@@ -24,6 +24,7 @@ from passlib.context import CryptContext
 
 # Import models
 from app.models.user import Base, User, Workspace
+from app.services.workspace_templates import workspace_template
 
 # Database configuration - Use SQLite by default for local development
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./kcd.db")
@@ -114,78 +115,6 @@ USERS_DATA = [
     },
 ]
 
-WORKSPACE_TEMPLATES = {
-    "admin": {
-        "name": "System Atelier",
-        "description": "Gouvernance de la plateforme et supervision globale",
-        "widgets": [
-            "platform_health",
-            "talent_registry",
-            "casting_pipeline",
-            "compliance_review",
-            "risk_alerts",
-            "partner_access",
-        ],
-        "theme": "aura",
-    },
-    "manager": {
-        "name": "Platform Direction",
-        "description": "Pilotage des opérations et des équipes",
-        "widgets": [
-            "portfolio_approvals",
-            "booking_flow",
-            "client_briefs",
-            "content_standards",
-            "team_overview",
-        ],
-        "theme": "aura",
-    },
-    "moderator": {
-        "name": "Moderation Studio",
-        "description": "Qualité, conformité et sécurité des contenus",
-        "widgets": [
-            "content_review",
-            "flagged_profiles",
-            "photo_rights",
-            "feedback_queue",
-        ],
-        "theme": "aura",
-    },
-    "premium": {
-        "name": "Premium Model Studio",
-        "description": "Outils avancés pour portfolios et castings",
-        "widgets": [
-            "portfolio_editor",
-            "casting_invites",
-            "brand_deals",
-            "analytics",
-            "availability_calendar",
-        ],
-        "theme": "aura",
-    },
-    "free": {
-        "name": "Model Workspace",
-        "description": "Gérez votre book et votre présence",
-        "widgets": [
-            "portfolio_overview",
-            "applications",
-            "messages",
-            "notifications",
-        ],
-        "theme": "aura",
-    },
-    "demo": {
-        "name": "Demo Atelier",
-        "description": "Découverte guidée de l’écosystème",
-        "widgets": [
-            "guided_tour",
-            "sample_portfolio",
-            "sample_castings",
-        ],
-        "theme": "aura",
-    },
-}
-
 def seed_database():
     """Seed the database with test users and workspaces"""
     print("Starting database seeding...")
@@ -259,35 +188,30 @@ def seed_database():
             
             # Create or update workspace for user
             role = user_data["role"]
-            tier = user_data.get("subscription_tier", "free")
-            template_key = tier if role == "user" else role
-            workspace_template = WORKSPACE_TEMPLATES.get(
-                template_key,
-                WORKSPACE_TEMPLATES.get("free"),
-            )
+            template = workspace_template(role, user_data.get("subscription_tier", "free"))
 
             workspace = db.query(Workspace).filter(Workspace.user_id == user.id).first()
             if workspace:
                 workspace.user_email = email
                 workspace.role = role
-                workspace.workspace_name = workspace_template["name"]
-                workspace.workspace_description = workspace_template["description"]
-                workspace.widgets = workspace_template["widgets"]
-                workspace.theme = workspace_template["theme"]
-                print(f"↻ Updated workspace: {workspace_template['name']} ({workspace_template['theme']} theme)")
+                workspace.workspace_name = template["workspace_name"]
+                workspace.workspace_description = template["workspace_description"]
+                workspace.widgets = template["widgets"]
+                workspace.theme = template["theme"]
+                print(f"↻ Updated workspace: {template['workspace_name']} ({template['theme']} theme)")
             else:
                 workspace = Workspace(
                     user_id=user.id,
                     user_email=email,
                     role=role,
-                    workspace_name=workspace_template["name"],
-                    workspace_description=workspace_template["description"],
-                    widgets=workspace_template["widgets"],
-                    theme=workspace_template["theme"],
+                    workspace_name=template["workspace_name"],
+                    workspace_description=template["workspace_description"],
+                    widgets=template["widgets"],
+                    theme=template["theme"],
                 )
                 db.add(workspace)
                 print(f"✓ Created user: {email} ({user.role})")
-                print(f"  └─ Workspace: {workspace_template['name']} ({workspace_template['theme']} theme)")
+                print(f"  └─ Workspace: {template['workspace_name']} ({template['theme']} theme)")
                 created_count += 1
         
         # Commit all changes
@@ -0,0 +1,71 @@
+"""
+Shared fixtures: the app runs against a scratch SQLite database and media root
+
+KCD_DATABASE_URL and MEDIA_ROOT survive the .env override in app modules,
+so they are set before anything under app/ is imported.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+SCRATCH_DIR = Path(tempfile.mkdtemp(prefix="kcd-tests-"))
+os.environ["KCD_DATABASE_URL"] = f"sqlite:///{(SCRATCH_DIR / 'kcd.db').as_posix()}"
+os.environ["MEDIA_ROOT"] = str(SCRATCH_DIR / "uploads")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("JOB_WORKERS", "0")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.core.idempotency import idempotency_store  # noqa: E402
+from app.core.response_cache import response_cache  # noqa: E402
+from app.db.database import SessionLocal, engine, init_db  # noqa: E402
+from app.models.user import Base  # noqa: E402
+
+init_db()
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        # Tables are emptied rather than dropped, so indexes created by init_db stay
+        with engine.begin() as conn:
+            for table in reversed(Base.metadata.sorted_tables):
+                conn.execute(table.delete())
+        # Ids are reused once tables are emptied
+        if response_cache.backend is not None:
+            response_cache.backend.clear()
+        idempotency_store._cache.clear()
+
+
+@pytest.fixture
+def client(db):
+    from fastapi.testclient import TestClient
+    from app.main import app
+    return TestClient(app)
+
+
+@pytest.fixture
+def make_user(db):
+    from app.schemas.user_schema import UserCreate
+    from app.services.user_service import UserService
+
+    def make(email: str = "user@example.com", password: str = "password", **fields):
+        fields.setdefault("full_name", "Test User")
+        return UserService.create_user(db, UserCreate(email=email, password=password, **fields))
+    return make
+
+
+@pytest.fixture
+def auth_headers():
+    from app.services.user_service import UserService
+
+    def headers(email: str) -> dict:
+        return {"Authorization": "Bearer " + UserService.create_access_token({"sub": email})}
+    return headers
@@ -0,0 +1,101 @@
+"""
+Dashboard bootstrap: include= selects the sections, each loaded concurrently on its own session
+"""
+import threading
+
+import pytest
+
+from app.api import bootstrap
+from app.models.user import ChatMessage, MediaAsset
+from app.services.user_service import UserService
+
+BOOTSTRAP = "/api/v1/bootstrap"
+
+
+@pytest.fixture
+def member(db, make_user, auth_headers):
+    user = make_user("member@example.com", subscription_tier="premium")
+    UserService.create_workspace_for_user(db, user.id, {"role": "user", "workspace_name": "Studio"})
+    db.add(ChatMessage(user_id=user.id, user_name="Member", channel="community", content="hello"))
+    db.add(MediaAsset(user_id=user.id, file_url="/uploads/a.png", file_type="image"))
+    db.commit()
+    return auth_headers("member@example.com")
+
+
+@pytest.fixture
+def loaded(monkeypatch):
+    """Names of the section loaders that ran"""
+    calls = []
+    for name in ("load_workspace", "load_channel", "load_unread", "load_portfolio"):
+        def record(*args, _name=name, _load=getattr(bootstrap, name)):
+            calls.append(_name if _name != "load_channel" else f"{_name}:{args[0]}")
+            return _load(*args)
+        monkeypatch.setattr(bootstrap, name, record)
+    return calls
+
+
+def test_every_section_by_default(client, member):
+    payload = client.get(BOOTSTRAP, headers=member).json()
+
+    assert sorted(payload) == ["chat", "portfolio", "unread", "user", "workspace"]
+    assert payload["user"]["email"] == "member@example.com"
+    assert payload["workspace"]["workspace_name"] == "Studio"
+    assert [m["content"] for m in payload["chat"]["community"]] == ["hello"]
+    assert payload["chat"]["moderator"] == []
+    assert {count["channel"] for count in payload["unread"]} == {"community", "moderator"}
+    assert [asset["file_url"] for asset in payload["portfolio"]["items"]] == ["/uploads/a.png"]
+    assert payload["portfolio"]["next_cursor"] is None
+
+
+def test_include_loads_only_the_selected_sections(client, member, loaded):
+    payload = client.get(f"{BOOTSTRAP}?include=user, workspace,,community", headers=member).json()
+
+    assert sorted(payload) == ["chat", "user", "workspace"]
+    assert sorted(payload["chat"]) == ["community"]
+    assert sorted(loaded) == ["load_channel:community", "load_workspace"]
+
+
+def test_include_without_loaders_reads_nothing_else(client, member, loaded):
+    payload = client.get(f"{BOOTSTRAP}?include=user", headers=member).json()
+
+    assert sorted(payload) == ["user"]
+    assert loaded == []
+
+
+def test_unknown_sections_are_rejected(client, member):
+    response = client.get(f"{BOOTSTRAP}?include=user,secrets,billing", headers=member)
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Unknown sections: billing, secrets"
+
+
+def test_staff_get_no_portfolio_section(client, make_user, auth_headers, loaded):
+    make_user("mod@example.com", role="moderator", subscription_tier="moderator")
+
+    payload = client.get(f"{BOOTSTRAP}?include=user,portfolio", headers=auth_headers("mod@example.com")).json()
+
+    assert sorted(payload) == ["user"]
+    assert loaded == []
+
+
+def test_sections_load_concurrently(client, member, monkeypatch):
+    # Each loader waits for the other: run one after the other they would time out
+    both_running = threading.Barrier(2, timeout=5)
+    for name in ("load_workspace", "load_unread"):
+        def wait_then_load(*args, _load=getattr(bootstrap, name)):
+            both_running.wait()
+            return _load(*args)
+        monkeypatch.setattr(bootstrap, name, wait_then_load)
+
+    response = client.get(f"{BOOTSTRAP}?include=workspace,unread", headers=member)
+
+    assert response.status_code == 200
+    assert sorted(response.json()) == ["unread", "workspace"]
+
+
+def test_missing_workspace_is_null(client, make_user, auth_headers):
+    make_user("bare@example.com")
+
+    payload = client.get(f"{BOOTSTRAP}?include=workspace", headers=auth_headers("bare@example.com")).json()
+
+    assert payload == {"workspace": None}
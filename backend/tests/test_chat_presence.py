@@ -0,0 +1,49 @@
+"""
+Chat presence: only the fixed chat channels get presence and typing state
+"""
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from app.api.chat import CHAT_CHANNELS, manager
+from app.services.user_service import UserService
+
+
+@pytest.fixture
+def token(make_user):
+    make_user("member@example.com")
+    return UserService.create_access_token({"sub": "member@example.com"})
+
+
+def test_websocket_rejects_unknown_channels(client, token):
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect(f"/api/v1/chat/ws?token={token}&channels=community,room-1") as websocket:
+            websocket.receive_json()
+
+    assert set(manager.presence.channels) <= set(CHAT_CHANNELS)
+
+
+def test_typing_frames_only_count_in_subscribed_channels(client, token):
+    with client.websocket_connect(f"/api/v1/chat/ws?token={token}&channels=community") as websocket:
+        for index in range(20):
+            websocket.send_json({"type": "typing", "channel": f"room-{index}"})
+        websocket.send_json({"type": "typing", "channel": "moderator"})
+        websocket.send_json({"type": "typing", "channel": "community"})
+        # A message round-trip makes sure the frames above were handled
+        websocket.send_json({"channel": "community", "content": "hello"})
+        assert websocket.receive_json()["content"] == "hello"
+
+        assert set(manager.presence.channels) == {"community"}
+
+
+def test_typing_endpoint_rejects_unknown_channel(client, token):
+    headers = {"Authorization": f"Bearer {token}"}
+
+    assert client.post("/api/v1/chat/typing", json={"channel": "room-1"}, headers=headers).status_code == 422
+    assert "room-1" not in manager.presence.channels
+    assert client.post("/api/v1/chat/typing", json={"channel": "moderator"}, headers=headers).status_code == 204
+
+
+def test_stream_rejects_unknown_channels(client, token):
+    response = client.get(f"/api/v1/chat/stream?token={token}&channels=community,room-1")
+
+    assert response.status_code == 422
@@ -0,0 +1,73 @@
+"""
+Unread counts: per-channel cap, surfaced in the response
+"""
+import pytest
+
+from app.api.chat import UNREAD_COUNT_CAP
+from app.models.user import ChatMessage
+
+
+@pytest.fixture
+def reader(make_user, auth_headers):
+    make_user("writer@example.com")
+    user = make_user("reader@example.com")
+    return user.id, auth_headers("reader@example.com")
+
+
+def post(db, user_id: int, channel: str, count: int) -> None:
+    db.add_all(
+        ChatMessage(user_id=user_id, user_name="n", channel=channel, content=f"m{index}")
+        for index in range(count)
+    )
+    db.commit()
+
+
+def unread(client, headers) -> dict:
+    response = client.get("/api/v1/chat/unread", headers=headers)
+    assert response.status_code == 200
+    return {item["channel"]: item for item in response.json()}
+
+
+def test_each_channel_is_capped_separately(client, db, reader):
+    user_id, headers = reader
+    post(db, user_id + 100, "community", UNREAD_COUNT_CAP + 30)
+    post(db, user_id + 100, "moderator", 3)
+
+    counts = unread(client, headers)
+
+    assert counts["community"]["unread"] == UNREAD_COUNT_CAP
+    assert counts["community"]["capped"] is True
+    assert counts["community"]["cap"] == UNREAD_COUNT_CAP
+    assert counts["community"]["label"] == f"{UNREAD_COUNT_CAP}+"
+    assert (counts["moderator"]["unread"], counts["moderator"]["capped"], counts["moderator"]["label"]) == (3, False, "3")
+
+
+def test_own_messages_are_not_unread(client, db, reader):
+    user_id, headers = reader
+    post(db, user_id, "community", UNREAD_COUNT_CAP + 5)
+    post(db, user_id + 100, "community", 2)
+
+    counts = unread(client, headers)
+
+    assert (counts["community"]["unread"], counts["community"]["capped"]) == (2, False)
+    assert counts["moderator"]["label"] == ""
+
+
+def test_exactly_cap_is_not_capped(client, db, reader):
+    user_id, headers = reader
+    post(db, user_id + 100, "community", UNREAD_COUNT_CAP)
+
+    counts = unread(client, headers)
+
+    assert (counts["community"]["unread"], counts["community"]["capped"]) == (UNREAD_COUNT_CAP, False)
+
+
+def test_mark_read_clears_and_rejects_unknown_channels(client, db, reader):
+    user_id, headers = reader
+    post(db, user_id + 100, "community", 4)
+
+    marked = client.post("/api/v1/chat/read", json={"channel": "community"}, headers=headers)
+
+    assert marked.status_code == 200
+    assert (marked.json()["unread"], marked.json()["label"]) == (0, "")
+    assert client.post("/api/v1/chat/read", json={"channel": "room-1"}, headers=headers).status_code == 422
@@ -0,0 +1,204 @@
+"""
+Response compression: negotiation, thresholds and the compressed-body cache;
+streamed, ranged and per-user responses; permessage-deflate on /chat/ws
+"""
+import asyncio
+import gzip
+import json
+
+import brotli
+import pytest
+import uvicorn
+import websockets
+from starlette.applications import Starlette
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from app.core.compression import (
+    COMPRESSION_MIN_BYTES, CompressionCache, CompressionMiddleware, compression_cache, negotiate_encoding,
+)
+from app.main import WEBSOCKET_SERVER_OPTIONS, app
+from app.models.user import ChatMessage
+
+HISTORY = "/api/v1/chat/messages?channel=community"
+PAYLOAD = json.dumps([{"content": f"message number {n}"} for n in range(100)]).encode()
+
+
+def json_response(request):
+    return Response(PAYLOAD, media_type="application/json",
+                    headers={"Cache-Control": request.query_params.get("cache_control", "no-cache")})
+
+
+def ranged_response(request):
+    return Response(PAYLOAD[:2048], status_code=206, media_type="application/json",
+                    headers={"Content-Range": f"bytes 0-2047/{len(PAYLOAD)}"})
+
+
+def event_stream(request):
+    async def events():
+        for n in range(3):
+            yield f"id: {n}\ndata: {PAYLOAD.decode()}\n\n"
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def single_event(request):
+    # A stream whose one event arrives in a single message must not be buffered into gzip either
+    return Response(b"data: " + PAYLOAD + b"\n\n", media_type="text/event-stream")
+
+
+@pytest.fixture
+def middleware_client():
+    """A bare app behind CompressionMiddleware, and its compressed-body cache"""
+    cache = CompressionCache()
+    routes = [Route("/json", json_response), Route("/range", ranged_response),
+              Route("/events", event_stream), Route("/event", single_event)]
+    bare = CompressionMiddleware(Starlette(routes=routes), cache=cache)
+    return TestClient(bare, headers={"Accept-Encoding": "gzip"}), cache
+
+
+@pytest.fixture
+def chatter(db, make_user, auth_headers):
+    user = make_user("chatter@example.com")
+    db.add_all(
+        ChatMessage(user_id=user.id, user_name="Chatter", channel="community", content=f"message number {n}")
+        for n in range(60)
+    )
+    db.commit()
+    return auth_headers("chatter@example.com")
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("gzip, deflate, br", "br"),
+    ("gzip", "gzip"),
+    ("br;q=0, gzip", "gzip"),
+    ("gzip;q=0.5, br;q=0.8", "br"),
+    ("*", "br"),
+    ("*, br;q=0", "gzip"),
+    ("identity", None),
+    ("gzip;q=0, br;q=0", None),
+    ("gzip;q=oops", None),
+    ("", None),
+])
+def test_negotiation(accept_encoding, expected):
+    assert negotiate_encoding(accept_encoding) == expected
+
+
+@pytest.mark.parametrize("encoding, decompress", [("gzip", gzip.decompress), ("br", brotli.decompress)])
+def test_large_json_is_compressed(client, chatter, encoding, decompress):
+    plain = client.get(HISTORY, headers={**chatter, "Accept-Encoding": "identity"})
+
+    with client.stream("GET", HISTORY, headers={**chatter, "Accept-Encoding": encoding}) as response:
+        raw = b"".join(response.iter_raw())
+
+    assert len(plain.content) > COMPRESSION_MIN_BYTES
+    assert response.headers["content-encoding"] == encoding
+    assert int(response.headers["content-length"]) == len(raw) < len(plain.content)
+    assert decompress(raw) == plain.content
+    assert "accept-encoding" in response.headers["vary"].lower()
+
+
+def test_small_responses_are_sent_as_is(client, make_user, auth_headers):
+    make_user("small@example.com")
+
+    response = client.get("/api/v1/users/me", headers={**auth_headers("small@example.com"), "Accept-Encoding": "gzip"})
+
+    assert len(response.content) < COMPRESSION_MIN_BYTES
+    assert "content-encoding" not in response.headers
+    assert "accept-encoding" in response.headers["vary"].lower()
+
+
+def test_repeat_payloads_are_compressed_once(client, chatter):
+    hits = compression_cache.hits
+
+    for _ in range(3):
+        assert client.get(HISTORY, headers={**chatter, "Accept-Encoding": "gzip"}).headers["content-encoding"] == "gzip"
+
+    assert compression_cache.hits - hits == 2
+
+
+def test_shared_responses_are_cached_compressed(middleware_client):
+    client, cache = middleware_client
+
+    for _ in range(2):
+        assert client.get("/json").headers["content-encoding"] == "gzip"
+
+    assert (cache.misses, cache.hits, len(cache._entries)) == (1, 1, 1)
+
+
+@pytest.mark.parametrize("cache_control", ["private, no-cache", "no-store"])
+def test_per_user_responses_are_compressed_but_not_cached(middleware_client, cache_control):
+    client, cache = middleware_client
+
+    for _ in range(2):
+        response = client.get(f"/json?cache_control={cache_control}")
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.content == PAYLOAD
+
+    assert (cache.misses, cache.hits, cache.size) == (2, 0, 0)
+
+
+@pytest.mark.parametrize("path", ["/events", "/event"])
+def test_event_streams_pass_through(middleware_client, path):
+    client, cache = middleware_client
+
+    response = client.get(path)
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert "content-encoding" not in response.headers
+    assert "vary" not in response.headers
+    assert response.text.startswith("id: 0\n" if path == "/events" else "data: ")
+    assert cache.misses == 0
+
+
+def test_ranges_pass_through(middleware_client):
+    client, cache = middleware_client
+
+    response = client.get("/range")
+
+    assert response.status_code == 206
+    assert "content-encoding" not in response.headers
+    assert response.content == PAYLOAD[:2048]
+    assert cache.misses == 0
+
+
+@pytest.mark.parametrize("accept_encoding", ["gzip", "identity"])
+def test_vary_is_set_whether_or_not_the_body_is_compressed(middleware_client, accept_encoding):
+    client, _ = middleware_client
+
+    response = client.get("/json", headers={"Accept-Encoding": accept_encoding})
+
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert ("content-encoding" in response.headers) == (accept_encoding == "gzip")
+
+
+def test_chat_socket_negotiates_permessage_deflate(db, make_user):
+    from app.services.user_service import UserService
+
+    make_user("socket@example.com")
+    token = UserService.create_access_token({"sub": "socket@example.com"})
+    config = uvicorn.Config(app, host="127.0.0.1", port=0, lifespan="off", log_level="warning",
+                            **WEBSOCKET_SERVER_OPTIONS)
+    server = uvicorn.Server(config)
+
+    async def round_trip():
+        serving = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+        port = server.servers[0].sockets[0].getsockname()[1]
+        try:
+            async with websockets.connect(f"ws://127.0.0.1:{port}/api/v1/chat/ws?token={token}") as socket:
+                extensions = socket.response_headers["Sec-WebSocket-Extensions"]
+                await socket.send(json.dumps({"content": "deflated hello", "channel": "community"}))
+                while True:
+                    event = json.loads(await asyncio.wait_for(socket.recv(), 5))
+                    if event.get("content") == "deflated hello":
+                        return extensions, event
+        finally:
+            server.should_exit = True
+            await serving
+
+    extensions, event = asyncio.run(asyncio.wait_for(round_trip(), 20))
+
+    assert extensions.startswith("permessage-deflate")
+    assert event["channel"] == "community"
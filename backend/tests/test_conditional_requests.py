@@ -0,0 +1,111 @@
+"""
+ETag revalidation of /users/me and /workspaces/me, and If-Match on workspace writes
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.conditional import REVALIDATE_CACHE_CONTROL, etag_version, version_etag
+from app.models.user import User, Workspace
+from app.services.user_service import UserService
+
+USER = "/api/v1/users/me"
+WORKSPACE = "/api/v1/workspaces/me"
+
+
+@pytest.fixture
+def headers(db, make_user, auth_headers):
+    user = make_user("etag@example.com")
+    UserService.create_workspace_for_user(db, user.id, {
+        "role": "user",
+        "workspace_name": "Studio",
+        "widgets": ["chat"],
+    })
+    return auth_headers("etag@example.com")
+
+
+def stored_workspace(db) -> Workspace:
+    db.expire_all()
+    return db.query(Workspace).one()
+
+
+@pytest.mark.parametrize("url", [USER, WORKSPACE])
+def test_reads_carry_an_etag_to_revalidate(client, headers, url):
+    response = client.get(url, headers=headers)
+
+    assert response.status_code == 200
+    assert response.headers["etag"].startswith('W/"')
+    assert response.headers["cache-control"] == REVALIDATE_CACHE_CONTROL
+
+
+@pytest.mark.parametrize("url", [USER, WORKSPACE])
+def test_matching_if_none_match_gets_304(client, headers, url):
+    etag = client.get(url, headers=headers).headers["etag"]
+
+    for if_none_match in (etag, etag.removeprefix("W/"), f'"other", {etag}', "*"):
+        response = client.get(url, headers={**headers, "If-None-Match": if_none_match})
+
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+
+
+def test_user_etag_changes_with_updated_at(client, db, headers):
+    etag = client.get(USER, headers=headers).headers["etag"]
+    db.query(User).update({"updated_at": datetime.utcnow() + timedelta(microseconds=1)})
+    db.commit()
+
+    response = client.get(USER, headers={**headers, "If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()["email"] == "etag@example.com"
+
+
+def test_workspace_etag_changes_with_each_write(client, db, headers):
+    etag = client.get(WORKSPACE, headers=headers).headers["etag"]
+    written = client.put(WORKSPACE, json={"theme": "noir"}, headers=headers)
+
+    response = client.get(WORKSPACE, headers={**headers, "If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert response.headers["etag"] == written.headers["etag"] != etag
+    assert response.json()["theme"] == "noir"
+
+
+def test_put_with_the_current_etag_applies(client, db, headers):
+    etag = client.get(WORKSPACE, headers=headers).headers["etag"]
+
+    response = client.put(WORKSPACE, json={"theme": "noir"}, headers={**headers, "If-Match": etag})
+
+    assert response.status_code == 200
+    assert response.json()["version"] == 2
+    assert etag_version(response.headers["etag"], "workspace") == 2
+    assert stored_workspace(db).theme == "noir"
+
+
+def test_put_with_a_stale_etag_gets_412_and_the_current_etag(client, db, headers):
+    stale = client.get(WORKSPACE, headers=headers).headers["etag"]
+    client.put(WORKSPACE, json={"theme": "noir"}, headers=headers)
+
+    response = client.put(WORKSPACE, json={"theme": "ivory"}, headers={**headers, "If-Match": stale})
+
+    assert response.status_code == 412
+    workspace = stored_workspace(db)
+    assert response.headers["etag"] == version_etag("workspace", workspace.id, 2)
+    assert (workspace.theme, workspace.version) == ("noir", 2)
+
+
+@pytest.mark.parametrize("if_match", ['"garbage"', 'W/"user-1-v1"'])
+def test_put_with_an_etag_of_something_else_gets_412(client, db, headers, if_match):
+    response = client.put(WORKSPACE, json={"theme": "ivory"}, headers={**headers, "If-Match": if_match})
+
+    assert response.status_code == 412
+    assert stored_workspace(db).version == 1
+
+
+def test_put_with_if_match_star_applies(client, db, headers):
+    response = client.put(WORKSPACE, json={"theme": "noir"}, headers={**headers, "If-Match": "*"})
+
+    assert response.status_code == 200
+    assert stored_workspace(db).version == 2
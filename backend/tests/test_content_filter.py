@@ -0,0 +1,158 @@
+"""
+Content filter: normalization, rule parsing and matching
+"""
+import pytest
+
+from app.services import content_filter_service
+from app.services.content_filter_service import ACTION_BLOCK, ACTION_FLAG, ContentFilter, normalize, parse_rules
+
+RULES = [
+    "# comment",
+    "",
+    "scam",
+    "block: casting fee",
+    "wire*",
+    "flag: escort",
+    "block: escort",
+    "block: ass",
+    "boobs",
+]
+
+
+@pytest.mark.parametrize("text,expected", [
+    ("Hello, World", "hello world"),
+    ("scam.", "scam"),
+    ("this is a scam!", "this is a scam"),
+    ("pay the casting fee!", "pay the casting fee"),
+    ("casting fee+", "casting fee"),
+    ("scam!!!", "scam"),
+    ("$cam", "scam"),
+    ("sc@m", "scam"),
+    ("n00b", "noob"),
+    ("s-c_a.m", "s c a m"),
+    ("Scàm", "scam"),
+    ("ÉSCROC", "escroc"),
+    ("soooo  cool", "soo cool"),
+    ("assss", "ass"),
+    ("a @ b", "a b"),
+    ("", ""),
+])
+def test_normalize(text, expected):
+    assert normalize(text) == expected
+
+
+def test_parse_rules():
+    rules = parse_rules(RULES)
+
+    assert rules == {
+        " scam ": ("scam", ACTION_FLAG),
+        " casting fee ": ("casting fee", ACTION_BLOCK),
+        " wire": ("wire*", ACTION_FLAG),
+        " escort ": ("escort", ACTION_BLOCK),
+        " ass ": ("ass", ACTION_BLOCK),
+        " boobs ": ("boobs", ACTION_FLAG),
+    }
+
+
+@pytest.fixture(params=["python", "pyahocorasick"])
+def content_filter(request, monkeypatch, tmp_path):
+    if request.param == "python":
+        monkeypatch.setattr(content_filter_service, "ahocorasick", None)
+    elif content_filter_service.ahocorasick is None:
+        pytest.skip("pyahocorasick is not installed")
+    content_filter = ContentFilter(tmp_path / "missing_rules.txt")
+    content_filter.load(RULES)
+    return content_filter
+
+
+@pytest.mark.parametrize("text", [
+    "this is a scam",
+    "this is a scam!",
+    "SCAM?",
+    "scam?!",
+    "$cam",
+    "sc@m",
+    "5c4m",
+    "Scàm",
+    "scaaaam",
+    "scamm",
+    "sccaam",
+])
+def test_flag_matches_through_evasions(content_filter, text):
+    verdict = content_filter.check(text)
+
+    assert verdict is not None and verdict.matches == ["scam"] and not verdict.blocked
+
+
+@pytest.mark.parametrize("text", [
+    "pay the casting fee",
+    "pay the casting fee!",
+    "casting fee+",
+    "CASTING-FEE",
+    "c@sting f33",
+])
+def test_block_rule_blocks(content_filter, text):
+    verdict = content_filter.check(text)
+
+    assert verdict is not None and verdict.blocked and verdict.matches == ["casting fee"]
+
+
+@pytest.mark.parametrize("text,rule", [("assss", "ass"), ("@sssss!", "ass"), ("boooobs", "boobs"), ("B00BS", "boobs")])
+def test_rules_with_doubled_letters_match_stretched_words(content_filter, text, rule):
+    verdict = content_filter.check(text)
+
+    assert verdict is not None and verdict.matches == [rule]
+
+
+@pytest.mark.parametrize("text", [
+    "see you as soon as possible",
+    "I like bobs burgers",
+    "Bob's burgers",
+    "good food, less stress, pass the coffee",
+    "see the fee",
+    "a bookkeeper's committee",
+])
+def test_common_words_with_doubled_letters_are_not_rewritten_into_rules(content_filter, text):
+    assert content_filter.check(text) is None
+
+
+def test_block_wins_over_flag_for_same_words(content_filter):
+    verdict = content_filter.check("escort services")
+
+    assert verdict.blocked and verdict.matches == ["escort"]
+
+
+def test_block_wins_when_flag_and_block_rules_both_match(content_filter):
+    verdict = content_filter.check("scam: casting fee first")
+
+    assert verdict.blocked and verdict.matches == ["casting fee", "scam"]
+
+
+@pytest.mark.parametrize("text,matched", [
+    ("wire", True),
+    ("wire the money", True),
+    ("wiretransfer now", True),
+    ("rewire", False),
+])
+def test_wildcard_matches_word_prefix(content_filter, text, matched):
+    verdict = content_filter.check(text)
+
+    assert (verdict is not None and verdict.matches == ["wire*"]) is matched
+
+
+@pytest.mark.parametrize("text", ["scampi for dinner", "escalate", "fee", "casting call", "", None])
+def test_whole_words_only(content_filter, text):
+    assert content_filter.check(text) is None
+
+
+def test_no_rules_file_means_no_filtering(tmp_path):
+    assert ContentFilter(tmp_path / "missing_rules.txt").check("scam") is None
+
+
+def test_rules_file_is_loaded(tmp_path):
+    rules = tmp_path / "rules.txt"
+    rules.write_text("block: scam\n", encoding="utf-8")
+
+    verdict = ContentFilter(rules).check("a scam!")
+
+    assert verdict.blocked and verdict.matches == ["scam"]
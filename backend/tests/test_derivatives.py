@@ -0,0 +1,135 @@
+"""
+Derivatives: WebP widths without upscaling, retries up to DERIVATIVE_MAX_ATTEMPTS,
+skipped renders without Pillow or ffmpeg, and pending blobs requeued at startup
+"""
+import hashlib
+import io
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import app.services.jobs  # noqa: F401  registers render_derivatives
+from app.main import app
+from app.models.user import Job, MediaAsset, MediaBlob
+from app.services import derivative_service
+from app.services.derivative_service import DERIVATIVE_MAX_ATTEMPTS, IMAGE_VARIANT_WIDTHS, render_blob
+from app.services.job_queue import claim, run_job
+from app.services.media_service import TMP_DIR, MediaService
+from app.services.storage import get_storage
+
+
+def store_blob(db, content: bytes, file_ext: str) -> MediaBlob:
+    TMP_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = TMP_DIR / "derivative-test"
+    tmp_path.write_bytes(content)
+    return MediaService.acquire_blob(db, tmp_path, hashlib.sha256(content).hexdigest(), len(content), file_ext)
+
+
+def png(width: int, height: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), "teal").save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def add_asset(db, user, blob: MediaBlob, file_type: str = "image") -> MediaAsset:
+    asset = MediaAsset(user_id=user.id, blob_id=blob.id, file_url=get_storage().url(blob.storage_key),
+                       file_type=file_type)
+    db.add(asset)
+    db.commit()
+    return asset
+
+
+def reloaded(db, instance):
+    db.expire_all()
+    return db.get(type(instance), instance.id)
+
+
+def variant_size(url: str) -> tuple:
+    with Image.open(get_storage().local_path(url.removeprefix("/uploads/"))) as image:
+        return image.format, image.size
+
+
+def test_large_image_gets_every_width(db, make_user):
+    blob = store_blob(db, png(2000, 1000), ".png")
+    asset = add_asset(db, make_user(), blob)
+
+    render_blob(blob.id)
+
+    blob = reloaded(db, blob)
+    assert blob.variants_status == "ready"
+    assert sorted(blob.variants) == sorted(f"w{width}" for width in IMAGE_VARIANT_WIDTHS)
+    assert variant_size(blob.variants["w640"]) == ("WEBP", (640, 320))
+    assert reloaded(db, asset).variants == blob.variants
+
+
+def test_small_image_is_never_upscaled(db):
+    blob = store_blob(db, png(500, 250), ".png")
+
+    render_blob(blob.id)
+
+    variants = reloaded(db, blob).variants
+    # 640 and 1280 collapse into one variant at the original width
+    assert sorted(variants) == ["w320", "w500"]
+    assert variant_size(variants["w320"]) == ("WEBP", (320, 160))
+    assert variant_size(variants["w500"]) == ("WEBP", (500, 250))
+
+
+def test_failing_render_is_retried_then_marked_failed(db, monkeypatch):
+    def broken(blob):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(derivative_service, "generate_derivatives", broken)
+    blob = store_blob(db, png(10, 10), ".png")
+    derivative_service.queue_derivatives(blob.id)
+
+    for attempt in range(1, DERIVATIVE_MAX_ATTEMPTS):
+        run_job(claim("w1"), "w1")
+        assert (reloaded(db, blob).variants_status, reloaded(db, blob).variants_attempts) == ("pending", attempt)
+        job = db.query(Job).one()
+        assert (job.status, job.last_error) == ("queued", "OSError: disk full")
+        db.query(Job).update({"run_at": datetime.utcnow() - timedelta(seconds=1)})
+        db.commit()
+
+    run_job(claim("w1"), "w1")
+
+    blob = reloaded(db, blob)
+    assert (blob.variants_status, blob.variants_attempts) == ("failed", DERIVATIVE_MAX_ATTEMPTS)
+    # The handler gives up without raising, so the job is done rather than failed
+    assert db.query(Job).count() == 0
+
+
+def test_image_without_pillow_is_skipped(db, make_user, monkeypatch):
+    monkeypatch.setattr(derivative_service, "Image", None)
+    blob = store_blob(db, png(10, 10), ".png")
+    asset = add_asset(db, make_user(), blob)
+
+    render_blob(blob.id)
+
+    assert (reloaded(db, blob).variants_status, reloaded(db, blob).variants) == ("skipped", {})
+    assert reloaded(db, asset).variants == {}
+
+
+def test_video_without_ffmpeg_is_skipped(db, monkeypatch):
+    monkeypatch.setattr(derivative_service.shutil, "which", lambda name: None)
+    blob = store_blob(db, b"\x00\x00\x00\x18ftypmp42" + b"\x00" * 64, ".mp4")
+
+    render_blob(blob.id)
+
+    assert reloaded(db, blob).variants_status == "skipped"
+    assert reloaded(db, blob).variants_attempts == 0
+
+
+def test_startup_requeues_only_pending_blobs(db):
+    pending = store_blob(db, png(10, 10), ".png")
+    done = store_blob(db, png(20, 20), ".png")
+    done.variants_status = "ready"
+    db.commit()
+
+    with TestClient(app):
+        pass
+
+    assert [(job.name, job.args, job.key) for job in db.query(Job).filter(Job.name == "render_derivatives")] == [
+        ("render_derivatives", [pending.id], f"derivatives:{pending.id}"),
+    ]
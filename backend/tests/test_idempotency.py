@@ -0,0 +1,181 @@
+"""
+Idempotency-Key: stored responses replayed to retries, reused keys, racing duplicates
+"""
+import asyncio
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import chat
+from app.core.idempotency import (
+    CLAIMED, IDEMPOTENCY_HEADER, IN_PROGRESS, MAX_KEY_LENGTH, REPLAYED_HEADER, idempotency_store,
+)
+from app.main import app
+from app.models.user import ChatMessage, IdempotencyRecord
+
+MESSAGES = "/api/v1/chat/messages"
+
+
+@pytest.fixture
+def poster(make_user, auth_headers):
+    make_user("poster@example.com")
+    return auth_headers("poster@example.com")
+
+
+@pytest.fixture
+def store_calls(monkeypatch):
+    """Counts chat.store_message calls, each held long enough for a duplicate to arrive"""
+    calls = []
+    store_message = chat.store_message
+
+    def slow_store_message(*args, **kwargs):
+        calls.append(args)
+        time.sleep(0.2)
+        return store_message(*args, **kwargs)
+
+    monkeypatch.setattr(chat, "store_message", slow_store_message)
+    return calls
+
+
+def keyed(headers: dict, key: str) -> dict:
+    return {**headers, IDEMPOTENCY_HEADER: key}
+
+
+def scoped(subject: str, method: str, path: str, key: str) -> str:
+    return hashlib.sha256(f"{subject}\n{method}\n{path}\n{key}".encode()).hexdigest()
+
+
+def test_retry_replays_the_stored_response(client, db, poster):
+    first = client.post(MESSAGES, json={"content": "hello"}, headers=keyed(poster, "msg-1"))
+    retry = client.post(MESSAGES, json={"content": "hello"}, headers=keyed(poster, "msg-1"))
+
+    assert first.status_code == retry.status_code == 200
+    assert REPLAYED_HEADER not in first.headers
+    assert retry.headers[REPLAYED_HEADER] == "true"
+    assert retry.content == first.content
+    assert db.query(ChatMessage).count() == 1
+
+
+def test_replay_survives_a_cold_cache(client, db, poster):
+    first = client.post(MESSAGES, json={"content": "hello"}, headers=keyed(poster, "msg-1"))
+    idempotency_store._cache.clear()
+
+    retry = client.post(MESSAGES, json={"content": "hello"}, headers=keyed(poster, "msg-1"))
+
+    assert retry.headers[REPLAYED_HEADER] == "true"
+    assert retry.content == first.content
+    assert db.query(ChatMessage).count() == 1
+
+
+def test_key_reused_with_a_different_body_is_rejected(client, db, poster):
+    client.post(MESSAGES, json={"content": "hello"}, headers=keyed(poster, "msg-1"))
+
+    reused = client.post(MESSAGES, json={"content": "goodbye"}, headers=keyed(poster, "msg-1"))
+
+    assert reused.status_code == 422
+    assert REPLAYED_HEADER not in reused.headers
+    assert [m.content for m in db.query(ChatMessage)] == ["hello"]
+
+
+def test_keys_are_scoped_to_the_caller(client, db, make_user, auth_headers, poster):
+    make_user("other@example.com")
+    client.post(MESSAGES, json={"content": "hello"}, headers=keyed(poster, "msg-1"))
+
+    other = client.post(MESSAGES, json={"content": "hello"}, headers=keyed(auth_headers("other@example.com"), "msg-1"))
+
+    assert other.status_code == 200
+    assert REPLAYED_HEADER not in other.headers
+    assert db.query(ChatMessage).count() == 2
+
+
+def test_requests_without_a_key_always_run(client, db, poster):
+    for _ in range(2):
+        assert client.post(MESSAGES, json={"content": "hello"}, headers=poster).status_code == 200
+
+    assert db.query(ChatMessage).count() == 2
+
+
+def test_overlong_key_is_rejected(client, db, poster):
+    response = client.post(MESSAGES, json={"content": "hello"}, headers=keyed(poster, "k" * (MAX_KEY_LENGTH + 1)))
+
+    assert response.status_code == 400
+    assert db.query(ChatMessage).count() == 0
+
+
+def test_key_pending_in_another_worker_gets_409(client, db, poster):
+    key = scoped("poster@example.com", "POST", MESSAGES, "msg-1")
+    assert idempotency_store.claim(key) == CLAIMED
+
+    response = client.post(MESSAGES, json={"content": "hello"}, headers=keyed(poster, "msg-1"))
+
+    assert response.status_code == 409
+    assert response.headers["Retry-After"] == "1"
+    assert db.query(ChatMessage).count() == 0
+
+
+def test_abandoned_key_is_taken_over(client, db, poster):
+    key = scoped("poster@example.com", "POST", MESSAGES, "msg-1")
+    idempotency_store.claim(key)
+    db.query(IdempotencyRecord).filter(IdempotencyRecord.key == key).update(
+        {"locked_until": datetime.utcnow() - timedelta(seconds=1)}
+    )
+    db.commit()
+
+    response = client.post(MESSAGES, json={"content": "hello"}, headers=keyed(poster, "msg-1"))
+
+    assert response.status_code == 200
+    assert db.query(ChatMessage).count() == 1
+
+
+def test_racing_duplicates_in_one_process_run_the_handler_once(db, poster, store_calls):
+    async def race():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await asyncio.gather(*(
+                http.post(MESSAGES, json={"content": "once"}, headers=keyed(poster, "race-1"))
+                for _ in range(3)
+            ))
+
+    responses = asyncio.run(race())
+
+    assert len(store_calls) == 1
+    assert [r.status_code for r in responses] == [200, 200, 200]
+    assert sorted(r.headers.get(REPLAYED_HEADER, "") for r in responses) == ["", "true", "true"]
+    assert len({r.content for r in responses}) == 1
+    assert db.query(ChatMessage).count() == 1
+
+
+def test_racing_claims_across_workers_have_one_winner(db):
+    key = scoped("poster@example.com", "POST", MESSAGES, "race-1")
+    start = threading.Barrier(4)
+
+    def claim():
+        start.wait()
+        return idempotency_store.claim(key)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        outcomes = list(pool.map(lambda _: claim(), range(4)))
+
+    assert sorted(outcomes) == sorted([CLAIMED] + [IN_PROGRESS] * 3)
+
+
+def test_error_responses_are_not_stored(client, db, poster, monkeypatch):
+    def failing_store_message(*args, **kwargs):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(chat, "store_message", failing_store_message)
+    failing = TestClient(app, raise_server_exceptions=False)
+    assert failing.post(MESSAGES, json={"content": "hello"}, headers=keyed(poster, "msg-1")).status_code == 500
+    monkeypatch.undo()
+
+    retry = client.post(MESSAGES, json={"content": "hello"}, headers=keyed(poster, "msg-1"))
+
+    assert retry.status_code == 200
+    assert REPLAYED_HEADER not in retry.headers
+    assert db.query(ChatMessage).count() == 1
@@ -0,0 +1,258 @@
+"""
+Job queue: claiming, retries with backoff, keyed dedup, leases and wakeups
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.user import Job, MediaAsset, MediaBlob
+from app.services import job_queue
+from app.services.job_queue import (
+    JOB_RETRY_SECONDS, JOBS, JobSpec, JobWorkerPool, claim, enqueue, renew_leases, run_job,
+)
+
+
+@pytest.fixture
+def register(monkeypatch):
+    """Registers a handler for the test only; returns the arguments of each call"""
+    def add(name: str, func=None, every=None, max_attempts: int = 3) -> list:
+        calls = []
+
+        def handler(*args):
+            calls.append(args)
+            if func is not None:
+                func(*args)
+
+        monkeypatch.setitem(JOBS, name, JobSpec(name, handler, every, max_attempts))
+        return calls
+    return add
+
+
+@pytest.fixture
+def notified(monkeypatch):
+    wakeups = []
+    monkeypatch.setattr(job_queue.job_pool, "notify", lambda: wakeups.append(1))
+    return wakeups
+
+
+def fail(*args):
+    raise ValueError("boom")
+
+
+def make_due(db) -> None:
+    db.query(Job).update({"run_at": datetime.utcnow() - timedelta(seconds=1)})
+    db.commit()
+
+
+def only_job(db) -> Job:
+    db.expire_all()
+    return db.query(Job).one()
+
+
+def test_claim_leases_the_earliest_due_job(db, register):
+    register("noop")
+    enqueue("noop", "later", delay=60)
+    enqueue("noop", "second", run_at=datetime.utcnow() - timedelta(seconds=1))
+    enqueue("noop", "first", run_at=datetime.utcnow() - timedelta(seconds=2))
+
+    job_id, name, args, attempts, _ = claim("w1")
+
+    assert (name, args, attempts) == ("noop", ["first"], 1)
+    claimed = db.get(Job, job_id)
+    assert (claimed.status, claimed.locked_by) == ("running", "w1")
+    assert claimed.locked_until > datetime.utcnow()
+    assert claim("w2")[2] == ["second"]
+    assert claim("w3") is None
+
+
+def test_concurrent_claims_take_each_job_once(db, register):
+    register("noop")
+    for n in range(3):
+        enqueue("noop", n)
+    start = threading.Barrier(6)
+
+    def worker(n):
+        start.wait()
+        return claim(f"w{n}")
+
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        claimed = [c for c in pool.map(worker, range(6)) if c is not None]
+
+    assert sorted(c[2][0] for c in claimed) == [0, 1, 2]
+
+
+def test_successful_job_is_deleted(db, register):
+    calls = register("noop")
+    enqueue("noop", 1, "a")
+
+    run_job(claim("w1"), "w1")
+
+    assert calls == [(1, "a")]
+    assert db.query(Job).count() == 0
+
+
+def test_failures_back_off_then_fail_and_release_the_key(db, register):
+    register("flaky", fail, max_attempts=3)
+    enqueue("flaky", key="flaky:1")
+
+    delays = []
+    for _ in range(2):
+        before = datetime.utcnow()
+        run_job(claim("w1"), "w1")
+        queued = only_job(db)
+        assert (queued.status, queued.key, queued.locked_by) == ("queued", "flaky:1", None)
+        assert queued.last_error == "ValueError: boom"
+        delays.append((queued.run_at - before).total_seconds())
+        make_due(db)
+    assert delays[0] == pytest.approx(JOB_RETRY_SECONDS, abs=1)
+    assert delays[1] == pytest.approx(JOB_RETRY_SECONDS * 2, abs=1)
+
+    run_job(claim("w1"), "w1")
+
+    failed = only_job(db)
+    assert (failed.status, failed.attempts, failed.key) == ("failed", 3, None)
+    assert claim("w1") is None
+    enqueue("flaky", key="flaky:1")
+    assert db.query(Job).filter(Job.status == "queued", Job.key == "flaky:1").count() == 1
+
+
+def test_keyed_enqueue_is_deduplicated_while_queued_or_running(db, register):
+    register("noop")
+    enqueue("noop", 1, key="noop:1")
+    enqueue("noop", 1, key="noop:1")
+    assert db.query(Job).count() == 1
+
+    claimed = claim("w1")
+    enqueue("noop", 1, key="noop:1")
+    assert db.query(Job).count() == 1
+
+    run_job(claimed, "w1")
+    enqueue("noop", 1, key="noop:1")
+    assert db.query(Job).count() == 1
+
+
+def test_periodic_job_is_rescheduled_whatever_the_outcome(db, register):
+    register("tick", fail, every=60)
+    enqueue("tick", key="periodic:tick")
+
+    run_job(claim("w1"), "w1")
+
+    rescheduled = only_job(db)
+    assert (rescheduled.status, rescheduled.attempts, rescheduled.key) == ("queued", 0, "periodic:tick")
+    assert rescheduled.run_at > datetime.utcnow() + timedelta(seconds=55)
+
+
+def test_expired_lease_passes_the_job_to_another_worker(db, register):
+    calls = register("noop")
+    enqueue("noop")
+    stale = claim("w1")
+    db.query(Job).update({"locked_until": datetime.utcnow() - timedelta(seconds=1)})
+    db.commit()
+
+    taken = claim("w2")
+    assert taken[0] == stale[0] and taken[3] == 2
+
+    # The first worker finishing late leaves the job to its new owner
+    run_job(stale, "w1")
+    assert only_job(db).locked_by == "w2"
+    run_job(taken, "w2")
+    assert db.query(Job).count() == 0
+    assert len(calls) == 2
+
+
+def test_renew_leases_extends_only_leases_still_held(db, register):
+    register("noop")
+    enqueue("noop")
+    enqueue("noop")
+    mine, lost = claim("w1"), claim("w1")
+    soon = datetime.utcnow() + timedelta(seconds=5)
+    db.query(Job).update({"locked_until": soon})
+    db.query(Job).filter(Job.id == lost[0]).update({"locked_by": "w2"})
+    db.commit()
+
+    assert renew_leases({mine[0]: "w1", lost[0]: "w1"}) == 1
+
+    db.expire_all()
+    assert db.get(Job, mine[0]).locked_until > soon + timedelta(seconds=60)
+    assert db.get(Job, lost[0]).locked_until == soon
+
+
+def test_pool_renews_the_lease_of_a_long_job(db, register, monkeypatch):
+    monkeypatch.setattr(job_queue, "schedule_periodic", lambda: None)
+    leases = []
+
+    def slow(*args):
+        with job_queue.SessionLocal() as own_db:
+            for _ in range(2):
+                leases.append(own_db.query(Job.locked_until).filter(Job.name == "slow").scalar())
+                own_db.rollback()
+                time.sleep(0.3)
+
+    register("slow", slow)
+    enqueue("slow", 1)
+
+    async def run():
+        pool = JobWorkerPool(workers=1, poll_seconds=0.05, heartbeat_seconds=0.1)
+        pool.start()
+        while db.query(Job).count():
+            db.rollback()
+            await asyncio.sleep(0.05)
+        await pool.stop()
+
+    asyncio.run(asyncio.wait_for(run(), 5))
+
+    assert len(leases) == 2
+    assert leases[1] > leases[0]
+
+
+def test_enqueue_in_a_transaction_wakes_workers_after_commit(db, register, notified):
+    register("noop")
+    enqueue("noop", db=db)
+    assert notified == []
+
+    db.commit()
+    db.commit()
+
+    assert notified == [1]
+    enqueue("noop")
+    assert notified == [1, 1]
+
+
+def test_uploads_and_restarts_queue_one_render_per_blob(db, make_user):
+    from app.api.portfolio import create_asset
+    from app.services.derivative_service import requeue_pending
+
+    user = make_user()
+    blob = MediaBlob(sha256="a" * 64, size=1, file_ext=".png", storage_key="a.png", storage_backend="local", ref_count=2)
+    db.add(blob)
+    db.commit()
+
+    create_asset(db, user, blob, "image")
+    create_asset(db, user, blob, "image")
+    requeue_pending()
+
+    assert [job.key for job in db.query(Job)] == [f"derivatives:{blob.id}"]
+
+
+def test_asset_created_as_a_render_finishes_gets_its_variants(db, make_user):
+    from app.api.portfolio import create_asset
+
+    user = make_user()
+    blob = MediaBlob(sha256="b" * 64, size=1, file_ext=".png", storage_key="b.png", storage_backend="local", ref_count=1)
+    db.add(blob)
+    db.commit()
+    assert blob.variants_status == "pending"
+    # The render commits between the upload reading the blob and creating the asset
+    with job_queue.SessionLocal() as render_db:
+        render_db.query(MediaBlob).update({"variants_status": "ready", "variants": {"w320": "/w320.webp"}})
+        render_db.commit()
+
+    asset = create_asset(db, user, blob, "image")
+
+    assert asset.variants == {"w320": "/w320.webp"}
+    assert db.query(Job).count() == 0
+    assert db.query(MediaAsset).count() == 1
@@ -0,0 +1,59 @@
+"""
+Login: the last_login stamp is left to the job queue
+"""
+import asyncio
+
+import pytest
+
+from app.api import auth
+from app.models.user import Job, User
+from app.services import jobs  # noqa: F401  registers touch_last_login
+from app.services.job_queue import claim, run_job
+
+
+@pytest.fixture
+def member(make_user):
+    return make_user("member@example.com", "secret-password")
+
+
+def login(client):
+    return client.post("/api/v1/auth/login", json={"email": "member@example.com", "password": "secret-password"})
+
+
+def test_login_does_not_write_last_login_inline(client, db, member):
+    response = login(client)
+
+    assert response.status_code == 200
+    db.expire_all()
+    assert db.get(User, member.id).last_login is None
+    queued = db.query(Job).one()
+    assert (queued.name, queued.args[0], queued.status) == ("touch_last_login", member.id, "queued")
+
+    run_job(claim("w1"), "w1")
+
+    db.expire_all()
+    assert db.get(User, member.id).last_login is not None
+    assert db.query(Job).count() == 0
+
+
+def test_login_queues_the_stamp_off_the_event_loop(client, db, member, monkeypatch):
+    on_loop = []
+
+    def recording_enqueue(*args, **kwargs):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(True)
+        except RuntimeError:
+            on_loop.append(False)
+
+    monkeypatch.setattr(auth, "enqueue", recording_enqueue)
+
+    assert login(client).status_code == 200
+    assert on_loop == [False]
+
+
+def test_failed_login_queues_nothing(client, db, member):
+    response = client.post("/api/v1/auth/login", json={"email": "member@example.com", "password": "wrong"})
+
+    assert response.status_code == 401
+    assert db.query(Job).count() == 0
@@ -0,0 +1,189 @@
+"""
+/uploads serving: byte ranges, multipart/byteranges framing, If-Range, and
+the FileResponse handlers MediaFileResponse overrides, zero-copy included
+"""
+import asyncio
+import hashlib
+import os
+import re
+
+import pytest
+
+from app.core.media_files import MediaFileResponse, MediaFiles, multipart_framing
+from app.services.storage import UPLOAD_DIR
+
+CONTENT = bytes(range(256)) * 40
+
+
+@pytest.fixture
+def media_url():
+    sha256 = hashlib.sha256(CONTENT).hexdigest()
+    path = UPLOAD_DIR / sha256[:2] / sha256[2:4] / f"{sha256}.png"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(CONTENT)
+    yield f"/uploads/{sha256[:2]}/{sha256[2:4]}/{sha256}.png"
+    os.unlink(path)
+
+
+def parse_byteranges(body: bytes, boundary: str) -> list:
+    """(Content-Range, data) of each part, checking the framing byte for byte"""
+    delimiter = f"--{boundary}".encode()
+    assert body.startswith(delimiter + b"\r\n")
+    assert body.endswith(b"\r\n" + delimiter + b"--\r\n")
+    parts = []
+    for raw in body[: -len(delimiter) - 6].split(b"\r\n" + delimiter + b"\r\n"):
+        raw = raw.removeprefix(delimiter + b"\r\n")
+        head, data = raw.split(b"\r\n\r\n", 1)
+        fields = dict(line.split(": ", 1) for line in head.decode("latin-1").split("\r\n"))
+        parts.append((fields["Content-Range"], data))
+    return parts
+
+
+def test_multiple_ranges_length_matches_body(client, media_url):
+    response = client.get(media_url, headers={"Range": "bytes=0-9,100-199,10000-"})
+
+    assert response.status_code == 206
+    assert int(response.headers["content-length"]) == len(response.content)
+    boundary = re.fullmatch(r"multipart/byteranges; boundary=(\w+)", response.headers["content-type"]).group(1)
+    assert parse_byteranges(response.content, boundary) == [
+        (f"bytes 0-9/{len(CONTENT)}", CONTENT[0:10]),
+        (f"bytes 100-199/{len(CONTENT)}", CONTENT[100:200]),
+        (f"bytes 10000-{len(CONTENT) - 1}/{len(CONTENT)}", CONTENT[10000:]),
+    ]
+
+
+def test_multiple_ranges_head_announces_same_length(client, media_url):
+    ranges = {"Range": "bytes=0-9,100-199"}
+    body = client.get(media_url, headers=ranges)
+    head = client.head(media_url, headers=ranges)
+
+    assert head.status_code == 206
+    assert head.content == b""
+    assert head.headers["content-length"] == body.headers["content-length"]
+
+
+def test_single_range(client, media_url):
+    response = client.get(media_url, headers={"Range": "bytes=5-14"})
+
+    assert response.status_code == 206
+    assert response.content == CONTENT[5:15]
+    assert response.headers["content-range"] == f"bytes 5-14/{len(CONTENT)}"
+
+
+@pytest.mark.parametrize("ranges", [[(0, 1)], [(0, 10), (20, 30), (1000, 10240)]])
+def test_framing_length(ranges):
+    part_headers, closing = multipart_framing(ranges, "b" * 26, 10240, "image/png")
+    body = b"".join(header + b"x" * (end - start) for header, (start, end) in zip(part_headers, ranges)) + closing
+
+    assert len(parse_byteranges(body, "b" * 26)) == len(ranges)
+
+
+def serve(url: str, headers: dict = None, method: str = "GET", zerocopy: bool = False) -> list:
+    """ASGI messages MediaFiles sends for a request, from a server that may offer zero-copy sends"""
+    path = url.removeprefix("/uploads")
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+        "server": ("test", 80),
+        "extensions": {"http.response.zerocopy": {}} if zerocopy else {},
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.zerocopy":
+            # What the server would sendfile(), read while the file is still open
+            message["file"].seek(message["offset"])
+            message = {**message, "data": message["file"].read(message["count"])}
+        messages.append(message)
+
+    asyncio.run(MediaFiles(directory=str(UPLOAD_DIR))(scope, receive, send))
+    return messages
+
+
+def response_headers(start: dict) -> dict:
+    return {k.decode(): v.decode() for k, v in start["headers"]}
+
+
+def test_zerocopy_full_file(media_url):
+    start, body = serve(media_url, zerocopy=True)
+
+    assert start["status"] == 200
+    assert response_headers(start)["content-length"] == str(len(CONTENT))
+    assert body["type"] == "http.response.zerocopy"
+    assert (body["offset"], body["count"], body["more_body"]) == (0, len(CONTENT), False)
+    assert body["data"] == CONTENT
+
+
+def test_zerocopy_single_range(media_url):
+    start, body = serve(media_url, {"Range": "bytes=5000-"}, zerocopy=True)
+
+    assert start["status"] == 206
+    headers = response_headers(start)
+    assert headers["content-range"] == f"bytes 5000-{len(CONTENT) - 1}/{len(CONTENT)}"
+    assert headers["content-length"] == str(len(CONTENT) - 5000)
+    assert (body["offset"], body["count"]) == (5000, len(CONTENT) - 5000)
+    assert body["data"] == CONTENT[5000:]
+
+
+@pytest.mark.parametrize("headers", [{}, {"Range": "bytes=0-9"}])
+def test_zerocopy_head_sends_headers_only(media_url, headers):
+    messages = serve(media_url, headers, method="HEAD", zerocopy=True)
+
+    assert [m["type"] for m in messages] == ["http.response.start", "http.response.body"]
+    assert messages[1]["body"] == b""
+
+
+def test_zerocopy_is_not_used_for_multiple_ranges(media_url):
+    messages = serve(media_url, {"Range": "bytes=0-9,100-199"}, zerocopy=True)
+
+    assert messages[0]["status"] == 206
+    assert {m["type"] for m in messages[1:]} == {"http.response.body"}
+    boundary = response_headers(messages[0])["content-type"].rsplit("=", 1)[1]
+    body = b"".join(m["body"] for m in messages[1:])
+    assert [data for _, data in parse_byteranges(body, boundary)] == [CONTENT[0:10], CONTENT[100:200]]
+
+
+def test_without_zerocopy_the_file_is_read_in_chunk_size_pieces(media_url, monkeypatch):
+    monkeypatch.setattr(MediaFileResponse, "chunk_size", 4096)
+
+    start, *bodies = serve(media_url)
+
+    assert start["status"] == 200
+    assert [len(m["body"]) for m in bodies if m["body"]] == [4096, 4096, len(CONTENT) - 8192]
+    assert b"".join(m["body"] for m in bodies) == CONTENT
+    assert bodies[-1]["more_body"] is False
+
+
+def test_if_range_with_the_current_etag_gets_the_range(client, media_url):
+    etag = client.get(media_url).headers["etag"]
+
+    response = client.get(media_url, headers={"Range": "bytes=0-9", "If-Range": etag})
+
+    assert response.status_code == 206
+    assert response.content == CONTENT[:10]
+
+
+def test_if_range_with_the_last_modified_date_gets_the_range(client, media_url):
+    last_modified = client.get(media_url).headers["last-modified"]
+
+    response = client.get(media_url, headers={"Range": "bytes=0-9", "If-Range": last_modified})
+
+    assert response.status_code == 206
+
+
+def test_if_range_with_a_stale_validator_gets_the_whole_file(client, media_url):
+    response = client.get(media_url, headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert "content-range" not in response.headers
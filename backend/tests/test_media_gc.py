@@ -0,0 +1,79 @@
+"""
+Garbage collection of content-addressed blobs
+"""
+import hashlib
+
+import pytest
+from fastapi import HTTPException
+
+from app.models.user import MediaBlob
+from app.services import media_service
+from app.services.media_service import COLLECTING, TMP_DIR, MediaService
+from app.services.storage import get_storage
+
+
+def store(db, content: bytes) -> MediaBlob:
+    TMP_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = TMP_DIR / "upload"
+    tmp_path.write_bytes(content)
+    return MediaService.acquire_blob(db, tmp_path, hashlib.sha256(content).hexdigest(), len(content), ".png")
+
+
+def test_unreferenced_blob_is_collected(db):
+    blob = store(db, b"unreferenced")
+    storage_key = blob.storage_key
+    MediaService.release_blob(db, blob.id)
+    db.commit()
+
+    stats = MediaService.collect_garbage(db)
+
+    assert stats["blobs"] == 1
+    assert db.query(MediaBlob).count() == 0
+    assert not get_storage().exists(storage_key)
+
+
+def test_reupload_during_collection_is_not_stored_under_deleted_files(db, monkeypatch):
+    content = b"collected then uploaded again"
+    blob = store(db, content)
+    MediaService.release_blob(db, blob.id)
+    db.commit()
+
+    blocked = []
+    delete_stored_blob = MediaService.delete_stored_blob
+
+    def reupload_while_deleting(storage_backend, storage_key):
+        # The same content arrives while the collector is removing its files
+        with pytest.raises(HTTPException) as excinfo:
+            store(db, content)
+        blocked.append(excinfo.value.status_code)
+        delete_stored_blob(storage_backend, storage_key)
+
+    monkeypatch.setattr(MediaService, "delete_stored_blob", staticmethod(reupload_while_deleting))
+    monkeypatch.setattr(media_service, "ACQUIRE_RETRY_SECONDS", 0)
+    MediaService.collect_garbage(db)
+
+    assert blocked == [409]
+    again = store(db, content)
+    assert again.ref_count == 1
+    assert get_storage().exists(again.storage_key)
+
+
+def test_acquire_waits_for_collection(db, monkeypatch):
+    content = b"being collected"
+    blob = store(db, content)
+    db.query(MediaBlob).filter(MediaBlob.id == blob.id).update({"ref_count": COLLECTING})
+    db.commit()
+
+    sleeps = []
+
+    def finish_collection(seconds):
+        sleeps.append(seconds)
+        db.query(MediaBlob).filter(MediaBlob.id == blob.id).delete()
+        db.commit()
+
+    monkeypatch.setattr(media_service.time, "sleep", finish_collection)
+    again = store(db, content)
+
+    assert sleeps
+    assert again.ref_count == 1
+    assert get_storage().exists(again.storage_key)
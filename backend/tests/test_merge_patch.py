@@ -0,0 +1,118 @@
+"""
+JSON Merge Patch (RFC 7396) and PATCH /api/v1/workspaces/me
+"""
+import pytest
+
+from app.core.merge_patch import MERGE_PATCH_CONTENT_TYPE, merge_patch
+from app.models.user import Workspace
+from app.services.user_service import UserService
+
+# RFC 7396 Appendix A
+RFC_EXAMPLES = [
+    ({"a": "b"}, {"a": "c"}, {"a": "c"}),
+    ({"a": "b"}, {"b": "c"}, {"a": "b", "b": "c"}),
+    ({"a": "b"}, {"a": None}, {}),
+    ({"a": "b", "b": "c"}, {"a": None}, {"b": "c"}),
+    ({"a": ["b"]}, {"a": "c"}, {"a": "c"}),
+    ({"a": "c"}, {"a": ["b"]}, {"a": ["b"]}),
+    ({"a": {"b": "c"}}, {"a": {"b": "d", "c": None}}, {"a": {"b": "d"}}),
+    ({"a": [{"b": "c"}]}, {"a": [1]}, {"a": [1]}),
+    (["a", "b"], ["c", "d"], ["c", "d"]),
+    ({"a": "b"}, ["c"], ["c"]),
+    ({"a": "foo"}, None, None),
+    ({"a": "foo"}, "bar", "bar"),
+    ({"e": None}, {"a": 1}, {"e": None, "a": 1}),
+    ([1, 2], {"a": "b", "c": None}, {"a": "b"}),
+    ({}, {"a": {"bb": {"ccc": None}}}, {"a": {"bb": {}}}),
+]
+
+
+@pytest.mark.parametrize("target,patch,expected", RFC_EXAMPLES)
+def test_rfc_examples(target, patch, expected):
+    assert merge_patch(target, patch) == expected
+
+
+def test_target_is_not_modified():
+    target = {"a": {"b": 1, "c": [1, 2]}}
+    merge_patch(target, {"a": {"b": None, "c": [3]}})
+
+    assert target == {"a": {"b": 1, "c": [1, 2]}}
+
+
+@pytest.fixture
+def workspace_user(db, make_user, auth_headers):
+    user = make_user("patcher@example.com")
+    UserService.create_workspace_for_user(db, user.id, {
+        "role": "user",
+        "workspace_name": "Studio",
+        "workspace_description": "Portfolio",
+        "widgets": ["chat", "portfolio"],
+        "layout": {"chat": {"x": 0, "y": 0}, "portfolio": {"x": 1, "y": 0}},
+    })
+    return auth_headers("patcher@example.com")
+
+
+def patch_workspace(client, headers, body, content_type=MERGE_PATCH_CONTENT_TYPE):
+    return client.patch(
+        "/api/v1/workspaces/me",
+        json=body,
+        headers={**headers, "Content-Type": content_type},
+    )
+
+
+def stored_workspace(db) -> Workspace:
+    db.expire_all()
+    return db.query(Workspace).one()
+
+
+def test_patch_requires_merge_patch_content_type(client, db, workspace_user):
+    response = patch_workspace(client, workspace_user, {"theme": "noir"}, content_type="application/json")
+
+    assert response.status_code == 415
+    assert response.headers["accept-patch"] == MERGE_PATCH_CONTENT_TYPE
+    assert stored_workspace(db).version == 1
+
+
+def test_patch_merges_nested_objects(client, db, workspace_user):
+    response = patch_workspace(client, workspace_user, {"layout": {"chat": {"x": 2}}})
+
+    assert response.status_code == 200
+    assert response.json() == {"version": 2}
+    assert stored_workspace(db).layout == {"chat": {"x": 2, "y": 0}, "portfolio": {"x": 1, "y": 0}}
+
+
+def test_patch_null_removes_members(client, db, workspace_user):
+    response = patch_workspace(client, workspace_user, {"layout": {"portfolio": None}, "workspace_description": None})
+
+    assert response.status_code == 200
+    workspace = stored_workspace(db)
+    assert workspace.layout == {"chat": {"x": 0, "y": 0}}
+    assert workspace.workspace_description is None
+
+
+def test_patch_replaces_arrays(client, db, workspace_user):
+    response = patch_workspace(client, workspace_user, {"widgets": ["chat"]})
+
+    assert response.status_code == 200
+    assert stored_workspace(db).widgets == ["chat"]
+
+
+def test_patch_cannot_remove_required_field(client, db, workspace_user):
+    response = patch_workspace(client, workspace_user, {"workspace_name": None})
+
+    assert response.status_code == 422
+    assert stored_workspace(db).workspace_name == "Studio"
+
+
+def test_patch_with_stale_if_match_is_rejected(client, db, workspace_user):
+    etag = client.get("/api/v1/workspaces/me", headers=workspace_user).headers["etag"]
+    assert patch_workspace(client, workspace_user, {"theme": "noir"}).status_code == 200
+
+    response = client.patch(
+        "/api/v1/workspaces/me",
+        json={"theme": "ivory"},
+        headers={**workspace_user, "Content-Type": MERGE_PATCH_CONTENT_TYPE, "If-Match": etag},
+    )
+
+    assert response.status_code == 412
+    assert stored_workspace(db).theme == "noir"
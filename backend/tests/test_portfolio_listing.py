@@ -0,0 +1,110 @@
+"""
+Portfolio listings: keyset pages followed to the end, from /portfolio/me and the bootstrap
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.api.portfolio import DEFAULT_PAGE_SIZE
+from app.models.user import MediaAsset
+
+
+@pytest.fixture
+def owner(db, make_user, auth_headers):
+    user = make_user("owner@example.com", subscription_tier="premium")
+    return user, auth_headers("owner@example.com")
+
+
+def add_assets(db, user_id: int, count: int) -> list:
+    """Assets with distinct timestamps, some sharing one; returns ids newest first"""
+    start = datetime(2026, 1, 1)
+    assets = [
+        MediaAsset(
+            user_id=user_id,
+            file_url=f"/uploads/{index}.png",
+            file_type="video" if index % 3 == 0 else "image",
+            # Pairs share a timestamp, so the id breaks ties
+            created_at=start + timedelta(seconds=index // 2),
+        )
+        for index in range(count)
+    ]
+    db.add_all(assets)
+    db.commit()
+    return [asset.id for asset in sorted(assets, key=lambda asset: (asset.created_at, asset.id), reverse=True)]
+
+
+def follow(client, headers, url: str) -> list:
+    pages = []
+    while url:
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200
+        pages.append([asset["id"] for asset in response.json()])
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor:
+            assert f"cursor={cursor}" in response.headers["Link"] and 'rel="next"' in response.headers["Link"]
+        else:
+            assert "Link" not in response.headers
+        url = f"/api/v1/portfolio/me?limit=4&cursor={cursor}" if cursor else None
+    return pages
+
+
+def test_cursor_walks_every_asset_once(client, db, owner):
+    user, headers = owner
+    ids = add_assets(db, user.id, 11)
+
+    pages = follow(client, headers, "/api/v1/portfolio/me?limit=4")
+
+    assert [len(page) for page in pages] == [4, 4, 3]
+    assert sum(pages, []) == ids
+
+
+def test_exact_multiple_of_the_page_size_ends_without_a_cursor(client, db, owner):
+    user, headers = owner
+    ids = add_assets(db, user.id, 8)
+
+    pages = follow(client, headers, "/api/v1/portfolio/me?limit=4")
+
+    assert sum(pages, []) == ids and len(pages) == 2
+
+
+def test_default_page_links_to_the_rest(client, db, owner):
+    user, headers = owner
+    ids = add_assets(db, user.id, DEFAULT_PAGE_SIZE + 3)
+
+    first = client.get("/api/v1/portfolio/me", headers=headers)
+    rest = client.get(f"/api/v1/portfolio/me?cursor={first.headers['X-Next-Cursor']}", headers=headers)
+
+    assert [asset["id"] for asset in first.json()] == ids[:DEFAULT_PAGE_SIZE]
+    assert [asset["id"] for asset in rest.json()] == ids[DEFAULT_PAGE_SIZE:]
+    assert "X-Next-Cursor" not in rest.headers
+
+
+def test_bootstrap_returns_the_cursor_of_the_second_page(client, db, owner):
+    user, headers = owner
+    ids = add_assets(db, user.id, DEFAULT_PAGE_SIZE + 3)
+
+    portfolio = client.get("/api/v1/bootstrap?include=portfolio", headers=headers).json()["portfolio"]
+    rest = client.get(f"/api/v1/portfolio/me?cursor={portfolio['next_cursor']}", headers=headers)
+
+    assert [asset["id"] for asset in portfolio["items"]] == ids[:DEFAULT_PAGE_SIZE]
+    assert [asset["id"] for asset in rest.json()] == ids[DEFAULT_PAGE_SIZE:]
+
+
+def test_file_type_filter_pages_within_the_type(client, db, owner):
+    user, headers = owner
+    add_assets(db, user.id, 12)
+    videos = [asset.id for asset in db.query(MediaAsset).filter(MediaAsset.file_type == "video")
+              .order_by(MediaAsset.created_at.desc(), MediaAsset.id.desc())]
+
+    first = client.get("/api/v1/portfolio/me?limit=3&file_type=video", headers=headers)
+    rest = client.get(
+        f"/api/v1/portfolio/me?limit=3&file_type=video&cursor={first.headers['X-Next-Cursor']}", headers=headers,
+    )
+
+    assert [asset["id"] for asset in first.json() + rest.json()] == videos
+
+
+def test_invalid_cursor_is_rejected(client, db, owner):
+    _, headers = owner
+
+    assert client.get("/api/v1/portfolio/me?cursor=not-a-cursor", headers=headers).status_code == 400
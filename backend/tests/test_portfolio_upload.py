@@ -0,0 +1,170 @@
+"""
+Portfolio uploads: storing a blob off the event loop, and resumable sessions
+that survive a failed completion or a competing PATCH
+"""
+import asyncio
+import fcntl
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.models.user import MediaAsset, MediaBlob
+from app.services import media_service, storage
+from app.services.upload_session_service import UploadSessionService
+
+UPLOADS = "/api/v1/portfolio/uploads"
+PNG = b"\x89PNG\r\n\x1a\n" + b"2" * 64
+
+
+@pytest.fixture
+def saves_on_event_loop(monkeypatch):
+    """Records, for each storage save, whether it ran on the event loop thread"""
+    on_loop = []
+    save = storage.LocalStorage.save
+
+    def recording_save(self, key, source):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(True)
+        except RuntimeError:
+            on_loop.append(False)
+        return save(self, key, source)
+
+    monkeypatch.setattr(storage.LocalStorage, "save", recording_save)
+    return on_loop
+
+
+def test_single_request_upload_stores_off_the_event_loop(client, make_user, auth_headers, saves_on_event_loop):
+    make_user("uploader@example.com")
+    response = client.post(
+        "/api/v1/portfolio/upload",
+        files={"file": ("a.png", b"\x89PNG\r\n\x1a\n" + b"0" * 64, "image/png")},
+        headers=auth_headers("uploader@example.com"),
+    )
+
+    assert response.status_code == 200
+    assert saves_on_event_loop == [False]
+
+
+def test_resumable_upload_completes_off_the_event_loop(client, make_user, auth_headers, saves_on_event_loop):
+    make_user("uploader@example.com")
+    headers = auth_headers("uploader@example.com")
+    content = b"\x89PNG\r\n\x1a\n" + b"1" * 64
+    session = client.post(
+        "/api/v1/portfolio/uploads",
+        json={"filename": "b.png", "content_type": "image/png", "size": len(content)},
+        headers=headers,
+    ).json()
+    upload_id = session["upload_id"]
+    patched = client.patch(
+        f"/api/v1/portfolio/uploads/{upload_id}",
+        content=content,
+        headers={**headers, "Upload-Offset": "0", "Content-Type": "application/offset+octet-stream"},
+    )
+    assert patched.status_code == 204
+
+    response = client.post(f"/api/v1/portfolio/uploads/{upload_id}/complete", headers=headers)
+
+    assert response.status_code == 200
+    assert saves_on_event_loop == [False]
+
+
+@pytest.fixture
+def uploader(make_user, auth_headers):
+    make_user("uploader@example.com")
+    return auth_headers("uploader@example.com")
+
+
+def start_session(client, headers, size: int) -> str:
+    response = client.post(UPLOADS, json={"filename": "c.png", "content_type": "image/png", "size": size},
+                           headers=headers)
+    assert response.status_code == 201
+    return response.json()["upload_id"]
+
+
+def patch_chunk(client, headers, upload_id: str, offset: int, content: bytes):
+    return client.patch(
+        f"{UPLOADS}/{upload_id}",
+        content=content,
+        headers={**headers, "Upload-Offset": str(offset), "Content-Type": "application/offset+octet-stream"},
+    )
+
+
+def fail_after_storing(monkeypatch):
+    """The file is moved into place, then the blob row cannot be written"""
+    save = storage.LocalStorage.save
+
+    def save_then_fail(self, key, source):
+        save(self, key, source)
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(storage.LocalStorage, "save", save_then_fail)
+
+
+@pytest.mark.parametrize("failure", ["conflict", "error_after_store"])
+def test_failed_completion_keeps_the_part_for_a_retry(client, db, uploader, monkeypatch, failure):
+    upload_id = start_session(client, uploader, len(PNG))
+    assert patch_chunk(client, uploader, upload_id, 0, PNG).status_code == 204
+    if failure == "conflict":
+        monkeypatch.setattr(media_service, "ACQUIRE_ATTEMPTS", 0)
+        expected = 409
+    else:
+        fail_after_storing(monkeypatch)
+        expected = 500
+
+    failed = TestClient(app, raise_server_exceptions=False).post(f"{UPLOADS}/{upload_id}/complete", headers=uploader)
+
+    assert failed.status_code == expected
+    assert UploadSessionService.part_path(upload_id).read_bytes() == PNG
+    assert client.head(f"{UPLOADS}/{upload_id}", headers=uploader).headers["Upload-Offset"] == str(len(PNG))
+    monkeypatch.undo()
+
+    retried = client.post(f"{UPLOADS}/{upload_id}/complete", headers=uploader)
+
+    assert retried.status_code == 200
+    assert not UploadSessionService.part_path(upload_id).exists()
+    blob = db.query(MediaBlob).one()
+    assert storage.get_storage(blob.storage_backend).local_path(blob.storage_key).read_bytes() == PNG
+    assert db.query(MediaAsset).count() == 1
+
+
+def test_patch_while_another_process_writes_is_rejected(client, uploader):
+    upload_id = start_session(client, uploader, len(PNG))
+    # A separate open file stands in for a PATCH streaming in another worker
+    with open(UploadSessionService.part_path(upload_id), "ab") as other:
+        fcntl.flock(other.fileno(), fcntl.LOCK_EX)
+        other.write(PNG[:8])
+        other.flush()
+
+        blocked = patch_chunk(client, uploader, upload_id, 0, PNG)
+
+        fcntl.flock(other.fileno(), fcntl.LOCK_UN)
+
+    assert blocked.status_code == 409
+    assert blocked.json()["detail"] == "Another request is writing to this upload"
+    assert UploadSessionService.part_path(upload_id).read_bytes() == PNG[:8]
+    # The offset is read under the lock, so the stale offset is refused too
+    stale = patch_chunk(client, uploader, upload_id, 0, PNG)
+    assert stale.status_code == 409 and stale.headers["Upload-Offset"] == "8"
+    assert patch_chunk(client, uploader, upload_id, 8, PNG[8:]).status_code == 204
+    assert UploadSessionService.part_path(upload_id).read_bytes() == PNG
+
+
+def test_racing_patches_at_one_offset_append_once(client, uploader):
+    upload_id = start_session(client, uploader, len(PNG))
+
+    async def race():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await asyncio.gather(*(
+                http.patch(f"{UPLOADS}/{upload_id}", content=PNG,
+                           headers={**uploader, "Upload-Offset": "0", "Content-Type": "application/offset+octet-stream"})
+                for _ in range(3)
+            ))
+
+    responses = asyncio.run(race())
+
+    assert sorted(r.status_code for r in responses) == [204, 409, 409]
+    assert UploadSessionService.part_path(upload_id).read_bytes() == PNG
@@ -0,0 +1,161 @@
+"""
+Bulk provisioning: the /users/bulk endpoint and provision_users.py
+"""
+import json
+import sys
+
+import pytest
+
+import provision_users
+from app.models.user import User, Workspace
+from app.schemas.user_schema import UserImportRow
+from app.services.provisioning_service import ProvisioningService, shutdown_hash_pool
+from app.services.workspace_templates import WORKSPACE_TEMPLATES
+
+BULK = "/api/v1/users/bulk"
+
+
+@pytest.fixture(autouse=True)
+def hash_pool():
+    yield
+    shutdown_hash_pool()
+
+
+@pytest.fixture
+def admin_headers(make_user, auth_headers):
+    make_user("admin@example.com", role="admin", subscription_tier="admin")
+    return auth_headers("admin@example.com")
+
+
+def ndjson(*rows) -> bytes:
+    return "".join((row if isinstance(row, str) else json.dumps(row)) + "\n" for row in rows).encode()
+
+
+def post_import(client, headers, body: bytes, content_type: str = "application/x-ndjson") -> list:
+    response = client.post(BULK, content=body, headers={**headers, "Content-Type": content_type})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_mixed_case_emails_match_existing_accounts(client, db, make_user, admin_headers):
+    make_user("alice@example.com")
+
+    results = post_import(client, admin_headers, ndjson(
+        {"email": "Alice@Example.com", "password": "pw"},
+        {"email": "ALICE@example.com", "password": "pw"},
+        {"email": "bob@example.com", "password": "pw"},
+        {"email": "Bob@Example.COM", "password": "pw"},
+    ))
+
+    # Duplicates are reported as read, the rest when their batch is written
+    assert sorted((r["line"], r["status"]) for r in results[:-1]) == [
+        (1, "exists"), (2, "duplicate"), (3, "created"), (4, "duplicate"),
+    ]
+    assert results[-1] == {"summary": {"created": 1, "exists": 1, "duplicate": 2, "error": 0}}
+    emails = sorted(email.lower() for (email,) in db.query(User.email))
+    assert emails == ["admin@example.com", "alice@example.com", "bob@example.com"]
+
+
+def test_fallback_path_also_ignores_case(db, make_user):
+    make_user("carol@example.com")
+    row = UserImportRow(email="Carol@Example.com", password="pw")
+
+    results = list(ProvisioningService._insert_rows(db, [(7, row)], [{"email": row.email, "hashed_password": "x"}]))
+
+    assert results == [{"line": 7, "email": row.email, "status": "exists"}]
+    assert db.query(User).count() == 1
+
+
+def test_each_bad_ndjson_row_gets_its_own_error(client, db, admin_headers):
+    results = post_import(client, admin_headers, ndjson(
+        {"email": "ok@example.com", "password": "pw", "subscription_tier": "premium"},
+        "{not json",
+        "[1, 2]",
+        {"email": "not-an-email", "password": "pw"},
+        {"email": "nopassword@example.com"},
+        {"email": "boss@example.com", "password": "pw", "role": "owner"},
+        "",
+        {"email": "last@example.com", "password": "pw"},
+    ))
+
+    by_line = {r["line"]: r for r in results[:-1]}
+    assert by_line[1]["status"] == by_line[8]["status"] == "created"
+    assert by_line[2]["status"] == "error" and by_line[2]["detail"].startswith("Invalid JSON")
+    assert by_line[3] == {"line": 3, "status": "error", "detail": "Each line must be a JSON object"}
+    assert by_line[4]["status"] == "error" and by_line[4]["detail"].startswith("email:")
+    assert by_line[5]["status"] == "error" and by_line[5]["detail"].startswith("password:")
+    assert by_line[6]["status"] == "error" and by_line[6]["detail"].startswith("role:")
+    assert 7 not in by_line
+    assert results[-1] == {"summary": {"created": 2, "exists": 0, "duplicate": 0, "error": 5}}
+
+    workspace = db.query(Workspace).filter(Workspace.user_email == "ok@example.com").one()
+    assert workspace.workspace_name == WORKSPACE_TEMPLATES["premium"]["workspace_name"]
+    assert workspace.widgets == WORKSPACE_TEMPLATES["premium"]["widgets"]
+
+
+def test_managers_cannot_create_admins(client, db, make_user, auth_headers):
+    make_user("manager@example.com", role="manager", subscription_tier="manager")
+
+    results = post_import(client, auth_headers("manager@example.com"), ndjson(
+        {"email": "root@example.com", "password": "pw", "role": "admin"},
+        {"email": "mod@example.com", "password": "pw", "role": "moderator"},
+    ))
+
+    assert [r["status"] for r in results[:-1]] == ["error", "created"]
+    assert results[0]["detail"] == "Not allowed to create admin accounts"
+
+
+def test_csv_import(client, db, admin_headers):
+    body = b"email,password,full_name,role\nCsv@Example.com,pw,Csv User,moderator\ncsv@example.com,pw,,\n"
+
+    results = post_import(client, admin_headers, body, "text/csv")
+
+    assert sorted((r["line"], r["status"]) for r in results[:-1]) == [(2, "created"), (3, "duplicate")]
+    workspace = db.query(Workspace).filter(Workspace.role == "moderator").one()
+    assert workspace.workspace_name == WORKSPACE_TEMPLATES["moderator"]["workspace_name"]
+
+
+def test_unknown_format_is_rejected(client, db, admin_headers):
+    response = client.post(BULK, content=b"{}", headers={**admin_headers, "Content-Type": "text/plain"})
+
+    assert response.status_code == 415
+
+
+def test_plain_users_cannot_import(client, db, make_user, auth_headers):
+    make_user("member@example.com")
+
+    response = client.post(BULK, content=ndjson({"email": "x@example.com", "password": "pw"}),
+                           headers={**auth_headers("member@example.com"), "Content-Type": "application/x-ndjson"})
+
+    assert response.status_code == 403
+
+
+def test_cli_reports_each_row_and_skips_existing_accounts(db, make_user, tmp_path, monkeypatch, capsys):
+    make_user("dana@example.com")
+    source = tmp_path / "agency.ndjson"
+    source.write_bytes(ndjson(
+        {"email": "Dana@Example.com", "password": "pw"},
+        {"email": "erin@example.com", "password": "pw"},
+        "{oops",
+    ))
+    monkeypatch.setattr(sys, "argv", ["provision_users.py", str(source), "--ndjson", "--batch-size", "1"])
+
+    provision_users.main()
+
+    results = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [(r.get("line"), r.get("status")) for r in results[:-1]] == [(1, "exists"), (2, "created"), (3, "error")]
+    assert results[-1] == {"summary": {"created": 1, "exists": 1, "duplicate": 0, "error": 1}}
+    assert db.query(User).filter(User.email == "erin@example.com").count() == 1
+
+
+def test_cli_summary_output(db, tmp_path, monkeypatch, capsys):
+    source = tmp_path / "agency.csv"
+    source.write_text("email,password\nfay@example.com,pw\nbroken,pw\n", encoding="utf-8")
+    monkeypatch.setattr(sys, "argv", ["provision_users.py", str(source)])
+
+    provision_users.main()
+
+    out = capsys.readouterr().out
+    assert "✓ Created 1 users, 0 already existed, 0 duplicates, 1 errors" in out
+    assert "✗ Line 3: email:" in out
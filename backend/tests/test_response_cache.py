@@ -0,0 +1,92 @@
+"""
+Response cache: hot reads served from the cache until a write invalidates their tag
+"""
+from datetime import datetime
+
+import pytest
+
+from app.core.response_cache import MemoryCacheBackend, ResponseCache
+from app.models.user import User, Workspace
+from app.services.user_service import UserService
+
+
+@pytest.fixture
+def reader(db, make_user, auth_headers):
+    user = make_user("reader@example.com", full_name="Reader")
+    UserService.create_workspace_for_user(db, user.id, {"role": "user", "workspace_name": "Studio", "theme": "dark"})
+    return user, auth_headers("reader@example.com")
+
+
+def change_behind_the_cache(db, model, **values) -> None:
+    db.query(model).update(values)
+    db.commit()
+
+
+def test_chat_post_invalidates_the_channel_history(client, db, reader):
+    _, headers = reader
+    url = "/api/v1/chat/messages?channel=community"
+    assert client.get(url, headers=headers).json() == []
+
+    client.post("/api/v1/chat/messages", json={"channel": "community", "content": "fresh"}, headers=headers)
+
+    assert [m["content"] for m in client.get(url, headers=headers).json()] == ["fresh"]
+
+
+def test_workspace_write_invalidates_the_cached_workspace(client, db, reader):
+    user, headers = reader
+    url = f"/api/v1/users/{user.id}/workspace"
+    assert client.get(url, headers=headers).json()["theme"] == "dark"
+    change_behind_the_cache(db, Workspace, theme="sepia")
+    assert client.get(url, headers=headers).json()["theme"] == "dark"
+
+    client.put("/api/v1/workspaces/me", json={"theme": "noir"}, headers=headers)
+
+    assert client.get(url, headers=headers).json()["theme"] == "noir"
+
+
+def test_login_stamp_invalidates_the_cached_user(client, db, reader):
+    user, headers = reader
+    url = f"/api/v1/users/{user.id}"
+    assert client.get(url, headers=headers).json()["full_name"] == "Reader"
+    change_behind_the_cache(db, User, full_name="Renamed")
+    assert client.get(url, headers=headers).json()["full_name"] == "Reader"
+
+    UserService.record_login(db, user.id, datetime.utcnow())
+
+    assert client.get(url, headers=headers).json()["full_name"] == "Renamed"
+
+
+def test_invalidation_drops_only_the_tagged_entries():
+    cache = ResponseCache(backend=MemoryCacheBackend())
+    for user_id in (1, 2):
+        cache.get_or_build("users.get", str(user_id), [f"user:{user_id}"], lambda: b"old")
+
+    cache.invalidate("user:1")
+
+    assert cache.get_or_build("users.get", "1", ["user:1"], lambda: b"new") == b"new"
+    assert cache.get_or_build("users.get", "2", ["user:2"], lambda: b"new") == b"old"
+    assert cache.stats()["routes"]["users.get"] == {"hits": 1, "misses": 3, "errors": 0, "hit_ratio": 0.25}
+
+
+def test_disabled_route_always_builds():
+    cache = ResponseCache(backend=MemoryCacheBackend(), disabled_routes=["chat.history"])
+    builds = []
+
+    for _ in range(2):
+        cache.get_or_build("chat.history", "community", ["channel:community"], lambda: builds.append(1) or b"[]")
+
+    assert len(builds) == 2
+    assert "chat.history" not in cache.stats()["routes"]
+
+
+def test_backend_errors_count_as_misses(monkeypatch):
+    cache = ResponseCache(backend=MemoryCacheBackend())
+
+    def unavailable(*args):
+        raise ConnectionError("redis down")
+
+    monkeypatch.setattr(cache.backend, "get", unavailable)
+
+    assert cache.get_or_build("users.get", "1", ["user:1"], lambda: b"built") == b"built"
+    assert cache.stats()["routes"]["users.get"]["errors"] == 1
+
@@ -0,0 +1,91 @@
+"""
+User directory: exact totals under the count cap, estimates or no total past it, prefix search
+"""
+import pytest
+
+from app.api import users
+from app.models.user import User
+
+DIRECTORY = "/api/v1/users"
+
+
+@pytest.fixture
+def admin_headers(make_user, auth_headers):
+    make_user("admin@example.com", role="admin", subscription_tier="admin")
+    return auth_headers("admin@example.com")
+
+
+def add_users(db, *emails: str) -> None:
+    db.add_all(User(email=email, hashed_password="x") for email in emails)
+    db.commit()
+
+
+def test_total_is_exact_under_the_cap(client, db, admin_headers):
+    add_users(db, *(f"user{n}@example.com" for n in range(4)))
+
+    page = client.get(f"{DIRECTORY}?limit=2", headers=admin_headers).json()
+
+    assert (page["total"], page["total_exact"]) == (5, True)
+    assert len(page["items"]) == 2 and page["next_cursor"]
+
+
+def test_total_past_the_cap_without_an_estimate_is_unknown(client, db, admin_headers, monkeypatch):
+    monkeypatch.setattr(users, "DIRECTORY_COUNT_CAP", 3)
+    add_users(db, *(f"user{n}@example.com" for n in range(4)))
+
+    page = client.get(DIRECTORY, headers=admin_headers).json()
+
+    # SQLite has no planner estimate: the cap would read as an exact figure
+    assert (page["total"], page["total_exact"]) == (None, False)
+    assert len(page["items"]) == 5
+
+
+@pytest.mark.parametrize("estimate, total", [(4200, 4200), (2, 4)])
+def test_total_past_the_cap_uses_the_planner_estimate(client, db, admin_headers, monkeypatch, estimate, total):
+    monkeypatch.setattr(users, "DIRECTORY_COUNT_CAP", 3)
+    monkeypatch.setattr(users, "planner_estimate", lambda query: estimate)
+    add_users(db, *(f"user{n}@example.com" for n in range(4)))
+
+    page = client.get(DIRECTORY, headers=admin_headers).json()
+
+    # A stale estimate below what was counted is raised to the known lower bound
+    assert (page["total"], page["total_exact"]) == (total, False)
+
+
+def test_later_pages_carry_no_total(client, db, admin_headers):
+    add_users(db, "a@example.com", "b@example.com")
+    first = client.get(f"{DIRECTORY}?limit=2", headers=admin_headers).json()
+
+    rest = client.get(f"{DIRECTORY}?limit=2&cursor={first['next_cursor']}", headers=admin_headers).json()
+
+    assert [user["email"] for user in rest["items"]] == ["b@example.com"]
+    assert (rest["total"], rest["total_exact"]) == (None, True)
+
+
+def test_prefix_search_counts_and_pages_the_matches(client, db, admin_headers, monkeypatch):
+    monkeypatch.setattr(users, "DIRECTORY_COUNT_CAP", 3)
+    add_users(db, "anna@example.com", "ann_b@example.com", "annex@example.com", "bob@example.com", "ANNE@example.com")
+
+    page = client.get(f"{DIRECTORY}?email_prefix=ann&limit=2", headers=admin_headers).json()
+    rest = client.get(f"{DIRECTORY}?email_prefix=ann&limit=2&cursor={page['next_cursor']}",
+                      headers=admin_headers).json()
+
+    assert (page["total"], page["total_exact"]) == (3, True)
+    assert [user["email"] for user in page["items"] + rest["items"]] == [
+        "anna@example.com", "ann_b@example.com", "annex@example.com",
+    ]
+
+
+def test_prefix_wildcards_are_matched_literally(client, db, admin_headers):
+    add_users(db, "ann_b@example.com", "annxb@example.com")
+
+    page = client.get(f"{DIRECTORY}?email_prefix=ann_", headers=admin_headers).json()
+
+    assert [user["email"] for user in page["items"]] == ["ann_b@example.com"]
+    assert page["total"] == 1
+
+
+def test_directory_needs_an_admin_or_manager(client, make_user, auth_headers):
+    make_user("member@example.com")
+
+    assert client.get(DIRECTORY, headers=auth_headers("member@example.com")).status_code == 403
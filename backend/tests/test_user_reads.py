@@ -0,0 +1,39 @@
+"""
+Cached user reads still require the caller's account to exist
+"""
+from app.models.user import User
+from app.services.user_service import UserService
+
+
+def test_get_user_is_served_from_cache_for_existing_caller(client, make_user, auth_headers):
+    target = make_user("target@example.com")
+    make_user("reader@example.com")
+    headers = auth_headers("reader@example.com")
+
+    first = client.get(f"/api/v1/users/{target.id}", headers=headers)
+    second = client.get(f"/api/v1/users/{target.id}", headers=headers)
+
+    assert first.status_code == second.status_code == 200
+    assert first.content == second.content
+    assert second.json()["email"] == "target@example.com"
+
+
+def test_deleted_caller_cannot_read_cached_user(client, db, make_user, auth_headers):
+    target = make_user("target@example.com")
+    UserService.create_workspace_for_user(db, target.id, {"role": "user", "workspace_name": "Studio"})
+    reader = make_user("reader@example.com")
+    headers = auth_headers("reader@example.com")
+    assert client.get(f"/api/v1/users/{target.id}", headers=headers).status_code == 200
+    assert client.get(f"/api/v1/users/{target.id}/workspace", headers=headers).status_code == 200
+
+    db.query(User).filter(User.id == reader.id).delete()
+    db.commit()
+
+    assert client.get(f"/api/v1/users/{target.id}", headers=headers).status_code == 404
+    assert client.get(f"/api/v1/users/{target.id}/workspace", headers=headers).status_code == 404
+
+
+def test_reads_require_a_token(client, make_user):
+    target = make_user("target@example.com")
+
+    assert client.get(f"/api/v1/users/{target.id}").status_code == 401
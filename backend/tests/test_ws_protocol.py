@@ -0,0 +1,118 @@
+"""
+kcd.msgpack.v1: negotiation, positional events and batched binary frames, JSON by default
+"""
+from datetime import datetime
+from types import SimpleNamespace
+
+import msgpack
+import pytest
+from fastapi import HTTPException
+
+from app.api import chat
+from app.core import ws_protocol
+from app.core.ws_protocol import (
+    EVENT_ERROR, EVENT_MESSAGE, EVENT_PRESENCE, EVENT_PRESENCE_SNAPSHOT, MSGPACK_SUBPROTOCOL,
+    message_event, negotiate_subprotocol, pack_frame, presence_event, unpack_frame,
+)
+from app.services.user_service import UserService
+
+
+@pytest.fixture
+def socket_url(make_user):
+    make_user("packer@example.com", full_name="Packer")
+    return f"/api/v1/chat/ws?token={UserService.create_access_token({'sub': 'packer@example.com'})}&channels=community"
+
+
+def send_packed(websocket, payload: dict) -> None:
+    websocket.send_bytes(msgpack.packb(payload))
+
+
+def receive_events(websocket) -> list:
+    return msgpack.unpackb(websocket.receive_bytes(), raw=False)
+
+
+@pytest.mark.parametrize("offered, accepted", [
+    (["kcd.msgpack.v1"], MSGPACK_SUBPROTOCOL),
+    (["graphql-ws", "kcd.msgpack.v1"], MSGPACK_SUBPROTOCOL),
+    (["kcd.msgpack.v2"], None),
+    ([], None),
+])
+def test_negotiation(offered, accepted):
+    assert negotiate_subprotocol(offered) == accepted
+
+
+def test_without_msgpack_the_subprotocol_is_declined(monkeypatch):
+    monkeypatch.setattr(ws_protocol, "msgpack", None)
+
+    assert negotiate_subprotocol([MSGPACK_SUBPROTOCOL]) is None
+
+
+def test_message_event_is_positional():
+    message = SimpleNamespace(id=7, user_id=3, user_name="Ann", channel="community", content="hi",
+                              created_at=datetime(1970, 1, 1, 0, 0, 1, 250))
+
+    assert message_event(message) == [EVENT_MESSAGE, 7, 3, "Ann", "community", "hi", 1_000_250]
+
+
+def test_presence_events():
+    diff = {"channel": "community", "joined": [{"user_id": 1, "user_name": "Ann"}], "left": [2], "typing": [1],
+            "idle": []}
+    snapshot = {"channel": "community", "online": [{"user_id": 1, "user_name": "Ann"}], "typing": []}
+
+    assert presence_event(diff) == [EVENT_PRESENCE, "community", [[1, "Ann"]], [2], [1], []]
+    assert presence_event(snapshot) == [EVENT_PRESENCE_SNAPSHOT, "community", [[1, "Ann"]], []]
+
+
+def test_frames_round_trip():
+    events = [[EVENT_MESSAGE, 1, 2, "Ann", "community", "héllo", 0], [EVENT_ERROR, "nope"]]
+
+    assert unpack_frame(pack_frame(events)) == events
+
+
+def test_binary_socket_gets_message_events(client, socket_url):
+    with client.websocket_connect(socket_url, subprotocols=[MSGPACK_SUBPROTOCOL]) as websocket:
+        assert websocket.accepted_subprotocol == MSGPACK_SUBPROTOCOL
+        send_packed(websocket, {"channel": "community", "content": "packed"})
+
+        (event,) = receive_events(websocket)
+
+    kind, message_id, _, user_name, channel, content, created_at_us = event
+    assert (kind, user_name, channel, content) == (EVENT_MESSAGE, "Packer", "community", "packed")
+    assert isinstance(message_id, int) and isinstance(created_at_us, int)
+
+
+def test_events_within_the_window_share_one_frame(client, socket_url, monkeypatch):
+    monkeypatch.setattr(chat, "BATCH_WINDOW_SECONDS", 0.5)
+
+    with client.websocket_connect(socket_url, subprotocols=[MSGPACK_SUBPROTOCOL]) as websocket:
+        for n in range(3):
+            send_packed(websocket, {"channel": "community", "content": f"burst {n}"})
+
+        events = receive_events(websocket)
+
+    assert [event[5] for event in events] == ["burst 0", "burst 1", "burst 2"]
+
+
+def test_json_stays_the_default(client, socket_url):
+    with client.websocket_connect(socket_url) as text:
+        with client.websocket_connect(socket_url, subprotocols=[MSGPACK_SUBPROTOCOL]) as binary:
+            assert text.accepted_subprotocol is None
+            send_packed(binary, {"channel": "community", "content": "both"})
+
+            (event,) = receive_events(binary)
+            received = text.receive_json()
+
+    assert (received["content"], received["user_name"]) == ("both", "Packer")
+    assert event[0] == EVENT_MESSAGE and event[1] == received["id"]
+
+
+def test_rejected_message_gets_an_error_event(client, socket_url, monkeypatch):
+    def blocked(*args):
+        raise HTTPException(status_code=422, detail=chat.BLOCKED_DETAIL)
+
+    monkeypatch.setattr(chat, "store_message", blocked)
+
+    with client.websocket_connect(socket_url, subprotocols=[MSGPACK_SUBPROTOCOL]) as websocket:
+        send_packed(websocket, {"channel": "community", "content": "spam"})
+
+        assert receive_events(websocket) == [[EVENT_ERROR, chat.BLOCKED_DETAIL]]
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+"""
+Job worker for KCD Platform
+
+Runs queued jobs (last_login stamps, media derivatives, periodic
+maintenance) outside the API process. Any number of workers can run
+against the same database, next to the API's own JOB_WORKERS threads or
+instead of them (JOB_WORKERS=0 on the API).
+Run with: python worker.py [--workers N]
+"""
+
+import argparse
+import asyncio
+import logging
+import signal
+import sys
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.core.logging_config import configure_logging, shutdown_logging
+from app.db.database import init_db
+from app.services import jobs  # noqa: F401  registers the job handlers
+from app.services.job_queue import JOB_WORKERS, job_pool
+
+logger = logging.getLogger("worker")
+
+
+async def run(workers: int) -> None:
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+    job_pool.start(workers)
+    logger.info("Job worker started with %d threads", workers)
+    await stopping.wait()
+    await job_pool.stop()
+    logger.info("Job worker stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run queued background jobs")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=max(JOB_WORKERS, 1),
+        help="Jobs run concurrently by this process",
+    )
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    configure_logging()
+    try:
+        init_db()
+        asyncio.run(run(args.workers))
+    finally:
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    main()
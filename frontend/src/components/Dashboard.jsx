@@ -1,9 +1,12 @@
 import React, { useState, useEffect, useMemo, useRef } from 'react';
 import { useTranslation } from 'react-i18next';
 import './Dashboard.css';
-import { getApiBaseUrl } from '../config/api';
+import { fetchIdempotent, getApiBaseUrl } from '../config/api';
 import PremiumWorkspaceTab from './PremiumWorkspaceTab';
 
+const RESUMABLE_UPLOAD_THRESHOLD = 8 * 1024 * 1024;
+const UPLOAD_CHUNK_BYTES = 4 * 1024 * 1024;
+
 export default function Dashboard({ user, onLogout }) {
   const { t } = useTranslation();
   const [activeTab, setActiveTab] = useState('workspaces');
@@ -12,13 +15,23 @@ export default function Dashboard({ user, onLogout }) {
   const [theme, setTheme] = useState('aura');
   const [chatTarget, setChatTarget] = useState('community');
   const [chatInput, setChatInput] = useState('');
+  const [chatNotice, setChatNotice] = useState('');
   const [messages, setMessages] = useState([]);
   const [chatOpen, setChatOpen] = useState(true);
   const [assets, setAssets] = useState([]);
+  // Cursor of the next portfolio page; null once every asset is loaded
+  const [portfolioCursor, setPortfolioCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [uploading, setUploading] = useState(false);
   const [loading, setLoading] = useState(false);
   const apiBaseUrl = getApiBaseUrl();
   const chatEndRef = useRef(null);
+  const lastMessageIdRef = useRef(0);
+  const [presence, setPresence] = useState({});
+  const socketRef = useRef(null);
+  const lastTypingRef = useRef(0);
+  const [unread, setUnread] = useState({});
+  const userIdRef = useRef(null);
 
   const roleThemeMap = useMemo(() => ({
     admin: 'aura',
@@ -45,12 +58,17 @@ export default function Dashboard({ user, onLogout }) {
 
   const isUserTier = ['premium', 'free', 'demo'].includes(effectiveRole);
 
-  const resolvedAssets = useMemo(() => assets.map((asset) => ({
-    ...asset,
-    resolvedUrl: asset.file_url?.startsWith('http')
-      ? asset.file_url
-      : `${apiBaseUrl.replace('/api', '')}${asset.file_url}`,
-  })), [assets, apiBaseUrl]);
+  const resolvedAssets = useMemo(() => {
+    const resolveUrl = (url) => (url?.startsWith('http')
+      ? url
+      : `${apiBaseUrl.replace('/api', '')}${url}`);
+    return assets.map((asset) => ({
+      ...asset,
+      resolvedUrl: resolveUrl(asset.file_url),
+      thumbnailUrl: asset.variants?.w640 ? resolveUrl(asset.variants.w640) : null,
+      posterUrl: asset.variants?.poster ? resolveUrl(asset.variants.poster) : null,
+    }));
+  }, [assets, apiBaseUrl]);
 
   const channelMessages = useMemo(() => (
     messages
@@ -58,6 +76,14 @@ export default function Dashboard({ user, onLogout }) {
       .sort((a, b) => new Date(a.created_at) - new Date(b.created_at))
   ), [messages, chatTarget]);
 
+  const channelPresence = useMemo(() => {
+    const state = presence[chatTarget] || { online: {}, typing: [] };
+    const typingNames = state.typing
+      .filter((userId) => userId !== userData?.id)
+      .map((userId) => state.online[userId] || 'Quelqu’un');
+    return { onlineCount: Object.keys(state.online).length, typingNames };
+  }, [presence, chatTarget, userData]);
+
   const lastMessagePreview = useMemo(() => {
     if (!channelMessages.length) return 'Aucun message.';
     const last = channelMessages[channelMessages.length - 1];
@@ -127,13 +153,7 @@ export default function Dashboard({ user, onLogout }) {
   }), []);
 
   useEffect(() => {
-    fetchUserData();
-    fetchWorkspace();
-    fetchChatMessages('community');
-    fetchChatMessages('moderator');
-    if (isUserTier) {
-      fetchPortfolio();
-    }
+    fetchBootstrap();
   }, []);
 
   useEffect(() => {
@@ -164,6 +184,164 @@ export default function Dashboard({ user, onLogout }) {
     }
   }, [theme]);
 
+  const applyUserData = (data) => {
+    setUserData(data);
+    localStorage.setItem('user', JSON.stringify(data));
+  };
+
+  const applyWorkspace = (data) => {
+    setWorkspace(data);
+    const rawRole = data.role === 'user' ? (data.subscription_tier || 'free') : data.role;
+    const roleDefault = roleThemeMap[rawRole] || 'night-shade';
+    const normalized = normalizeTheme(data.theme);
+    setTheme(normalized || localStorage.getItem('theme') || roleDefault);
+  };
+
+  useEffect(() => {
+    userIdRef.current = userData?.id ?? null;
+  }, [userData]);
+
+  useEffect(() => {
+    lastMessageIdRef.current = messages.reduce((max, msg) => Math.max(max, msg.id || 0), 0);
+  }, [messages]);
+
+  const mergeMessages = (data) => {
+    setMessages((prev) => {
+      const merged = [...prev];
+      data.forEach((msg) => {
+        if (!merged.find((existing) => existing.id === msg.id)) {
+          merged.push(msg);
+        }
+      });
+      return merged.sort((a, b) => new Date(a.created_at) - new Date(b.created_at));
+    });
+  };
+
+  const applyUnread = (counts) => {
+    setUnread((prev) => {
+      const next = { ...prev };
+      counts.forEach((item) => {
+        next[item.channel] = { count: item.unread, capped: item.capped, cap: item.cap };
+      });
+      return next;
+    });
+  };
+
+  // Live messages from others raise the badge locally; the server count
+  // replaces it whenever a channel is marked read
+  const countUnread = (message) => {
+    if (!message.channel || message.user_id === userIdRef.current) return;
+    setUnread((prev) => {
+      const current = prev[message.channel] || { count: 0, capped: false };
+      return { ...prev, [message.channel]: { ...current, count: current.count + 1 } };
+    });
+  };
+
+  const markChannelRead = async (channel) => {
+    try {
+      const response = await fetch(`${apiBaseUrl}/v1/chat/read`, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+          Authorization: `Bearer ${localStorage.getItem('token')}`,
+        },
+        body: JSON.stringify({ channel }),
+      });
+      if (response.ok) applyUnread([await response.json()]);
+    } catch (err) {
+      console.error('Failed to mark channel read:', err);
+    }
+  };
+
+  const unreadLabel = (channel) => {
+    const state = unread[channel];
+    if (!state || !state.count) return null;
+    const cap = state.cap ?? 99;
+    return state.capped || state.count > cap ? `${cap}+` : String(state.count);
+  };
+
+  // Debounced so a busy channel being watched costs one write per second at most
+  useEffect(() => {
+    if (!chatOpen || !unread[chatTarget]?.count) return undefined;
+    const timer = setTimeout(() => markChannelRead(chatTarget), 1000);
+    return () => clearTimeout(timer);
+  }, [chatOpen, chatTarget, unread]);
+
+  // Presence arrives as a snapshot per channel, then as diffs against it
+  const applyPresence = (event) => {
+    setPresence((prev) => {
+      const current = event.snapshot
+        ? { online: {}, typing: [] }
+        : (prev[event.channel] || { online: {}, typing: [] });
+      const online = { ...current.online };
+      (event.snapshot ? event.online : event.joined).forEach((member) => {
+        online[member.user_id] = member.user_name;
+      });
+      (event.left || []).forEach((userId) => delete online[userId]);
+      const idle = new Set(event.idle || []);
+      const typing = event.snapshot
+        ? event.typing
+        : [...current.typing.filter((userId) => !idle.has(userId)), ...event.typing];
+      return { ...prev, [event.channel]: { online, typing } };
+    });
+  };
+
+  const notifyTyping = () => {
+    const now = Date.now();
+    if (now - lastTypingRef.current < 3000) return;
+    lastTypingRef.current = now;
+    const socket = socketRef.current;
+    if (socket && socket.readyState === WebSocket.OPEN) {
+      socket.send(JSON.stringify({ type: 'typing', channel: chatTarget }));
+      return;
+    }
+    fetch(`${apiBaseUrl}/v1/chat/typing`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        Authorization: `Bearer ${localStorage.getItem('token')}`,
+      },
+      body: JSON.stringify({ channel: chatTarget }),
+    }).catch(() => {});
+  };
+
+  // One round trip for the first paint; falls back to the individual
+  // endpoints when the bootstrap route is unavailable.
+  const fetchBootstrap = async () => {
+    setLoading(true);
+    try {
+      const token = localStorage.getItem('token');
+      const response = await fetch(`${apiBaseUrl}/v1/bootstrap`, {
+        headers: {
+          Authorization: `Bearer ${token}`,
+        },
+      });
+      if (!response.ok) {
+        throw new Error(`Bootstrap failed with status ${response.status}`);
+      }
+      const data = await response.json();
+      if (data.user) applyUserData(data.user);
+      if (data.workspace) applyWorkspace(data.workspace);
+      mergeMessages([...(data.chat?.community || []), ...(data.chat?.moderator || [])]);
+      if (data.unread) applyUnread(data.unread);
+      if (data.portfolio) {
+        setAssets(data.portfolio.items);
+        setPortfolioCursor(data.portfolio.next_cursor || null);
+      }
+    } catch (err) {
+      console.error('Failed to bootstrap dashboard:', err);
+      fetchUserData();
+      fetchWorkspace();
+      fetchChatMessages('community');
+      fetchChatMessages('moderator');
+      if (isUserTier) {
+        fetchPortfolio();
+      }
+    } finally {
+      setLoading(false);
+    }
+  };
+
   const fetchUserData = async () => {
     setLoading(true);
     try {
@@ -175,9 +353,7 @@ export default function Dashboard({ user, onLogout }) {
       });
 
       if (response.ok) {
-        const data = await response.json();
-        setUserData(data);
-        localStorage.setItem('user', JSON.stringify(data));
+        applyUserData(await response.json());
       }
     } catch (err) {
       console.error('Failed to fetch user data:', err);
@@ -196,12 +372,7 @@ export default function Dashboard({ user, onLogout }) {
       });
 
       if (response.ok) {
-        const data = await response.json();
-        setWorkspace(data);
-        const rawRole = data.role === 'user' ? (data.subscription_tier || 'free') : data.role;
-        const roleDefault = roleThemeMap[rawRole] || 'night-shade';
-        const normalized = normalizeTheme(data.theme);
-        setTheme(normalized || localStorage.getItem('theme') || roleDefault);
+        applyWorkspace(await response.json());
       }
     } catch (err) {
       console.error('Failed to fetch workspace:', err);
@@ -217,47 +388,55 @@ export default function Dashboard({ user, onLogout }) {
         },
       });
       if (response.ok) {
-        const data = await response.json();
-        setMessages((prev) => {
-          const merged = [...prev];
-          data.forEach((msg) => {
-            if (!merged.find((existing) => existing.id === msg.id)) {
-              merged.push(msg);
-            }
-          });
-          return merged.sort((a, b) => new Date(a.created_at) - new Date(b.created_at));
-        });
+        mergeMessages(await response.json());
       }
     } catch (err) {
       console.error('Failed to fetch chat messages:', err);
     }
   };
 
-  const fetchPortfolio = async () => {
+  // Without a cursor the first page replaces the list; with one the page is appended
+  const fetchPortfolio = async (cursor = null) => {
     try {
       const token = localStorage.getItem('token');
-      const response = await fetch(`${apiBaseUrl}/v1/portfolio/me`, {
+      const params = new URLSearchParams({ fields: 'id,file_url,file_type,variants' });
+      if (cursor) params.set('cursor', cursor);
+      const response = await fetch(`${apiBaseUrl}/v1/portfolio/me?${params}`, {
         headers: {
           Authorization: `Bearer ${token}`,
         },
       });
       if (response.ok) {
         const data = await response.json();
-        setAssets(data);
+        setAssets((prev) => {
+          if (!cursor) return data;
+          const seen = new Set(prev.map((asset) => asset.id));
+          return [...prev, ...data.filter((asset) => !seen.has(asset.id))];
+        });
+        setPortfolioCursor(response.headers.get('X-Next-Cursor'));
       }
     } catch (err) {
       console.error('Failed to fetch portfolio:', err);
     }
   };
 
+  const loadMorePortfolio = async () => {
+    setLoadingMore(true);
+    try {
+      await fetchPortfolio(portfolioCursor);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleThemeChange = async (nextTheme) => {
     setTheme(nextTheme);
     try {
       const token = localStorage.getItem('token');
       await fetch(`${apiBaseUrl}/v1/workspaces/me`, {
-        method: 'PUT',
+        method: 'PATCH',
         headers: {
-          'Content-Type': 'application/json',
+          'Content-Type': 'application/merge-patch+json',
           Authorization: `Bearer ${token}`,
         },
         body: JSON.stringify({ theme: nextTheme }),
@@ -271,12 +450,13 @@ export default function Dashboard({ user, onLogout }) {
     if (!chatInput.trim()) return;
     sendMessage(chatTarget, chatInput.trim());
     setChatInput('');
+    lastTypingRef.current = 0;
   };
 
   const sendMessage = async (channel, content) => {
     try {
       const token = localStorage.getItem('token');
-      const response = await fetch(`${apiBaseUrl}/v1/chat/messages`, {
+      const response = await fetchIdempotent(`${apiBaseUrl}/v1/chat/messages`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -287,6 +467,9 @@ export default function Dashboard({ user, onLogout }) {
       if (response.ok) {
         const data = await response.json();
         setMessages((prev) => (prev.find((msg) => msg.id === data.id) ? prev : [...prev, data]));
+        setChatNotice('');
+      } else if (response.status === 422) {
+        setChatNotice('Message refusé par le filtre de contenu.');
       }
     } catch (err) {
       console.error('Failed to send message:', err);
@@ -299,14 +482,49 @@ export default function Dashboard({ user, onLogout }) {
     const base = apiBaseUrl.startsWith('http')
       ? apiBaseUrl
       : `${window.location.origin}${apiBaseUrl}`;
-    const wsUrl = base.replace(/^http/, 'ws') + `/v1/chat/ws?token=${token}`;
+    const wsUrl = base.replace(/^http/, 'ws') + `/v1/chat/ws?token=${token}&presence=true`;
     let socket;
-    let poller;
+    let stream;
+
+    // Fallback when the WebSocket fails: one SSE connection for both channels.
+    // EventSource reconnects by itself and resumes with Last-Event-ID.
+    const openStream = () => {
+      if (stream || typeof EventSource === 'undefined') return;
+      const streamUrl = `${base}/v1/chat/stream?channels=community,moderator`
+        + `&token=${token}&last_event_id=${lastMessageIdRef.current}&presence=true`;
+      stream = new EventSource(streamUrl);
+      stream.onmessage = (event) => {
+        try {
+          const message = JSON.parse(event.data);
+          mergeMessages([message]);
+          countUnread(message);
+        } catch (err) {
+          console.error('Failed to parse chat event', err);
+        }
+      };
+      stream.addEventListener('presence', (event) => applyPresence(JSON.parse(event.data)));
+      // More was missed than the server replays: reload history
+      stream.addEventListener('resync', () => {
+        fetchChatMessages('community');
+        fetchChatMessages('moderator');
+      });
+    };
+
     try {
       socket = new WebSocket(wsUrl);
+      socketRef.current = socket;
       socket.onmessage = (event) => {
         try {
           const data = JSON.parse(event.data);
+          if (data.type === 'presence') {
+            applyPresence(data);
+            return;
+          }
+          if (data.type === 'error') {
+            setChatNotice('Message refusé par le filtre de contenu.');
+            return;
+          }
+          countUnread(data);
           setMessages((prev) => {
             if (prev.find((msg) => msg.id === data.id)) return prev;
             return [...prev, data];
@@ -315,25 +533,56 @@ export default function Dashboard({ user, onLogout }) {
           console.error('Failed to parse websocket message', err);
         }
       };
-      socket.onerror = () => {
-        poller = setInterval(() => {
-          fetchChatMessages('community');
-          fetchChatMessages('moderator');
-        }, 5000);
-      };
+      socket.onerror = openStream;
     } catch (err) {
-      poller = setInterval(() => {
-        fetchChatMessages('community');
-        fetchChatMessages('moderator');
-      }, 5000);
+      openStream();
     }
 
     return () => {
+      socketRef.current = null;
       if (socket) socket.close();
-      if (poller) clearInterval(poller);
+      if (stream) stream.close();
     };
   }, [apiBaseUrl]);
 
+  const uploadResumable = async (file, token) => {
+    const headers = { Authorization: `Bearer ${token}` };
+    const created = await fetch(`${apiBaseUrl}/v1/portfolio/uploads`, {
+      method: 'POST',
+      headers: { ...headers, 'Content-Type': 'application/json' },
+      body: JSON.stringify({ filename: file.name, content_type: file.type, size: file.size }),
+    });
+    if (!created.ok) return created;
+    const session = await created.json();
+    const sessionUrl = `${apiBaseUrl}/v1/portfolio/uploads/${session.upload_id}`;
+    let { offset } = session;
+    let failures = 0;
+    while (offset < file.size) {
+      try {
+        const response = await fetch(sessionUrl, {
+          method: 'PATCH',
+          headers: {
+            ...headers,
+            'Content-Type': 'application/offset+octet-stream',
+            'Upload-Offset': String(offset),
+          },
+          body: file.slice(offset, offset + UPLOAD_CHUNK_BYTES),
+        });
+        if (!response.ok && response.status !== 409) return response;
+        failures = 0;
+        offset = Number(response.headers.get('Upload-Offset'));
+      } catch (err) {
+        // Network failure: ask the server how much it kept and resend from there
+        failures += 1;
+        if (failures > 3) throw err;
+        const status = await fetch(sessionUrl, { headers });
+        if (!status.ok) return status;
+        ({ offset } = await status.json());
+      }
+    }
+    return fetch(`${sessionUrl}/complete`, { method: 'POST', headers });
+  };
+
   const handleUpload = async (event) => {
     const files = Array.from(event.target.files || []);
     if (!files.length) return;
@@ -341,9 +590,17 @@ export default function Dashboard({ user, onLogout }) {
     try {
       const token = localStorage.getItem('token');
       for (const file of files) {
+        if (file.size > RESUMABLE_UPLOAD_THRESHOLD) {
+          const response = await uploadResumable(file, token);
+          if (response.ok) {
+            const data = await response.json();
+            setAssets((prev) => [data, ...prev]);
+          }
+          continue;
+        }
         const formData = new FormData();
         formData.append('file', file);
-        const response = await fetch(`${apiBaseUrl}/v1/portfolio/upload`, {
+        const response = await fetchIdempotent(`${apiBaseUrl}/v1/portfolio/upload`, {
           method: 'POST',
           headers: {
             Authorization: `Bearer ${token}`,
@@ -559,13 +816,31 @@ export default function Dashboard({ user, onLogout }) {
                 <div key={asset.id} className="portfolio-item">
                   <span className="asset-tag">{asset.file_type}</span>
                   {asset.file_type === 'video' ? (
-                    <video src={asset.resolvedUrl} muted loop autoPlay playsInline controls />
+                    <video
+                      src={asset.resolvedUrl}
+                      poster={asset.posterUrl || undefined}
+                      preload={asset.posterUrl ? 'none' : 'metadata'}
+                      muted
+                      loop
+                      playsInline
+                      controls
+                    />
                   ) : (
-                    <img src={asset.resolvedUrl} alt="Portfolio" />
+                    <img src={asset.thumbnailUrl || asset.resolvedUrl} alt="Portfolio" loading="lazy" />
                   )}
                 </div>
               ))}
             </div>
+            {portfolioCursor && (
+              <button
+                type="button"
+                className="upload-button load-more-button"
+                onClick={loadMorePortfolio}
+                disabled={loadingMore}
+              >
+                {loadingMore ? 'Chargement...' : 'Voir plus'}
+              </button>
+            )}
           </div>
         )}
 
@@ -676,6 +951,11 @@ export default function Dashboard({ user, onLogout }) {
                   <p className="chat-subtitle">
                     {chatTarget === 'community' ? 'Discussion entre talents' : 'Canal avec le modérateur'}
                   </p>
+                  <p className="chat-presence">
+                    {channelPresence.typingNames.length
+                      ? `${channelPresence.typingNames.join(', ')} ${channelPresence.typingNames.length > 1 ? 'écrivent' : 'écrit'}…`
+                      : `${channelPresence.onlineCount} en ligne`}
+                  </p>
                 </div>
                 <button
                   type="button"
@@ -693,6 +973,7 @@ export default function Dashboard({ user, onLogout }) {
                   onClick={() => setChatTarget('community')}
                 >
                   Communauté
+                  {unreadLabel('community') && <span className="chat-unread">{unreadLabel('community')}</span>}
                 </button>
                 <button
                   type="button"
@@ -700,6 +981,7 @@ export default function Dashboard({ user, onLogout }) {
                   onClick={() => setChatTarget('moderator')}
                 >
                   Modérateur
+                  {unreadLabel('moderator') && <span className="chat-unread">{unreadLabel('moderator')}</span>}
                 </button>
               </div>
             </div>
@@ -720,11 +1002,15 @@ export default function Dashboard({ user, onLogout }) {
               ))}
               <div ref={chatEndRef} />
             </div>
+            {chatNotice && <p className="chat-notice">{chatNotice}</p>}
             <div className="chat-input">
               <input
                 type="text"
                 value={chatInput}
-                onChange={(event) => setChatInput(event.target.value)}
+                onChange={(event) => {
+                  setChatInput(event.target.value);
+                  if (event.target.value.trim()) notifyTyping();
+                }}
                 placeholder="Écrivez un message..."
                 onKeyDown={(event) => {
                   if (event.key === 'Enter') handleSendMessage();
@@ -137,3 +137,31 @@ export const getApiBaseCandidates = () => {
 
   return Array.from(candidates).filter(Boolean);
 };
+
+const newIdempotencyKey = () => (
+  typeof crypto !== 'undefined' && crypto.randomUUID
+    ? crypto.randomUUID()
+    : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`
+);
+
+// Sends a write with an Idempotency-Key and retries network failures with the
+// same key, so the server runs it at most once however many attempts get through.
+export const fetchIdempotent = async (url, options = {}, attempts = 3) => {
+  const headers = { ...(options.headers || {}), 'Idempotency-Key': newIdempotencyKey() };
+  let lastError;
+  for (let attempt = 0; attempt < attempts; attempt += 1) {
+    if (attempt > 0) {
+      await new Promise((resolve) => setTimeout(resolve, 500 * 2 ** (attempt - 1)));
+    }
+    try {
+      const response = await fetch(url, { ...options, headers });
+      // 409 with Retry-After: the first attempt with this key is still running
+      if (response.status !== 409 || !response.headers.get('Retry-After') || attempt === attempts - 1) {
+        return response;
+      }
+    } catch (err) {
+      lastError = err;
+    }
+  }
+  throw lastError;
+};